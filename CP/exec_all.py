@@ -1,71 +1,499 @@
 """Launch the final model on all given instances.
 
+Instances can be solved concurrently (see --jobs): MiniZinc is driven
+through its asyncio API, at most N MiniZinc processes run at the same
+time (each one with its own timeout) and results are written as soon
+as each instance is finished. The peak memory of concurrent solves
+includes the other MiniZinc processes running at the same time.
+
+Intermediate solutions are streamed: each improving solution is
+recorded as an incumbent in the sweep manifest, and the convergence
+trace of each instance ((elapsed seconds, height) of the improving
+solutions, and its primal integral) is written to trace-ins-XX.json.
+
+Several solvers can be raced on each instance (portfolio, see --solver
+and --portfolio): the first one proving optimality wins and the other
+ones are cancelled, statistics of each solver are kept under the
+solvers key of the statistics.
+
+Each instance is flattened to FlatZinc once: the compiled model is
+stored in the FlatZinc cache (see flatzinc.py) and fed straight to the
+solver by later runs (see --no-fzn-cache).
+
 Python >= 3.8.
 """
 import sys
+import time
+import asyncio
 import glob
 import json
 import datetime
 import os
 import os.path as pt
 import argparse
+import traceback
 
-from minizinc import Instance, Model, Solver
+from minizinc import Instance, Model, Solver, Status
+
+import _paths  # noqa: F401 (shared modules of the parent directory)
+
+import solve_cache
+import flatzinc
+import timing
+import manifest
+import memory
+import profiling
+from visualize_solution import parse
+import results_db
 
 DEFAULT_MODEL_FILE = pt.join(pt.dirname(__file__), 'final.mzn')
 DEFAULT_ROT_MODEL_FILE = pt.join(pt.dirname(__file__), 'final_rotation.mzn')
 # Path to json input instances, converted using convert_instances.py
 DEFAULT_INSTANCES_DIR = pt.join(pt.dirname(__file__), '..', 'instances_json')
 DEFAULT_OUTPUT_DIR = pt.join(pt.dirname(__file__), 'out')
+OPTIMISATION_LEVEL = 5
+DEFAULT_SOLVER = 'chuffed'
+# Solvers of the portfolio, if installed (MiniZinc ids or tags)
+PORTFOLIO_SOLVERS = 'chuffed', 'gecode', 'cp-sat'
+# Both models write in the same output directory
+ROTATION_MANIFEST_BASENAME = 'manifest_rot.jsonl'
 
 
-def dump_statistics(statistics, status, fp=sys.stdout):
-    """Dump pretty printed statistics from minizinc results.statistics."""
-    statistics = {**statistics, 'status': str(status)}
+def seconds(value):
+    """Convert a minizinc time statistic (timedelta) to seconds."""
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    return value
 
-    # Make time serializable
+
+def _serializable(statistics):
+    """Make time statistics serializable."""
+    statistics = dict(statistics)
     time_keys = 'flatTime', 'time', 'solveTime', 'initTime', 'optTime'
     for key in time_keys:
         if key in statistics:
             statistics[key] = str(statistics[key])
+    return statistics
+
+
+def dump_statistics(statistics, status, fp=sys.stdout):
+    """Dump pretty printed statistics from minizinc results.statistics.
+
+    Statistics of the portfolio solvers are under the solvers key.
+    """
+    statistics = {**_serializable(statistics), 'status': str(status)}
+    if 'solvers' in statistics:
+        statistics['solvers'] = {
+            solver_id: _serializable(solver_statistics)
+            for solver_id, solver_statistics
+            in statistics['solvers'].items()}
 
     json.dump(statistics, fp, indent=4)
 
 
-def main(model_file=DEFAULT_MODEL_FILE):
-    solver = Solver.lookup('chuffed')
-    model = Model([model_file])
+def primal_integral(trace, best_height, end_time):
+    """Get the primal integral of a convergence trace, up to end_time.
+
+    trace lists the (elapsed seconds, height) of the improving
+    solutions. The primal gap is 1 until the first solution, then
+    (height - best_height) / height.
+    """
+    integral = 0.
+    previous_time, gap = 0., 1.
+    for elapsed, height in trace:
+        integral += gap * (elapsed - previous_time)
+        previous_time, gap = elapsed, (height - best_height) / height
+    return integral + gap * max(end_time - previous_time, 0.)
+
+
+def lookup_solvers(tags, skip_missing=False) -> list:
+    """Look the MiniZinc solvers up, by id or tag (no duplicates).
+
+    With skip_missing, solvers that are not installed are skipped,
+    otherwise LookupError is raised.
+    """
+    solvers = []
+    for tag in tags:
+        try:
+            solver = Solver.lookup(tag)
+        except LookupError:
+            if not skip_missing:
+                raise
+            print(f'solver not installed: {tag}')
+            continue
+        if solver.id not in [other.id for other in solvers]:
+            solvers.append(solver)
+    return solvers
+
+
+def set_parameters(instance, instance_data, rotation=False):
+    """Populate the parameters of a model instance.
+
+    Bounds and warm start are the rotation aware ones if
+    available. Without a heuristic placement, the warm start is all
+    zeros (bottom-left corner).
+    """
+    for key in 'width', 'n', 'circuits':
+        instance[key] = instance_data[key]
+
+    min_height = instance_data['min_height_rot' if rotation
+                               else 'min_height']
+    max_height = instance_data['max_height']
+    placement = instance_data.get('placement')
+    if rotation:
+        max_height = instance_data.get('max_height_rot', max_height)
+        placement = instance_data.get('placement_rot', placement)
+    instance['min_height'] = min_height
+    instance['max_height'] = max_height
+
+    if placement is None:
+        placement = [(w, h, 0, 0) for w, h in instance_data['circuits']]
+    instance['warm_x'] = [x for _, _, x, _ in placement]
+    instance['warm_y'] = [y for _, _, _, y in placement]
+    if rotation:
+        instance['warm_rotated'] = [
+            w != circuit_w for (w, _, _, _), (circuit_w, _)
+            in zip(placement, instance_data['circuits'])]
+
+
+async def solve_with(solver, model, model_file, instance_data, timeout, run,
+                     rotation=False, fzn_cache=None, processes=None,
+                     timer=None, callback=None):
+    """Solve an instance with a solver, streaming its solutions (coroutine).
+
+    The state of the solve (status, statistics, last solution and its
+    height) is kept up to date in the run dict, so that it is available
+    even if the solve is cancelled. callback(solver, elapsed, height,
+    solution) is called for each solution. processes is passed to the
+    solvers supporting multi-threading (-p).
+    """
+    timer = timer or timing.PhaseTimer()
+    instance = Instance(solver, model)
+    set_parameters(instance, instance_data, rotation)
+    run.update(status=None, solution=None, height=None, statistics={})
+    options = {'timeout': timeout, 'free_search': True,
+               'intermediate_solutions': True}
+    if processes is not None and '-p' in solver.stdFlags:
+        options['processes'] = processes
+
+    if fzn_cache is not None and fzn_cache.enabled:
+        fzn_key = solve_cache.make_key(
+            instance_data, [model_file, __file__], rotation=rotation,
+            solver=solver.id, solver_version=solver.version,
+            optimisation_level=OPTIMISATION_LEVEL)
+        # The compiler is blocking, let concurrent solves go on
+        fzn_file, ozn_file, flat_statistics = \
+            await asyncio.get_running_loop().run_in_executor(
+                None, fzn_cache.flatten, instance, fzn_key,
+                OPTIMISATION_LEVEL)
+        run['statistics'].update(flat_statistics)
+        results = flatzinc.solutions(solver, fzn_file, ozn_file, **options)
+    else:
+        results = instance.solutions(optimisation_level=OPTIMISATION_LEVEL,
+                                     **options)
+
+    async for result in results:
+        run['status'] = result.status
+        run['statistics'].update(result.statistics)
+        if result.solution is None:
+            continue
+        elapsed = time.perf_counter() - timer.starting_time
+        with timer.phase(timing.DECODE):
+            run['solution'] = str(result.solution)
+            run['height'] = result.objective
+        if callback is not None:
+            callback(solver, elapsed, run['height'], run['solution'])
 
-    # Define a new instance for each input file
-    for instance_file in sorted(
-            glob.glob(pt.join(DEFAULT_INSTANCES_DIR, '*'))):
-        instance = Instance(solver, model)
-        with open(instance_file) as fin:
-            instance_data = json.load(fin)
 
-        # Populate instance parameters
-        for key, value in instance_data.items():
-            instance[key] = value
+async def solve_instance(instance_file, solvers, model, model_file, timeout,
+                         rotation=False, cache=None, sweep=None, db=None,
+                         memory_limit=None, trace_memory=False,
+                         profile=False, fzn_cache=None, processes=None):
+    """Solve a single instance file and dump results on file (coroutine).
 
-        print(f'solving instance: {pt.basename(instance_file)}')
+    Given several solvers (portfolio), they are run at the same time on
+    the instance: the first one proving optimality wins and the other
+    ones are cancelled, otherwise the best solution is kept. Their
+    statistics are kept under the solvers key. processes is the number
+    of threads of the solvers supporting it.
 
-        result = instance.solve(timeout=datetime.timedelta(minutes=5),
-                                optimisation_level=5, free_search=True)
+    If a cache is given (see solve_cache), results of a solve with the
+    same instance, model and solvers are replayed instead. If a sweep
+    manifest (or a results database) is given, the state (the result)
+    of the instance is recorded in it. The peak memory of the solve
+    (MiniZinc and the solvers included) is measured,
+    MemoryLimitExceeded is raised if it exceeds memory_limit (bytes,
+    see memory.py). With profile, the Python side of the solve
+    (parameters, waiting for MiniZinc, decoding) is profiled (see
+    profiling.py). If a FlatZinc cache is given (see flatzinc.py), the
+    instance is only flattened if not compiled by a past run.
+    """
+    name = pt.basename(instance_file)
+    with open(instance_file) as fin:
+        instance_data = json.load(fin)
 
-        dump_statistics(result.statistics, result.status)
-        print()
+    output_basename = (f'out-{pt.splitext(pt.basename(instance_file))[0]}'
+                       '.txt')
+    stats_basename = (f'stats-{pt.splitext(pt.basename(instance_file))[0]}'
+                      '.txt')
+    trace_basename = (f'trace-{pt.splitext(pt.basename(instance_file))[0]}'
+                      '.json')
+    key = None
+    if cache is not None:
+        key = solve_cache.make_key(
+            instance_data, [model_file, __file__], rotation=rotation,
+            solver=','.join(solver.id for solver in solvers),
+            solver_version=','.join(solver.version for solver in solvers),
+            timeout=timeout.total_seconds(), processes=processes)
+        if cache.restore(key, DEFAULT_OUTPUT_DIR):
+            print(f'cached instance: {name}')
+            if sweep is not None:
+                sweep.mark(name, manifest.DONE, cached=True)
+            if db is not None:
+                db.replay(name, key)
+            return
 
-        # Dump results and statistics on file
-        os.makedirs(DEFAULT_OUTPUT_DIR, exist_ok=True)
-        output_basename = (f'out-{pt.splitext(pt.basename(instance_file))[0]}'
-                           '.txt')
-        stats_basename = (f'stats-{pt.splitext(pt.basename(instance_file))[0]}'
-                          '.txt')
-        with open(pt.join(DEFAULT_OUTPUT_DIR, output_basename), 'w') as fout:
-            fout.write(str(result))
+    if sweep is not None:
+        sweep.mark(name, manifest.RUNNING)
+        placement = instance_data.get('placement_rot' if rotation
+                                      else 'placement')
+        if placement is not None:
+            sweep.incumbent(name, max(y + h for _, h, _, y in placement),
+                            placement, 'heuristic')
 
-        with open(pt.join(DEFAULT_OUTPUT_DIR, stats_basename), 'w') as fout:
-            dump_statistics(result.statistics, result.status, fout)
+    print(f'solving instance: {name}')
+
+    # Stream the intermediate solutions, keep the improving ones
+    timer = timing.PhaseTimer()
+    profiler = profiling.Profiler(profile)
+    # Interrupting the main thread would stop the event loop and the
+    # whole sweep, only the solves of this instance are cancelled
+    loop = asyncio.get_running_loop()
+    tasks = {}
+
+    def cancel_solves():
+        for task in tasks:
+            task.cancel()
+
+    monitor = memory.MemoryMonitor(
+        memory_limit, trace_python=trace_memory,
+        on_exceeded=lambda: loop.call_soon_threadsafe(cancel_solves))
+    runs = {solver.id: {} for solver in solvers}
+    best = {'solution': None, 'height': None, 'solver': None}
+    trace = []
+
+    def on_solution(solver, elapsed, height, solution):
+        runs[solver.id].setdefault('trace', []).append((elapsed, height))
+        if best['height'] is not None and best['height'] <= height:
+            return
+        best.update(solution=solution, height=height, solver=solver.id)
+        trace.append((elapsed, height))
+        print(f'solution: height {height} after {elapsed:.3f} s'
+              + (f' ({solver.id})' if len(solvers) > 1 else ''))
+        if sweep is not None:
+            _, _, _, circuits = parse(solution)
+            sweep.incumbent(name, height,
+                            [(c['w'], c['h'], c['x'], c['y'])
+                             for c in circuits], solver.id)
+
+    winner = None
+    errors = {}
+    with monitor, profiler:
+        tasks.update((asyncio.ensure_future(solve_with(
+            solver, model, model_file, instance_data, timeout,
+            runs[solver.id], rotation, fzn_cache, processes, timer,
+            on_solution)), solver) for solver in solvers)
+        pending = set(tasks)
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    solver = tasks[task]
+                    wall_time = time.perf_counter() - timer.starting_time
+                    runs[solver.id]['wall_time'] = wall_time
+                    if task.cancelled():
+                        # Memory limit exceeded, raised by the monitor
+                        runs[solver.id]['cancelled'] = True
+                    elif task.exception() is not None:
+                        errors[solver.id] = task.exception()
+                        if len(solvers) > 1:
+                            print(f'solver {solver.id} failed: '
+                                  f'{task.exception()!r}')
+                    elif winner is None and runs[solver.id]['status'] in (
+                            Status.OPTIMAL_SOLUTION, Status.UNSATISFIABLE):
+                        winner = solver.id
+        finally:
+            # Stop the other solvers (their MiniZinc processes are killed)
+            for task in pending:
+                task.cancel()
+                runs[tasks[task].id]['cancelled'] = True
+            await asyncio.gather(*pending, return_exceptions=True)
+    if len(errors) == len(solvers):
+        raise next(iter(errors.values()))
+
+    # Status and statistics of the winner, or of the best solution
+    solution, height = best['solution'], best['height']
+    source = winner or best['solver'] or solvers[0].id
+    if winner is not None:
+        status = runs[winner]['status']
+    elif height is not None and len(solvers) > 1:
+        status = Status.SATISFIED
+    else:
+        status = runs[source]['status']
+    statistics = dict(runs[source]['statistics'])
+
+    # Phases as reported by minizinc (flattening, solver initialization)
+    timer.add(timing.BUILD, seconds(statistics.get('flatTime')))
+    timer.add(timing.PREPROCESS, seconds(statistics.get('initTime')))
+    timer.add(timing.SOLVE, seconds(statistics.get('solveTime')))
+    statistics.update(timer.statistics())
+    statistics.update(monitor.statistics())
+    statistics['solutions'] = len(trace)
+    if len(solvers) > 1:
+        statistics['solver'] = source
+        statistics['solvers'] = {
+            solver_id: {**run.get('statistics', {}),
+                        'status': str(run.get('status')),
+                        'height': run.get('height'),
+                        'wall_time': run.get('wall_time'),
+                        'cancelled': run.get('cancelled', False),
+                        'solutions': len(run.get('trace', [])),
+                        **({'error': repr(errors[solver_id])}
+                           if solver_id in errors else {})}
+            for solver_id, run in runs.items()}
+
+    dump_statistics(statistics, status)
+    print()
+
+    # Dump results and statistics on file
+    os.makedirs(DEFAULT_OUTPUT_DIR, exist_ok=True)
+    with open(pt.join(DEFAULT_OUTPUT_DIR, output_basename), 'w') as fout:
+        fout.write(str(solution))
+
+    with open(pt.join(DEFAULT_OUTPUT_DIR, stats_basename), 'w') as fout:
+        dump_statistics(statistics, status, fout)
+
+    # Convergence trace, the primal gap is relative to the best height
+    traces = {
+        'status': str(status),
+        'total_time': statistics['total_time'],
+        'trace': trace,
+        'primal_integral': primal_integral(trace, height,
+                                           statistics['total_time'])
+        if trace else None,
+    }
+    if len(solvers) > 1:
+        traces['solvers'] = {solver_id: run.get('trace', [])
+                             for solver_id, run in runs.items()}
+    with open(pt.join(DEFAULT_OUTPUT_DIR, trace_basename), 'w') as fout:
+        json.dump(traces, fout, indent=4)
+    profiler.dump(DEFAULT_OUTPUT_DIR,
+                  pt.splitext(pt.basename(instance_file))[0])
+
+    if cache is not None:
+        cache.store(key, [pt.join(DEFAULT_OUTPUT_DIR, output_basename),
+                          pt.join(DEFAULT_OUTPUT_DIR, stats_basename),
+                          pt.join(DEFAULT_OUTPUT_DIR, trace_basename)])
+
+    if sweep is not None:
+        if status == Status.ERROR:
+            state = manifest.FAILED
+        elif status == Status.OPTIMAL_SOLUTION:
+            state = manifest.DONE
+        else:
+            state = manifest.TIMEOUT
+        sweep.mark(name, state, status=str(status), height=height)
+
+    if db is not None:
+        db_status = {Status.OPTIMAL_SOLUTION: results_db.OPTIMAL,
+                     Status.SATISFIED: results_db.FEASIBLE,
+                     Status.ERROR: results_db.FAILED}.get(status,
+                                                          results_db.UNKNOWN)
+        db.record(name, db_status, height=height,
+                  statistics={**statistics, 'status': str(status)},
+                  cache_key=key)
+
+
+def main(model_file=DEFAULT_MODEL_FILE, rotation=False, cache=None,
+         resume=False, db=None, memory_limit=None, trace_memory=False,
+         profile=False, jobs=1, fzn_cache=None,
+         solver_tags=(DEFAULT_SOLVER,), portfolio=False, processes=None):
+    """Solve all instances.
+
+    Instances are solved by the solvers of solver_tags (MiniZinc ids
+    or tags), raced against each other if several. With portfolio, the
+    installed ones are used instead of failing on missing ones.
+    processes is the number of threads of the solvers supporting it.
+
+    If a cache is given (see solve_cache), results of a solve with the
+    same instance, model and solvers are replayed instead. With resume,
+    the instances finished by an interrupted sweep are skipped (see
+    manifest.py). If a results database is given, results are recorded
+    in it (see results_db.py). memory_limit (bytes) is the memory limit
+    of each solve (see memory.py). With profile, each solve is profiled
+    (see profiling.py). jobs instances are solved concurrently. If a
+    FlatZinc cache is given (see flatzinc.py), instances compiled by
+    past runs are not flattened again.
+    """
+    solvers = lookup_solvers(solver_tags, skip_missing=portfolio)
+    if not solvers:
+        raise LookupError(f'none of the solvers {", ".join(solver_tags)} '
+                          'is installed')
+    print(f'USING SOLVERS {", ".join(solver.id for solver in solvers)}')
+    model = Model([model_file])
+    timeout = datetime.timedelta(minutes=5)
+    if db is not None:
+        db.start_run('cp', pt.basename(model_file), rotation,
+                     ','.join(solver.id for solver in solvers),
+                     solver_version=','.join(solver.version
+                                             for solver in solvers),
+                     timeout=timeout.total_seconds(), profile=profile,
+                     jobs=jobs, processes=processes)
+
+    instance_files = sorted(glob.glob(pt.join(DEFAULT_INSTANCES_DIR, '*')))
+    sweep = manifest.Manifest(
+        pt.join(DEFAULT_OUTPUT_DIR, ROTATION_MANIFEST_BASENAME if rotation
+                else manifest.MANIFEST_BASENAME),
+        map(pt.basename, instance_files), resume)
+    todo = []
+    for instance_file in instance_files:
+        name = pt.basename(instance_file)
+        if sweep.todo(name):
+            todo.append(instance_file)
+        else:
+            print(f'skipping instance: {name} ({sweep.states[name]})')
+
+    # At most jobs instances (MiniZinc processes per solver) at the same
+    # time
+    semaphore = asyncio.Semaphore(jobs)
+
+    async def solve_safe(instance_file):
+        name = pt.basename(instance_file)
+        async with semaphore:
+            try:
+                await solve_instance(instance_file, solvers, model,
+                                     model_file, timeout, rotation, cache,
+                                     sweep, db, memory_limit, trace_memory,
+                                     profile, fzn_cache, processes)
+            except memory.MemoryLimitExceeded as e:
+                print(e)
+                sweep.mark(name, manifest.MEMOUT,
+                           peak_memory=e.peak_memory)
+                if db is not None:
+                    db.record(name, results_db.MEMOUT,
+                              peak_memory=e.peak_memory)
+            except Exception as e:
+                traceback.print_exc()
+                sweep.mark(name, manifest.FAILED, error=repr(e))
+                if db is not None:
+                    db.record(name, results_db.FAILED,
+                              statistics={'error': repr(e)})
+
+    async def solve_all():
+        await asyncio.gather(*map(solve_safe, todo))
+
+    asyncio.run(solve_all())
 
 
 if __name__ == '__main__':
@@ -76,11 +504,78 @@ if __name__ == '__main__':
                         action='store_true', default=False,
                         help='if specified, the rotation aware model will be '
                              'used')
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        default=True,
+                        help='solve all instances again, even if cached '
+                             'results are available (see solve_cache.py)')
+    parser.add_argument('--resume', dest='resume', action='store_true',
+                        default=False,
+                        help='resume an interrupted sweep, skipping the '
+                             'instances already finished (see manifest.py)')
+    parser.add_argument('--no-db', dest='db', action='store_false',
+                        default=True,
+                        help='do not record results in the results database '
+                             '(see results_db.py)')
+    parser.add_argument('--memory-limit', dest='memory_limit', type=float,
+                        default=None,
+                        help='memory limit in MB of each solve (MiniZinc '
+                             'and the solver included), exceeding it stops '
+                             'the solve (memout, see memory.py)')
+    parser.add_argument('--trace-memory', dest='trace_memory',
+                        action='store_true', default=False,
+                        help='also measure the peak of the Python '
+                             'allocations (slower)')
+    parser.add_argument('--profile', dest='profile', action='store_true',
+                        default=False,
+                        help='profile the Python side of each solve, '
+                             'profile-ins-XX.prof/.txt are written next to '
+                             'the statistics (see profiling.py), implies '
+                             '--no-cache')
+    parser.add_argument('-s', '--solver', dest='solver_tags',
+                        action='append', default=None,
+                        help='MiniZinc solver (id or tag), can be repeated: '
+                             'several solvers are raced on each instance, '
+                             'the first proving optimality wins (default '
+                             f'{DEFAULT_SOLVER})')
+    parser.add_argument('--portfolio', dest='portfolio', action='store_true',
+                        default=False,
+                        help='race the installed solvers among '
+                             f'{", ".join(PORTFOLIO_SOLVERS)} (or among the '
+                             'given ones)')
+    parser.add_argument('-p', '--processes', dest='processes', type=int,
+                        default=None,
+                        help='number of threads of each solver, for the '
+                             'solvers supporting it')
+    parser.add_argument('--no-fzn-cache', dest='fzn_cache',
+                        action='store_false', default=True,
+                        help='flatten each instance again instead of '
+                             'feeding the FlatZinc compiled by past runs to '
+                             'the solver (see flatzinc.py)')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1,
+                        help='number of instances solved concurrently, each '
+                             'one by its own MiniZinc process (default 1)')
     args = parser.parse_args()
 
+    # Memory and profiles of concurrent solves can't be told apart
+    if args.jobs > 1 and (args.memory_limit or args.trace_memory
+                          or args.profile):
+        parser.error('--memory-limit, --trace-memory and --profile require '
+                     'sequential solves (-j 1)')
+
     model_file = DEFAULT_MODEL_FILE
     if args.rotation:
         model_file = DEFAULT_ROT_MODEL_FILE
     print(f'USING MODEL {model_file}')
 
-    main(model_file=model_file)
+    # Profiled solves are slower, their results are not cached
+    main(model_file=model_file, rotation=args.rotation,
+         cache=solve_cache.SolveCache(enabled=args.cache and not args.profile),
+         resume=args.resume, db=results_db.ResultsDB(enabled=args.db),
+         memory_limit=args.memory_limit and args.memory_limit
+         * memory.MEGABYTE,
+         trace_memory=args.trace_memory, profile=args.profile,
+         jobs=args.jobs,
+         fzn_cache=flatzinc.FlatZincCache(enabled=args.fzn_cache),
+         solver_tags=args.solver_tags or (PORTFOLIO_SOLVERS if args.portfolio
+                                          else (DEFAULT_SOLVER,)),
+         portfolio=args.portfolio, processes=args.processes)
@@ -0,0 +1,206 @@
+"""FlatZinc compilation cache.
+
+Flattening a model instance to FlatZinc (flatTime) is a noticeable
+share of short solves, and its result only depends on the model, the
+instance data, the solver (its globals library) and the optimisation
+level. Each combination is compiled once: the .fzn and .ozn files are
+stored on disk under the hash of everything they depend on, later runs
+feed them straight to the solver.
+
+minizinc-python only solves models, solutions drives the MiniZinc
+executable on the cached FlatZinc itself and streams the results as
+Instance.solutions does (minizinc Result objects).
+
+Entries are written atomically (a fully written directory is renamed
+into place), parallel runners can share the same cache.
+
+Python >= 3.8.
+"""
+import os
+import os.path as pt
+import json
+import time
+import shutil
+import asyncio
+import tempfile
+
+import minizinc
+from minizinc import MiniZincError, Result, Status
+from minizinc.json import MZNJSONDecoder, decode_async_json_stream
+from minizinc.result import set_stat
+
+import solve_cache
+
+
+ROOT_DIR = pt.join(pt.dirname(pt.abspath(__file__)), '..')
+DEFAULT_CACHE_DIR = pt.join(ROOT_DIR, '.fzn_cache')
+FZN_BASENAME = 'model.fzn'
+OZN_BASENAME = 'model.ozn'
+STATISTICS_BASENAME = 'statistics.json'
+# Solutions as json objects, with the objective and the output item
+OUTPUT_OPTIONS = {'--output-mode': 'json', '--output-objective': True,
+                  '--output-output-item': True}
+
+
+class FlatZincSolution:
+    """Solution of a FlatZinc model: its output item and objective."""
+
+    def __init__(self, output, objective=None):
+        self.output = output
+        self.objective = objective
+
+    def __str__(self):
+        return self.output
+
+
+class FlatZincCache:
+    """FlatZinc models compiled by past runs, stored by key.
+
+    Keys are solve_cache.make_key hashes of the instance data, the model
+    files and the solver, the optimisation level shall be part of them.
+    A disabled cache is not used: runners flatten and solve the
+    model through minizinc-python as usual.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, enabled=True):
+        self.directory = directory
+        self.enabled = enabled
+
+    def _entry(self, key) -> str:
+        return pt.join(self.directory, key[:2], key)
+
+    def flatten(self, instance, key, optimisation_level=None):
+        """Get the FlatZinc of a minizinc Instance, compiled if needed.
+
+        Blocking (the MiniZinc compiler is run synchronously). Return
+        the .fzn and .ozn files and the flattening statistics, flatTime
+        being the seconds spent compiling (0 if cached).
+        """
+        entry = self._entry(key)
+        if pt.isdir(entry):
+            with open(pt.join(entry, STATISTICS_BASENAME)) as fin:
+                statistics = json.load(fin)
+            statistics.update(flatTime=0., fznCached=True)
+            return (pt.join(entry, FZN_BASENAME),
+                    pt.join(entry, OZN_BASENAME), statistics)
+
+        os.makedirs(pt.dirname(entry), exist_ok=True)
+        tmp_entry = tempfile.mkdtemp(dir=pt.dirname(entry), prefix='.tmp-')
+        try:
+            starting_time = time.perf_counter()
+            with instance.flat(optimisation_level=optimisation_level,
+                               **OUTPUT_OPTIONS) \
+                    as (fzn, ozn, flat_statistics):
+                shutil.copyfile(fzn.name, pt.join(tmp_entry, FZN_BASENAME))
+                shutil.copyfile(ozn.name, pt.join(tmp_entry, OZN_BASENAME))
+            # Flattening statistics (counts of variables and constraints)
+            statistics = {name: value for name, value
+                          in flat_statistics.items()
+                          if isinstance(value, (int, float, str))}
+            statistics['flatTime'] = time.perf_counter() - starting_time
+            with open(pt.join(tmp_entry, STATISTICS_BASENAME), 'w') as fout:
+                json.dump(statistics, fout, indent=4)
+        except BaseException:
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+            raise
+        statistics['fznCached'] = False
+
+        # mkdtemp creates private directories, use the usual permissions
+        os.chmod(tmp_entry, solve_cache.ENTRY_MODE)
+        try:
+            os.replace(tmp_entry, entry)
+        except OSError:
+            # Already stored by a concurrent run
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+        return (pt.join(entry, FZN_BASENAME), pt.join(entry, OZN_BASENAME),
+                statistics)
+
+
+def _parse_stream_object(obj, statistics):
+    """Update statistics from a json stream object.
+
+    Return the solution (FlatZincSolution) and status it carries, if
+    any.
+    """
+    solution = status = None
+    if obj['type'] == 'solution':
+        output = obj['output']['json']
+        solution = FlatZincSolution(output.get('_output', ''),
+                                    output.get('_objective'))
+        if 'time' in obj:
+            set_stat(statistics, 'time', str(obj['time'] / 1000))
+    elif obj['type'] == 'statistics':
+        for key, value in obj['statistics'].items():
+            set_stat(statistics, key, str(value))
+    elif obj['type'] == 'status':
+        status = Status.from_str(obj['status'])
+    return solution, status
+
+
+async def solutions(solver, fzn_file, ozn_file, timeout=None,
+                    free_search=False, intermediate_solutions=False,
+                    processes=None, random_seed=None, driver=None):
+    """Solve a FlatZinc model, yield the results (async generator).
+
+    As Instance.solutions: with intermediate_solutions a Result is
+    yielded for each solution, the last Result carries the final status
+    and statistics (and no solution). timeout is a timedelta. The
+    solver process is killed if the generator is closed early (e.g. a
+    cancelled task).
+    """
+    driver = driver or minizinc.default_driver
+    if driver is None:
+        raise MiniZincError(message='no MiniZinc executable found')
+    flags = ['--output-time', '--statistics', '--output-mode',
+             OUTPUT_OPTIONS['--output-mode'], '--output-objective',
+             '--output-output-item']
+    if intermediate_solutions:
+        flags.append('--intermediate-solutions')
+    if free_search:
+        flags.append('--free-search')
+    if processes is not None:
+        flags.extend(['--parallel', str(processes)])
+    if random_seed is not None:
+        flags.extend(['--random-seed', str(random_seed)])
+    if timeout is not None:
+        flags.extend(['--time-limit',
+                      str(int(timeout.total_seconds() * 1000))])
+
+    with solver.configuration() as configuration:
+        process = await asyncio.create_subprocess_exec(
+            str(driver.executable), '--solver', configuration, '--json-stream',
+            *flags, fzn_file, '--ozn-file', ozn_file,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        read_stderr = asyncio.ensure_future(process.stderr.read())
+        status = Status.UNKNOWN
+        statistics = {}
+        try:
+            try:
+                async for obj in decode_async_json_stream(
+                        process.stdout, cls=MZNJSONDecoder):
+                    solution, new_status = _parse_stream_object(obj,
+                                                                statistics)
+                    if new_status is not None:
+                        status = new_status
+                    elif solution is not None:
+                        if status == Status.UNKNOWN:
+                            status = Status.SATISFIED
+                        yield Result(status, solution, statistics)
+                        statistics = {}
+            except asyncio.IncompleteReadError as err:
+                # Last object, not terminated by a new line
+                if err.partial.strip():
+                    _, new_status = _parse_stream_object(
+                        json.loads(err.partial, cls=MZNJSONDecoder),
+                        statistics)
+                    status = new_status or status
+            code = await process.wait()
+            stderr = await read_stderr
+            if code != 0 and status in (Status.UNKNOWN, Status.ERROR):
+                raise MiniZincError(message=stderr.decode(errors='replace'))
+            yield Result(status, None, statistics)
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            read_stderr.cancel()
@@ -0,0 +1,371 @@
+"""Large Neighbourhood Search around the final model.
+
+Complete search stalls on the largest instances. Starting from an
+incumbent (the heuristic placement of the instance), each iteration
+fixes the positions of most circuits, frees the other ones and solves
+the sub-problem with a short time limit through minizinc-python:
+* random: circuits chosen at random;
+* strip: the circuits of a horizontal strip (around a random row);
+* area: circuits of similar area (a random window of the area ranking).
+The circuits at the top of the incumbent are always freed. Each
+sub-problem asks for a lower height (max_height is the incumbent
+height minus one), so each solution found improves the incumbent.
+
+The size of the neighbourhoods adapts: it grows when a sub-problem is
+proven to contain no better placement and shrinks when the time limit
+of an iteration is reached without solution. The incumbent is optimal
+if it reaches the lower bound, or if a neighbourhood freeing all
+circuits contains no better placement.
+
+Symmetry breaking constraints are ignored (fixed circuits of an
+incumbent need not be the representative of their symmetry class).
+
+Usage:
+python lns.py [INSTANCE_FILE ...] [-r] [-t TIME_LIMIT]
+              [-i ITERATION_TIME] [-n NEIGHBOURHOOD]
+
+Python >= 3.8.
+"""
+import glob
+import json
+import math
+import time
+import random
+import datetime
+import os
+import os.path as pt
+import argparse
+import traceback
+
+from minizinc import Instance, Model, Solver, Status
+
+import _paths  # noqa: F401 (shared modules of the parent directory)
+
+import timing
+import manifest
+import results_db
+from visualize_solution import parse
+from exec_all import (DEFAULT_MODEL_FILE, DEFAULT_ROT_MODEL_FILE,
+                      DEFAULT_INSTANCES_DIR, DEFAULT_SOLVER,
+                      OPTIMISATION_LEVEL, seconds, set_parameters,
+                      primal_integral)
+
+DEFAULT_OUTPUT_DIR = pt.join(pt.dirname(__file__), 'lns_out')
+DEFAULT_ROTATION_OUTPUT_DIR = pt.join(pt.dirname(__file__), 'lns_rot_out')
+DEFAULT_TIME_LIMIT = 300
+DEFAULT_ITERATION_TIME = 5
+# Initial portion of the circuits freed by a neighbourhood
+DEFAULT_RELAX = 0.3
+# Factor of the portion when a neighbourhood is too small (large)
+RELAX_GROWTH = 1.2
+MIN_RELAX = 0.05
+NEIGHBOURHOODS = 'random', 'strip', 'area'
+
+
+def neighbourhood(kind, rects, size, rng) -> set:
+    """Choose size circuits to free, plus the ones at the top.
+
+    rects are the (w, h, x, y) of the incumbent.
+    """
+    n = len(rects)
+    size = min(size, n)
+    if kind == 'random':
+        freed = rng.sample(range(n), size)
+    elif kind == 'strip':
+        # The circuits closest to a random row (crossing it first)
+        height = max(y + h for _, h, _, y in rects)
+        row = rng.randrange(height)
+        freed = sorted(range(n), key=lambda k: max(
+            rects[k][3] - row, row - rects[k][3] - rects[k][1] + 1, 0))[:size]
+    elif kind == 'area':
+        ranking = sorted(range(n), key=lambda k: -rects[k][0] * rects[k][1])
+        start = rng.randrange(n - size + 1)
+        freed = ranking[start:start + size]
+    else:
+        raise ValueError(f'unknown neighbourhood {kind}')
+
+    # The height can't decrease unless the top circuits move
+    height = max(y + h for _, h, _, y in rects)
+    return set(freed) | {k for k, (_, h, _, y) in enumerate(rects)
+                         if y + h == height}
+
+
+def solve_neighbourhood(solver, model, instance_data, rects, freed,
+                        time_limit, rotation=False):
+    """Solve the sub-problem of the circuits not in freed.
+
+    The other circuits are fixed at their position in rects (the
+    incumbent), the height shall be lower than the incumbent one.
+    Return the minizinc Result.
+    """
+    height = max(y + h for _, h, _, y in rects)
+    placement = [tuple(rect) for rect in rects]
+    instance = Instance(solver, model)
+    set_parameters(instance, {
+        **instance_data, 'max_height': height - 1, 'max_height_rot':
+        height - 1, 'placement': placement, 'placement_rot': placement},
+        rotation)
+
+    instance.add_string('mzn_ignore_symmetry_breaking_constraints = true;\n')
+    fixed = []
+    for k, (w, h, x, y) in enumerate(rects):
+        if k in freed:
+            continue
+        fixed.append(f'positions_x[{k + 1}] = {x} /\\ '
+                     f'positions_y[{k + 1}] = {y}')
+        if rotation:
+            rotated = w != instance_data['circuits'][k][0]
+            fixed.append(f'rotated[{k + 1}] = {str(rotated).lower()}')
+    if fixed:
+        instance.add_string('constraint ' + ' /\\ '.join(fixed) + ';\n')
+
+    return instance.solve(
+        timeout=datetime.timedelta(seconds=time_limit),
+        optimisation_level=OPTIMISATION_LEVEL, free_search=True)
+
+
+def solve(solver, model, instance_data, rotation=False,
+          time_limit=DEFAULT_TIME_LIMIT,
+          iteration_time=DEFAULT_ITERATION_TIME, neighbourhoods=NEIGHBOURHOODS,
+          relax=DEFAULT_RELAX, seed=None, callback=None):
+    """Improve the heuristic placement of an instance by LNS.
+
+    Each iteration solves a neighbourhood (chosen at random among
+    neighbourhoods) for at most iteration_time seconds, the search
+    stops after time_limit seconds or as soon as the incumbent is
+    optimal. callback(height, rects) is called for each incumbent.
+
+    Return (height, rects, optimal, statistics), rects are (w, h, x, y)
+    in input order. Flattening is timed as the build phase, solving
+    the neighbourhoods as the solve phase (see timing.py).
+    """
+    timer = timing.PhaseTimer()
+    starting_time = timer.starting_time
+    rng = random.Random(seed)
+    n = instance_data['n']
+    min_height = instance_data['min_height_rot' if rotation
+                               else 'min_height']
+
+    rects = instance_data.get('placement_rot' if rotation else 'placement',
+                              instance_data.get('placement'))
+    if rects is None:
+        raise ValueError('no heuristic placement to start from, convert '
+                         'the instance with convert_instances.py')
+    rects = [tuple(rect) for rect in rects]
+    height = initial_height = max(y + h for _, h, _, y in rects)
+    best_time = 0.
+    if callback is not None:
+        callback(height, rects)
+
+    iterations = improving = exhausted = timeouts = 0
+    optimal = height <= min_height
+    while not optimal:
+        remaining = starting_time + time_limit - time.perf_counter()
+        if remaining <= 0:
+            break
+        iterations += 1
+        kind = rng.choice(neighbourhoods)
+        freed = neighbourhood(kind, rects, max(1, math.ceil(relax * n)),
+                              rng)
+
+        iteration_starting_time = time.perf_counter()
+        result = solve_neighbourhood(solver, model, instance_data, rects,
+                                     freed, min(iteration_time, remaining),
+                                     rotation)
+        elapsed = time.perf_counter() - iteration_starting_time
+        flat_time = seconds(result.statistics.get('flatTime')) or 0.
+        timer.add(timing.BUILD, flat_time)
+        timer.add(timing.SOLVE, elapsed - flat_time)
+
+        if result.solution is not None:
+            with timer.phase(timing.DECODE):
+                _, _, _, circuits = parse(str(result.solution))
+                rects = [(c['w'], c['h'], c['x'], c['y']) for c in circuits]
+                height = result.objective
+            improving += 1
+            best_time = time.perf_counter() - starting_time
+            print(f'iteration {iterations} ({kind}, {len(freed)} freed): '
+                  f'height {height} after {best_time:.3f} s')
+            if callback is not None:
+                callback(height, rects)
+            optimal = height <= min_height
+        elif result.status == Status.UNSATISFIABLE:
+            # No better placement in the neighbourhood: larger ones
+            exhausted += 1
+            if len(freed) == n:
+                optimal = True
+            relax = min(1., relax * RELAX_GROWTH)
+        else:
+            # Time limit reached without solution: smaller ones
+            timeouts += 1
+            relax = max(MIN_RELAX, relax / RELAX_GROWTH)
+
+    statistics = {
+        'time': best_time,
+        **timer.statistics(),
+        'iterations': iterations,
+        'improving': improving,
+        'exhausted': exhausted,
+        'timeouts': timeouts,
+        'relax': relax,
+        'initial_height': initial_height,
+        'height': height,
+    }
+    return height, rects, optimal, statistics
+
+
+def solve_instance(instance_file, solver, model, output_dir, rotation=False,
+                   time_limit=DEFAULT_TIME_LIMIT,
+                   iteration_time=DEFAULT_ITERATION_TIME,
+                   neighbourhoods=NEIGHBOURHOODS, relax=DEFAULT_RELAX,
+                   seed=None, sweep=None, db=None):
+    """Solve a single instance file by LNS and dump results on file.
+
+    Incumbents are recorded in the sweep manifest and in the
+    convergence trace (trace-ins-XX.json), as in exec_all.py. If a
+    results database is given, the result is recorded in it.
+    """
+    name = pt.basename(instance_file)
+    basename = pt.splitext(name)[0]
+    with open(instance_file) as fin:
+        instance_data = json.load(fin)
+
+    print(f'solving instance: {name}')
+    if sweep is not None:
+        sweep.mark(name, manifest.RUNNING)
+
+    trace = []
+    starting_time = time.perf_counter()
+
+    def callback(height, rects):
+        trace.append((time.perf_counter() - starting_time, height))
+        if sweep is not None:
+            sweep.incumbent(name, height, rects, 'lns')
+
+    height, rects, optimal, statistics = solve(
+        solver, model, instance_data, rotation, time_limit, iteration_time,
+        neighbourhoods, relax, seed, callback)
+    status = Status.OPTIMAL_SOLUTION if optimal else Status.SATISFIED
+    statistics['status'] = str(status)
+
+    print(json.dumps(statistics, indent=4))
+    print()
+
+    # Dump results and statistics on file
+    os.makedirs(output_dir, exist_ok=True)
+    with open(pt.join(output_dir, f'out-{basename}.txt'), 'w') as fout:
+        fout.write(f'{instance_data["width"]} {height}\n{len(rects)}\n')
+        fout.writelines(f'{w} {h} {x} {y}\n' for w, h, x, y in rects)
+
+    with open(pt.join(output_dir, f'stats-{basename}.txt'), 'w') as fout:
+        json.dump(statistics, fout, indent=4)
+
+    # Convergence trace, the primal gap is relative to the best height
+    with open(pt.join(output_dir, f'trace-{basename}.json'), 'w') as fout:
+        json.dump({
+            'status': str(status),
+            'total_time': statistics['total_time'],
+            'trace': trace,
+            'primal_integral': primal_integral(trace, height,
+                                               statistics['total_time']),
+        }, fout, indent=4)
+
+    if sweep is not None:
+        sweep.mark(name, manifest.DONE if optimal else manifest.TIMEOUT,
+                   status=str(status), height=height)
+    if db is not None:
+        db.record(name, results_db.OPTIMAL if optimal
+                  else results_db.FEASIBLE, height=height,
+                  statistics=statistics)
+
+
+def main(instance_files=None, rotation=False, solver_tag=DEFAULT_SOLVER,
+         time_limit=DEFAULT_TIME_LIMIT, iteration_time=DEFAULT_ITERATION_TIME,
+         neighbourhoods=NEIGHBOURHOODS, relax=DEFAULT_RELAX, seed=None,
+         resume=False, db=None):
+    """Solve the given instances (by default all of them) by LNS.
+
+    With resume, the instances finished by an interrupted sweep are
+    skipped (see manifest.py). If a results database is given, results
+    are recorded in it (see results_db.py).
+    """
+    model_file = DEFAULT_ROT_MODEL_FILE if rotation else DEFAULT_MODEL_FILE
+    solver = Solver.lookup(solver_tag)
+    model = Model([model_file])
+    if db is not None:
+        db.start_run('cp', f'lns-{pt.basename(model_file)}', rotation,
+                     solver.id, solver_version=solver.version,
+                     timeout=time_limit, iteration_time=iteration_time,
+                     neighbourhoods=list(neighbourhoods), relax=relax,
+                     seed=seed)
+
+    output_dir = (DEFAULT_ROTATION_OUTPUT_DIR if rotation
+                  else DEFAULT_OUTPUT_DIR)
+    instance_files = instance_files or sorted(
+        glob.glob(pt.join(DEFAULT_INSTANCES_DIR, '*')))
+    sweep = manifest.Manifest(pt.join(output_dir, manifest.MANIFEST_BASENAME),
+                              map(pt.basename, instance_files), resume)
+    for instance_file in instance_files:
+        name = pt.basename(instance_file)
+        if not sweep.todo(name):
+            print(f'skipping instance: {name} ({sweep.states[name]})')
+            continue
+        try:
+            solve_instance(instance_file, solver, model, output_dir,
+                           rotation, time_limit, iteration_time,
+                           neighbourhoods, relax, seed, sweep, db)
+        except Exception as e:
+            traceback.print_exc()
+            sweep.mark(name, manifest.FAILED, error=repr(e))
+            if db is not None:
+                db.record(name, results_db.FAILED,
+                          statistics={'error': repr(e)})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Large Neighbourhood Search around the CP model: '
+                    'improve the heuristic placement of each instance by '
+                    're-solving neighbourhoods with a short time limit.')
+    parser.add_argument('instance_files', nargs='*', default=None,
+                        help='json instance files (default: all instances)')
+    parser.add_argument('-r', '--rotation', dest='rotation',
+                        action='store_true', default=False,
+                        help='if specified, the rotation aware model will be '
+                             'used')
+    parser.add_argument('-s', '--solver', dest='solver_tag',
+                        default=DEFAULT_SOLVER,
+                        help=f'MiniZinc solver (default {DEFAULT_SOLVER})')
+    parser.add_argument('-t', '--time-limit', dest='time_limit', type=float,
+                        default=DEFAULT_TIME_LIMIT,
+                        help='time limit in seconds of each instance '
+                             f'(default {DEFAULT_TIME_LIMIT})')
+    parser.add_argument('-i', '--iteration-time', dest='iteration_time',
+                        type=float, default=DEFAULT_ITERATION_TIME,
+                        help='time limit in seconds of each neighbourhood '
+                             f'(default {DEFAULT_ITERATION_TIME})')
+    parser.add_argument('-n', '--neighbourhood', dest='neighbourhoods',
+                        action='append', choices=NEIGHBOURHOODS,
+                        default=None,
+                        help='kind of neighbourhood, can be repeated '
+                             '(default: all of them, chosen at random)')
+    parser.add_argument('--relax', dest='relax', type=float,
+                        default=DEFAULT_RELAX,
+                        help='initial portion of the circuits freed by a '
+                             f'neighbourhood (default {DEFAULT_RELAX})')
+    parser.add_argument('--seed', dest='seed', type=int, default=None,
+                        help='random seed')
+    parser.add_argument('--resume', dest='resume', action='store_true',
+                        default=False,
+                        help='resume an interrupted sweep, skipping the '
+                             'instances already finished (see manifest.py)')
+    parser.add_argument('--no-db', dest='db', action='store_false',
+                        default=True,
+                        help='do not record results in the results database '
+                             '(see results_db.py)')
+    args = parser.parse_args()
+
+    main(args.instance_files, args.rotation, args.solver_tag,
+         args.time_limit, args.iteration_time,
+         args.neighbourhoods or NEIGHBOURHOODS, args.relax, args.seed,
+         args.resume, results_db.ResultsDB(enabled=args.db))
@@ -0,0 +1,262 @@
+"""Simulated annealing for the VLSI problem (anytime local search).
+
+A solution is a placement order of the circuits (and the orientation
+of each circuit, in rotation mode), decoded by placing the circuits
+bottom-left on a skyline (see first_fit.py). Moves swap two circuits,
+move a circuit to another position of the order or rotate a circuit.
+
+Moves are evaluated incrementally: the skyline of the current solution
+is saved every few circuits (checkpoints), a move changing the order
+from position i only decodes again the circuits from the checkpoint
+before i.
+
+The cost of a solution is its height, ties are broken by the portion of
+the top row being occupied (the less, the closer to a lower height).
+The temperature decreases geometrically with the elapsed time, so that
+the whole time budget is used (unless the lower bound is reached).
+
+Python >= 3.8.
+"""
+import math
+import time
+import random
+
+import timing
+from first_fit import Skyline, ORDERINGS
+
+
+DEFAULT_TIME_LIMIT = 10
+# Final temperature, relative to the initial one
+FINAL_TEMPERATURE_RATIO = 1e-3
+# Random moves used to tune the initial temperature
+CALIBRATION_MOVES = 100
+# Probability of accepting the average worsening move at the start
+INITIAL_ACCEPTANCE = 0.5
+
+
+def _top_occupation(skyline) -> float:
+    """Get the portion of the top row occupied by circuits, in (0, 1]."""
+    height = skyline.height
+    occupied = sum(skyline.end(i) - x
+                   for i, (x, y) in enumerate(zip(skyline.xs, skyline.ys))
+                   if y == height)
+    return occupied / skyline.width
+
+
+class Decoder:
+    """Bottom-left skyline decoding of a placement order.
+
+    Checkpoints and positions refer to the last committed solution.
+    """
+
+    def __init__(self, width, sizes, step):
+        self.width = width
+        # sizes[k][r] is the (w, h) of circuit k, rotated if r is True
+        self.sizes = sizes
+        self.step = step
+        self.checkpoints = []
+        self.positions = []
+
+    def decode(self, order, rotated, start=0):
+        """Decode order from the checkpoint before position start.
+
+        Return (cost, checkpoint index, new checkpoints, new positions),
+        to be given to commit if the solution is accepted.
+        """
+        index = start // self.step
+        skyline = Skyline(self.width)
+        if index:
+            skyline.xs, skyline.ys = map(list, self.checkpoints[index])
+
+        checkpoints = []
+        positions = []
+        for position in range(index * self.step, len(order)):
+            if position % self.step == 0:
+                checkpoints.append((tuple(skyline.xs), tuple(skyline.ys)))
+            k = order[position]
+            w, h = self.sizes[k][rotated[k]]
+            x, y = skyline.find(w)
+            skyline.place(x, y, w, h)
+            positions.append((x, y))
+
+        cost = skyline.height + 0.99 * _top_occupation(skyline)
+        return cost, index, checkpoints, positions
+
+    def commit(self, index, checkpoints, positions):
+        """Make a decoded solution the current one."""
+        self.checkpoints[index:] = checkpoints
+        self.positions[index * self.step:] = positions
+
+
+def _initial_orders(circuits, sizes, initial):
+    """Get the candidate starting solutions (order, rotated)."""
+    # Given orientations, or the widest side down (if it fits)
+    orientations = [[False] * len(circuits)]
+    if any(len(s) > 1 for s in sizes):
+        orientations.append([len(s) > 1 and s[True][0] > s[False][0]
+                             for s in sizes])
+
+    candidates = []
+    for ordering in ORDERINGS.values():
+        order = ordering(circuits)
+        candidates.extend((order, rotated) for rotated in orientations)
+
+    # Order of a given placement, from the bottom-left corner
+    if initial is not None:
+        order = sorted(range(len(circuits)),
+                       key=lambda k: (initial[k][3], initial[k][2]))
+        rotated = [len(sizes[k]) > 1 and initial[k][0] != circuits[k][0]
+                   for k in range(len(circuits))]
+        candidates.append((order, rotated))
+    return candidates
+
+
+def _move(order, rotated, rotatable, rng):
+    """Apply a random move in place.
+
+    rotatable lists the circuits allowed in both orientations. Return
+    the first changed position and a function undoing the move.
+    """
+    kind = rng.random()
+
+    if rotatable and kind < 0.2:
+        k = rng.choice(rotatable)
+        rotated[k] = not rotated[k]
+
+        def undo():
+            rotated[k] = not rotated[k]
+        return order.index(k), undo
+
+    i, j = rng.sample(range(len(order)), 2)
+    if kind < 0.6:
+        order[i], order[j] = order[j], order[i]
+
+        def undo():
+            order[i], order[j] = order[j], order[i]
+        return min(i, j), undo
+
+    order.insert(j, order.pop(i))
+
+    def undo():
+        order.insert(i, order.pop(j))
+    return min(i, j), undo
+
+
+def solve(width, circuits, rotation=False, time_limit=DEFAULT_TIME_LIMIT,
+          initial=None, min_height=0, seed=None, callback=None):
+    """Improve a placement of the circuits by simulated annealing.
+
+    initial is an optional placement to start from (list of
+    (w, h, x, y) rects, e.g. the heuristic placement of the instance).
+    The search stops after time_limit seconds, or as soon as a
+    placement of height min_height is found. callback(height, rects) is
+    called whenever a lower placement is found (incumbents).
+
+    Return (height, rects, statistics), rects are (w, h, x, y) in input
+    order. Building the starting solution and searching are timed as
+    build and solve phases (see timing.py).
+    """
+    timer = timing.PhaseTimer()
+    starting_time = timer.starting_time
+    rng = random.Random(seed)
+    n = len(circuits)
+
+    # Allowed orientations of each circuit, indexed by rotated flag
+    sizes = []
+    for w, h in circuits:
+        allowed = {False: (w, h)}
+        if rotation and w != h and h <= width:
+            allowed[True] = (h, w)
+        if w > width:
+            if not (rotation and h <= width):
+                raise ValueError(f'circuit {(w, h)} does not fit in a '
+                                 f'strip of width {width}')
+            allowed = {False: (h, w)}
+        sizes.append(allowed)
+    rotatable = [k for k in range(n) if len(sizes[k]) > 1]
+
+    decoder = Decoder(width, sizes, max(1, math.isqrt(n)))
+
+    # Start from the best candidate order
+    best_cost = None
+    for order, rotated in _initial_orders(circuits, sizes, initial):
+        decoded = decoder.decode(order, rotated)
+        if best_cost is None or decoded[0] < best_cost:
+            best_cost = decoded[0]
+            current = order, rotated, decoded
+    order, rotated, decoded = current
+    order, rotated = list(order), list(rotated)
+    decoder.commit(*decoded[1:])
+    cost = decoded[0]
+
+    def rects():
+        result = [None] * n
+        for k, (x, y) in zip(order, decoder.positions):
+            w, h = sizes[k][rotated[k]]
+            result[k] = (w, h, x, y)
+        return result
+
+    best_cost = cost
+    best_rects = rects()
+    best_time = time.perf_counter() - starting_time
+    initial_height = int(cost)
+    if initial is not None and max(y + h for _, h, _, y in initial) < cost:
+        best_cost = max(y + h for _, h, _, y in initial)
+        best_rects = [tuple(rect) for rect in initial]
+        initial_height = best_cost
+    if callback is not None:
+        callback(initial_height, best_rects)
+    build_time = time.perf_counter() - starting_time
+    timer.add(timing.BUILD, build_time)
+
+    # Initial temperature from the average worsening move
+    worsening = []
+    for _ in range(CALIBRATION_MOVES if n > 1 else 0):
+        start, undo = _move(order, rotated, rotatable, rng)
+        delta = decoder.decode(order, rotated, start)[0] - cost
+        if delta > 0:
+            worsening.append(delta)
+        undo()
+    initial_temperature = (-sum(worsening) / len(worsening)
+                           / math.log(INITIAL_ACCEPTANCE)
+                           if worsening else 1.)
+
+    iterations = accepted = 0
+    time_limit_end = starting_time + time_limit
+    while n > 1 and int(best_cost) > min_height:
+        now = time.perf_counter()
+        if now >= time_limit_end:
+            break
+        progress = (now - starting_time) / time_limit
+        temperature = initial_temperature * FINAL_TEMPERATURE_RATIO \
+            ** progress
+
+        iterations += 1
+        start, undo = _move(order, rotated, rotatable, rng)
+        decoded = decoder.decode(order, rotated, start)
+        delta = decoded[0] - cost
+        if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+            accepted += 1
+            decoder.commit(*decoded[1:])
+            cost = decoded[0]
+            if cost < best_cost:
+                if callback is not None and int(cost) < int(best_cost):
+                    callback(int(cost), rects())
+                best_cost = cost
+                best_rects = rects()
+                best_time = time.perf_counter() - starting_time
+        else:
+            undo()
+    timer.add(timing.SOLVE,
+              time.perf_counter() - starting_time - build_time)
+
+    height = max(y + h for _, h, _, y in best_rects)
+    statistics = {
+        'time': best_time,
+        **timer.statistics(),
+        'iterations': iterations,
+        'accepted': accepted,
+        'initial_height': initial_height,
+        'height': height,
+    }
+    return height, best_rects, statistics
@@ -0,0 +1,211 @@
+"""Launch the simulated annealing solver on all given instances.
+
+Each instance is solved for the given time budget, starting from the
+heuristic placement stored in the instance (see convert_instances.py).
+Results and statistics are written in the same format as the other
+models (out-ins-XX.txt, stats-ins-XX.json).
+
+Python >= 3.8.
+"""
+import sys
+import glob
+import json
+import os
+import os.path as pt
+import argparse
+import traceback
+
+import _paths  # noqa: F401 (shared modules of the parent directory)
+
+import solve_cache
+import manifest
+import memory
+import profiling
+import results_db
+import annealing
+
+
+# Path to json input instances, converted using convert_instances.py
+DEFAULT_INSTANCES_DIR = pt.join(pt.dirname(__file__), '..', 'instances_json')
+DEFAULT_OUTPUT_DIR = pt.join(pt.dirname(__file__), 'out')
+DEFAULT_ROTATION_OUTPUT_DIR = pt.join(pt.dirname(__file__), 'out_rot')
+DEFAULT_TIMEOUT = 60
+
+
+def dump_result(width, height, rects, fp=sys.stdout):
+    """Format result and dump it."""
+    fp.write(f'{width} {height}\n{len(rects)}\n')
+    fp.writelines(' '.join(map(str, rect)) + '\n' for rect in rects)
+
+
+def dump_statistics(statistics, fp=sys.stdout):
+    """Format statistics and dump it (json)."""
+    json.dump(statistics, fp, indent=4)
+
+
+def solve_instance(instance_file, rotation=False, timeout=DEFAULT_TIMEOUT,
+                   seed=None, output_dir=DEFAULT_OUTPUT_DIR, cache=None,
+                   sweep=None, db=None, memory_limit=None,
+                   trace_memory=False, profile=False):
+    """Solve a single instance file and dump results on file.
+
+    If a cache is given (see solve_cache), results of a solve with the
+    same instance, sources and parameters are replayed instead. If a
+    sweep manifest is given, the state of the instance and its
+    incumbents are recorded in it, and the search starts from the last
+    incumbent (of a preempted run) if any. If a results database is
+    given, the result is recorded in it. The peak memory of the solve
+    is measured (see memory.py), MemoryLimitExceeded is raised if it
+    exceeds memory_limit (bytes). With profile, the solve is profiled
+    (see profiling.py).
+    """
+    with open(instance_file) as fin:
+        instance_data = json.load(fin)
+
+    name = pt.basename(instance_file)
+    basename = pt.splitext(pt.basename(instance_file))[0]
+    output_file = pt.join(output_dir, f'out-{basename}.txt')
+    stats_file = pt.join(output_dir, f'stats-{basename}.json')
+    key = None
+    if cache is not None:
+        key = solve_cache.make_key(
+            instance_data,
+            solve_cache.source_files(pt.dirname(__file__))
+            + [pt.join(pt.dirname(__file__), '..', 'first_fit.py')],
+            rotation=rotation, timeout=timeout, seed=seed)
+        if cache.restore(key, output_dir):
+            print(f'cached instance: {name}')
+            if sweep is not None:
+                sweep.mark(name, manifest.DONE, cached=True)
+            if db is not None:
+                db.replay(name, key)
+            return
+
+    suffix = '_rot' if rotation else ''
+    initial = instance_data.get(f'placement{suffix}')
+    min_height = instance_data.get(f'min_height{suffix}', 0)
+    callback = None
+    if sweep is not None:
+        sweep.mark(name, manifest.RUNNING)
+        if name in sweep.incumbents:
+            initial = sweep.incumbents[name]['rects']
+
+        def callback(height, rects):
+            sweep.incumbent(name, height, rects, 'annealing')
+
+    print(f'solving instance: {name}')
+    monitor = memory.MemoryMonitor(memory_limit, trace_python=trace_memory)
+    profiler = profiling.Profiler(profile)
+    with monitor, profiler:
+        height, rects, statistics = annealing.solve(
+            instance_data['width'], instance_data['circuits'], rotation,
+            time_limit=timeout, initial=initial, min_height=min_height,
+            seed=seed, callback=callback)
+    statistics.update(monitor.statistics())
+
+    dump_result(instance_data['width'], height, rects)
+    dump_statistics(statistics)
+    print()
+
+    # Dump results and statistics on file
+    os.makedirs(output_dir, exist_ok=True)
+    with open(output_file, 'w') as fout:
+        dump_result(instance_data['width'], height, rects, fout)
+
+    with open(stats_file, 'w') as fout:
+        dump_statistics(statistics, fout)
+    profiler.dump(output_dir, basename)
+
+    if cache is not None:
+        cache.store(key, [output_file, stats_file])
+
+    if sweep is not None:
+        sweep.mark(name, manifest.DONE if height <= min_height
+                   else manifest.TIMEOUT, height=height)
+    if db is not None:
+        db.record(name, results_db.OPTIMAL if height <= min_height
+                  else results_db.FEASIBLE, height=height,
+                  statistics=statistics, cache_key=key)
+
+
+def main(rotation=False, timeout=DEFAULT_TIMEOUT, seed=None, cache=None,
+         resume=False, db=None, memory_limit=None, trace_memory=False,
+         profile=False):
+    if db is not None:
+        db.start_run('ls', 'annealing', rotation, timeout=timeout, seed=seed,
+                     profile=profile)
+    output_dir = (DEFAULT_ROTATION_OUTPUT_DIR if rotation
+                  else DEFAULT_OUTPUT_DIR)
+    instance_files = sorted(glob.glob(pt.join(DEFAULT_INSTANCES_DIR, '*')))
+    sweep = manifest.Manifest(pt.join(output_dir, manifest.MANIFEST_BASENAME),
+                              map(pt.basename, instance_files), resume)
+    for instance_file in instance_files:
+        name = pt.basename(instance_file)
+        if not sweep.todo(name):
+            print(f'skipping instance: {name} ({sweep.states[name]})')
+            continue
+        try:
+            solve_instance(instance_file, rotation, timeout, seed,
+                           output_dir, cache, sweep, db, memory_limit,
+                           trace_memory, profile)
+        except memory.MemoryLimitExceeded as e:
+            print(e)
+            sweep.mark(name, manifest.MEMOUT, peak_memory=e.peak_memory)
+            if db is not None:
+                db.record(name, results_db.MEMOUT,
+                          peak_memory=e.peak_memory)
+        except Exception as e:
+            traceback.print_exc()
+            sweep.mark(name, manifest.FAILED, error=repr(e))
+            if db is not None:
+                db.record(name, results_db.FAILED,
+                          statistics={'error': repr(e)})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Convenience script for model execution. Improve the '
+                    'heuristic placement of all given instances by '
+                    'simulated annealing.')
+    parser.add_argument('-r', '--rotation', dest='rotation',
+                        action='store_true', default=False,
+                        help='if specified, circuits may be rotated')
+    parser.add_argument('-t', '--timeout', dest='timeout', type=float,
+                        default=DEFAULT_TIMEOUT,
+                        help='time budget in seconds for each instance '
+                             f'(default {DEFAULT_TIMEOUT})')
+    parser.add_argument('--seed', dest='seed', type=int, default=None,
+                        help='random seed, for reproducible runs')
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        default=True,
+                        help='solve all instances again, even if cached '
+                             'results are available (see solve_cache.py)')
+    parser.add_argument('--resume', dest='resume', action='store_true',
+                        default=False,
+                        help='resume an interrupted sweep, skipping the '
+                             'instances already finished (see manifest.py)')
+    parser.add_argument('--no-db', dest='db', action='store_false',
+                        default=True,
+                        help='do not record results in the results database '
+                             '(see results_db.py)')
+    parser.add_argument('--memory-limit', dest='memory_limit', type=float,
+                        default=None,
+                        help='memory limit in MB of each solve, exceeding '
+                             'it stops the solve (memout, see memory.py)')
+    parser.add_argument('--trace-memory', dest='trace_memory',
+                        action='store_true', default=False,
+                        help='also measure the peak of the Python '
+                             'allocations (slower)')
+    parser.add_argument('--profile', dest='profile', action='store_true',
+                        default=False,
+                        help='profile each solve, profile-ins-XX.prof/.txt '
+                             'are written next to the statistics (see '
+                             'profiling.py), implies --no-cache')
+    args = parser.parse_args()
+
+    # Profiled solves are slower, their results are not cached
+    main(args.rotation, args.timeout, args.seed,
+         solve_cache.SolveCache(enabled=args.cache and not args.profile),
+         args.resume, results_db.ResultsDB(enabled=args.db),
+         args.memory_limit and args.memory_limit * memory.MEGABYTE,
+         args.trace_memory, args.profile)
@@ -1,9 +1,11 @@
 from pulp import LpVariable, LpProblem, LpMinimize, LpStatus, LpContinuous, LpInteger
 import pulp as pl
 import json
+import time
 from math import ceil, sqrt
 
-from util import linear_max, lex_less, linear_or
+from util import linear_max, lex_less, linear_or, canonical_placement
+import timing
 
 DEFAULT_TIME_LIMIT = 5*60
 VARIABLE_TYPE = LpContinuous
@@ -13,7 +15,8 @@ def supported_solver():
 
     return pl.listSolvers(onlyAvailable=True)
 
-def solve(width, n, circuits, max_height=-1, name="no_rotation", solver="PULP_CBC_CMD", export_file=None, time_limit=DEFAULT_TIME_LIMIT):
+def solve(width, n, circuits, max_height=-1, min_height=-1, name="no_rotation", solver="PULP_CBC_CMD", export_file=None, time_limit=DEFAULT_TIME_LIMIT,
+          warm_start=None):
     f'''
     Solve VLSI problem using a MILP formulation and MILP solver. Is not possible to rotate the chips.
     width : width of the plate
@@ -22,22 +25,27 @@ def solve(width, n, circuits, max_height=-1, name="no_rotation", solver="PULP_CB
     name : name of the model. Useful when exporting the model. Default "no_rotation".
     solver : set the solver to use. Use supported_solver() to list the supported solvers. Default "PULP_CBC_CMD".
     sort_column_row : additional symmetry breaking. This symmetry breaking increase by lot the complexity. Default False.
+    min_height : lower bound of the height (see bounds.py). If not positive, the trivial bound is used. Default -1.
     export_file : export the model into lp format. Default None
     time_limit : time limit in which the calculation stops. Default {DEFAULT_TIME_LIMIT}.
+    warm_start : feasible placement used as MIP start, list of tuple in the form [(w[1], h[1], x[1], y[1]), ..., (w[n], h[n], x[n], y[n])]. Default None.
 
     return : dict containing: 
         - status : string with a commend on the solution(eg. Optimal)
-        - statistics : statistics of the solving process. Contains at least "solutionTime" and "solutionCpuTime".
+        - sol_status : status of the solution (pulp LpSolution constants). CBC reports the status "Optimal" also when stopped by the time limit with a solution, only sol_status tells a proved optimum (pulp.LpSolutionOptimal) from a feasible solution (pulp.LpSolutionIntegerFeasible).
+        - statistics : statistics of the solving process. Contains at least "solutionTime", "solutionCpuTime" and the phase times (see timing.py).
         - result : dict containing:
             - width : width of the plate.
             - height : height of the highest chip.
             - rect : list of tuple in the form [(w[1], h[1], x[1], y[i]), ..., (w[n], h[n], x[n], y[n])]
     '''
 
+    timer = timing.PhaseTimer()
     model = LpProblem(name, LpMinimize)
 
-    # Min height is the lowest possible height of a rectangle that can contain the circuits or the highest chip.
-    min_height = max(ceil(sum([circuits[i][0]*circuits[i][1] for i in range(n)]) / width), max([circuits[i][1] for i in range(n)]))
+    # Unless given, min height is the lowest possible height of a rectangle that can contain the circuits or the highest chip.
+    if min_height <= 0:
+        min_height = max(ceil(sum([circuits[i][0]*circuits[i][1] for i in range(n)]) / width), max([circuits[i][1] for i in range(n)]))
 
     # Max height is obtained by stacking all chips in one column
     max_height = (max_height if max_height > 0 else sum([circuits[i][0] for i in range(n)])) + 1 # + 1 because bounds exclude max_height
@@ -58,6 +66,9 @@ def solve(width, n, circuits, max_height=-1, name="no_rotation", solver="PULP_CB
         y.append(LpVariable(f"y_{i}", 0, max_height - circuits[i][1], VARIABLE_TYPE))
         model += (x[i] <= width - circuits[i][0], f"width_{i}")
 
+    if warm_start is not None:
+        _set_warm_start(width, warm_start, x, y, height, height_half)
+
     # Set height as the max y[i] + h[i]
     linear_max(
         [y[i] + circuits[i][1] for i in range(n)],
@@ -118,17 +129,35 @@ def solve(width, n, circuits, max_height=-1, name="no_rotation", solver="PULP_CB
                 model, f"equal_{i}_{j}")
 
     model.solverModel = {}
-    model.solve(pl.getSolver(solver, timeLimit=time_limit))
+    timer.add(timing.BUILD, time.perf_counter() - timer.starting_time)
+    with timer.phase(timing.SOLVE):
+        model.solve(pl.getSolver(solver, timeLimit=time_limit, warmStart=warm_start is not None))
 
     if export_file is not None:
         model.writeMPS(export_file)
         print(f"Model exported in {export_file}")
 
-    rect = _format_solution(circuits, n, x, y)
-    final_height = round(height.varValue) if height.varValue is not None else None
+    with timer.phase(timing.DECODE):
+        rect = _format_solution(circuits, n, x, y)
+        final_height = round(height.varValue) if height.varValue is not None else None
     return {"result": {"width": width, "height": final_height, "rect": rect},
-            "statistics": _get_solver_statistics(solver, model),
-            "status": LpStatus[model.status]}
+            "statistics": {**_get_solver_statistics(solver, model), **timer.statistics()},
+            "status": LpStatus[model.status], "sol_status": model.sol_status}
+
+
+def _set_warm_start(width, warm_start, x, y, height, height_half):
+    '''
+    Set the initial values of the variables from a feasible placement.
+    It shall be called before adding the constraints, so that their binaries get consistent initial values.
+    '''
+    rects = canonical_placement(width, warm_start)
+    warm_height = max(r[3] + r[1] for r in rects)
+    height.setInitialValue(warm_height)
+    height_half.setInitialValue(warm_height / 2)
+
+    for i, (_, _, xi, yi) in enumerate(rects):
+        x[i].setInitialValue(xi)
+        y[i].setInitialValue(yi)
 
 
 def _get_solver_statistics(solver, model):
@@ -4,7 +4,17 @@ import json
 import os
 import os.path as pt
 import argparse
+import traceback
 
+import pulp
+
+import _paths  # noqa: F401 (shared modules of the parent directory)
+
+import solve_cache
+import manifest
+import memory
+import profiling
+import results_db
 from MIP_rotation import solve, supported_solver
 
 DEFAULT_INSTANCES_DIR = pt.join(pt.dirname(__file__), '..', 'instances_json')
@@ -22,36 +32,119 @@ def format_result(result):
         ret += " ".join([str(s) for s in r]) + "\n"
     return ret
 
-def main(solver, time_limit, save_model):
-    out_dir = f"{DEFAULT_OUTPUT_DIR}_{solver}"
+def cache_key(instance_data, solver, time_limit):
+    """Get the cache key of a solve, distinct from the one of the other MIP runner (rotation flag and model module)."""
+    return solve_cache.make_key(instance_data, solve_cache.source_files(pt.dirname(__file__)),
+                                rotation=True, model=solve.__module__, solver=solver, pulp_version=pulp.__version__, time_limit=time_limit)
+
+def solve_instance(instance_file, solver, time_limit, save_model, out_dir, cache, sweep, db=None, memory_limit=None, trace_memory=False, profile=False):
+    """Solve an instance file, recording its state in the sweep manifest (and its result in db, if given).
+
+    The peak memory of the solve (CBC included) is measured, MemoryLimitExceeded is raised if it exceeds memory_limit (bytes, see memory.py).
+    With profile, model construction (and solving) and decoding are profiled (see profiling.py)."""
+    name = pt.basename(instance_file)
+    with open(instance_file) as fin:
+        instance_data = json.load(fin)
+    basename = pt.splitext(pt.basename(instance_file))[0]
+
+    # Replay results of a solve with the same instance, sources and solver
+    key = None
+    if cache is not None:
+        key = cache_key(instance_data, solver, time_limit)
+        if cache.restore(key, out_dir):
+            print(f'cached instance: {pt.basename(instance_file)}')
+            sweep.mark(name, manifest.DONE, cached=True)
+            if db is not None:
+                db.replay(name, key)
+            return
+
+    print(f'solving instance: {pt.basename(instance_file)}')
+    print(instance_data)
+    # Model parameters only (rotation aware bounds and warm
+    # start if available)
+    model_data = {key: instance_data[key]
+                  for key in ('width', 'n', 'circuits')}
+    model_data['max_height'] = instance_data.get(
+        'max_height_rot', instance_data['max_height'])
+    model_data['warm_start'] = instance_data.get('placement_rot')
+    model_data['min_height'] = instance_data.get('min_height_rot', -1)
+
+    sweep.mark(name, manifest.RUNNING)
+    if model_data['warm_start'] is not None:
+        sweep.incumbent(name, max(y + h for _, h, _, y in model_data['warm_start']), model_data['warm_start'], 'heuristic')
+
+    monitor = memory.MemoryMonitor(memory_limit, trace_python=trace_memory)
+    profiler = profiling.Profiler(profile)
+    with monitor, profiler:
+        if save_model:
+            result = solve(**model_data, solver=solver, time_limit=time_limit, export_file=pt.join(out_dir, basename+".mps"))
+        else:
+            result = solve(**model_data, solver=solver, time_limit=time_limit)
+    result["statistics"].update(monitor.statistics())
 
-    # Define a new instance for each input file
-    for instance_file in glob.glob(pt.join(DEFAULT_INSTANCES_DIR, '*')):
-        with open(instance_file) as fin:
-            instance_data = json.load(fin)
-        basename = pt.splitext(pt.basename(instance_file))[0]
+    dump_statistics(result["statistics"], result["status"])
 
-        print(f'solving instance: {pt.basename(instance_file)}')
-        print(instance_data)
+    # Dump results and statistics on file
+    os.makedirs(out_dir, exist_ok=True)
 
-        if save_model:
-            result = solve(**instance_data, solver=solver, time_limit=time_limit, export_file=pt.join(out_dir, basename+".mps"))
-        else:
-            result = solve(**instance_data, solver=solver, time_limit=time_limit)
 
-        dump_statistics(result["statistics"], result["status"])
 
-        # Dump results and statistics on file
-        os.makedirs(out_dir, exist_ok=True)
+    if result["status"] == "Optimal":
+        with open(pt.join(out_dir, f'out-{basename}.txt'), 'w') as fout:
+            fout.write(format_result(result["result"]))
 
-        
-        
-        if result["status"] == "Optimal":
-            with open(pt.join(out_dir, f'out-{basename}.txt'), 'w') as fout:
-                fout.write(format_result(result["result"]))
-        
-        with open(pt.join(out_dir, f'stats-{basename}.txt'), 'w') as fout:
-            dump_statistics(result["statistics"], result["status"], fout)
+    with open(pt.join(out_dir, f'stats-{basename}.txt'), 'w') as fout:
+        dump_statistics(result["statistics"], result["status"], fout)
+    profiler.dump(out_dir, basename)
+
+    if cache is not None:
+        # The solution file is written only if optimal
+        written = [f'stats-{basename}.txt'] + ([f'out-{basename}.txt'] if result["status"] == "Optimal" else [])
+        cache.store(key, [pt.join(out_dir, filename) for filename in written])
+
+    # Best solution found, even if not proved optimal
+    if result["result"]["rect"] and result["result"]["height"]:
+        sweep.incumbent(name, result["result"]["height"], result["result"]["rect"], solver)
+    # CBC stopped by the time limit also reports the status Optimal, only sol_status tells a proved optimum
+    optimal = result["sol_status"] == pulp.LpSolutionOptimal
+    sweep.mark(name, manifest.DONE if optimal else manifest.TIMEOUT, status=result["status"],
+               sol_status=pulp.LpSolution[result["sol_status"]])
+    if db is not None:
+        if optimal:
+            status = results_db.OPTIMAL
+        elif result["result"]["rect"] and result["result"]["height"]:
+            status = results_db.FEASIBLE
+        else:
+            status = results_db.UNKNOWN
+        db.record(name, status, height=result["result"]["height"],
+                  statistics={**result["statistics"], "status": result["status"],
+                              "sol_status": pulp.LpSolution[result["sol_status"]]}, cache_key=key)
+
+def main(solver, time_limit, save_model, cache=None, resume=False, db=None, memory_limit=None, trace_memory=False, profile=False):
+    out_dir = f"{DEFAULT_OUTPUT_DIR}_{solver}"
+    if db is not None:
+        db.start_run("mip", "MIP_rotation", True, solver, pulp_version=pulp.__version__, time_limit=time_limit, profile=profile)
+    instance_files = glob.glob(pt.join(DEFAULT_INSTANCES_DIR, '*'))
+    sweep = manifest.Manifest(pt.join(out_dir, manifest.MANIFEST_BASENAME), map(pt.basename, instance_files), resume)
+
+    # Define a new instance for each input file
+    for instance_file in instance_files:
+        name = pt.basename(instance_file)
+        if not sweep.todo(name):
+            print(f'skipping instance: {name} ({sweep.states[name]})')
+            continue
+        try:
+            solve_instance(instance_file, solver, time_limit, save_model, out_dir, cache, sweep, db, memory_limit, trace_memory, profile)
+        except memory.MemoryLimitExceeded as e:
+            print(e)
+            sweep.mark(name, manifest.MEMOUT, peak_memory=e.peak_memory)
+            if db is not None:
+                db.record(name, results_db.MEMOUT, peak_memory=e.peak_memory)
+        except Exception as e:
+            traceback.print_exc()
+            sweep.mark(name, manifest.FAILED, error=repr(e))
+            if db is not None:
+                db.record(name, results_db.FAILED, statistics={"error": repr(e)})
 
 
 if __name__ == '__main__':
@@ -62,8 +155,22 @@ if __name__ == '__main__':
                         help="Set the time limit to solver an instance. Once passed the instance is considered not solved")
     parser.add_argument("-sm", dest="save_model", default=False, action="store_true",
                         help="Save the models in mps format")
+    parser.add_argument("--no-cache", dest="cache", default=True, action="store_false",
+                        help="Solve all instances again, even if cached results are available (see solve_cache.py)")
+    parser.add_argument("--resume", dest="resume", default=False, action="store_true",
+                        help="Resume an interrupted sweep, skipping the instances already finished (see manifest.py)")
+    parser.add_argument("--no-db", dest="db", default=True, action="store_false",
+                        help="Do not record results in the results database (see results_db.py)")
+    parser.add_argument("--memory-limit", dest="memory_limit", default=None, type=float,
+                        help="Memory limit in MB of each solve (CBC included), exceeding it stops the solve (memout, see memory.py)")
+    parser.add_argument("--trace-memory", dest="trace_memory", default=False, action="store_true",
+                        help="Also measure the peak of the Python allocations of the model building (slower)")
+    parser.add_argument("--profile", dest="profile", default=False, action="store_true",
+                        help="Profile model construction and decoding, profile-ins-XX.prof/.txt are written next to the statistics (see profiling.py), implies --no-cache")
     args = parser.parse_args()
 
-    main(args.solver[0], args.time_limit, args.save_model)
+    # Profiled solves are slower, their results are not cached
+    main(args.solver[0], args.time_limit, args.save_model, solve_cache.SolveCache(enabled=args.cache and not args.profile), args.resume,
+         results_db.ResultsDB(enabled=args.db), args.memory_limit and args.memory_limit * memory.MEGABYTE, args.trace_memory, args.profile)
 
 
@@ -1,4 +1,4 @@
-from pulp import LpVariable, LpBinary
+from pulp import LpVariable, LpBinary, value
 
 def linear_or(arr, big_m, model, key):
     '''Linearize the or.
@@ -19,6 +19,14 @@ def linear_or(arr, big_m, model, key):
         model += (arr[i] <= big_m[i] -big_m[i]*b[i], f"{key}_{i}")
     model += (sum(b) >= 1, f"{key}_b_sum")
 
+    # Warm start: if the variables have initial values, select the first satisfied constraint
+    values = [value(a) for a in arr]
+    if None not in values and any(v <= 0 for v in values):
+        first = next(i for i, v in enumerate(values) if v <= 0)
+        for i in range(len(b)):
+            b[i].setInitialValue(int(i == first))
+    return b
+
 def lex_less(arr1, arr2, dom1, dom2, model, key, simplify=-1):
     ''' Lexicographic ordering constraint.
 
@@ -67,4 +75,53 @@ def linear_max(arr, dom, y, model, key):
         model += (y <= arr[i] + u_max - u_max*b[i] - dom[i][0] + dom[i][0]*b[i], f"{key}_max2_{i}")
 
     model += (sum(b) == 1, f"{key}_sum_b")
-    return y
\ No newline at end of file
+
+    # Warm start: if the variables have initial values, select the first maximum
+    values = [value(a) for a in arr]
+    if None not in values and value(y) is not None:
+        first = next((i for i, v in enumerate(values) if v == value(y)), None)
+        if first is not None:
+            for i in range(len(b)):
+                b[i].setInitialValue(int(i == first))
+    return y
+
+
+def canonical_placement(width, rects, rotation=False):
+    ''' Transform a placement so that it satisfies the symmetry breaking constraints.
+
+    rects : list of tuple in the form [(w1, h1, x1, y1), ..., (wn, hn, xn, yn)]
+    rotation : if True, circuits equal up to a rotation are considered equal.
+
+    The placement is flipped horizontally (vertically) if the mirrored
+    coordinates are lexicographically smaller, equal circuits are sorted
+    by position. Return a new list of rects.
+    '''
+    rects = [tuple(r) for r in rects]
+    height = max(r[3] + r[1] for r in rects)
+
+    # Equal circuits (same size, up to a rotation if allowed)
+    groups = {}
+    for i, (w, h, _, _) in enumerate(rects):
+        groups.setdefault(tuple(sorted((w, h))) if rotation else (w, h), []).append(i)
+
+    # Sorting may change the lexicographic order of the mirrors, repeat
+    # until stable
+    for _ in range(len(rects) + 1):
+        previous = rects
+
+        mirrored = [(w, h, width - x - w, y) for w, h, x, y in rects]
+        if [r[2] for r in mirrored] < [r[2] for r in rects]:
+            rects = mirrored
+        mirrored = [(w, h, x, height - y - h) for w, h, x, y in rects]
+        if [r[3] for r in mirrored] < [r[3] for r in rects]:
+            rects = mirrored
+
+        rects = list(rects)
+        for group in groups.values():
+            for i, r in zip(group, sorted((rects[i] for i in group), key=lambda r: (r[2], r[3]))):
+                rects[i] = r
+
+        if rects == previous:
+            break
+
+    return rects
@@ -7,6 +7,9 @@ from math import sqrt
 from math import ceil
 
 import util
+import dimacs
+import backends
+import numpy as np
 
 
 VARIABLE_RE = re.compile(r'p[xy]_(\d+)_(\d+)')
@@ -61,17 +64,16 @@ def flatten(l):
 ####################################################################################################
 
 
-def sat_vlsi(width, nofrectangles, dimensions, min_height, timeout=300000): #dimensions è una lista di coppie di coordinate [x,y]
-    
-    s = Solver()
+def encode(s, width, nofrectangles, dimensions, min_height):
+    """Add the order encoding model for a plate of height min_height to s.
 
+    Circuits are not forced to lie under min_height, see bound_height.
+    Return PX and PY variables.
+    """
     PX=[[Bool(f'px_{k}_{i}') for i in range(width-dimensions[k][0] +1)] for k in range(nofrectangles)]      #The x coordinate of circuit k is <= i
     PY=[[Bool(f'py_{k}_{j}') for j in range(min_height-dimensions[k][1]+1)] for k in range(nofrectangles)]  #The y coordinate of circuit k is <= i 
     LR=[[Bool(f'lr_{k}_{k1}') for k1 in range(nofrectangles)] for k in range(nofrectangles)]                #LR[k][k1] if k is at the left of k1
     UD=[[Bool(f'ud_{k}_{k1}') for k1 in range(nofrectangles)] for k in range(nofrectangles)]                #UD[k][k1] if k is under k1
-      
-    starting_time=time.time()
-    print('generating solver:')
 
     for k in range(nofrectangles):  #Order encoding on the PX, PY variables
         for i in range(width-dimensions[k][0]):
@@ -81,8 +83,6 @@ def sat_vlsi(width, nofrectangles, dimensions, min_height, timeout=300000): #dim
 
     for k in range(nofrectangles):  #each circuit must have an origin
         s.add(PX[k][width - dimensions[k][0]])
-        s.add(PY[k][max(0,min_height - dimensions[k][1])])      #The max here is necessary because the index might be negative when not using the bounds of linear_optimization and
-                                                                #binary_optimization
 
 
     for k in range(nofrectangles):  #no overlap: each circuit must be either to the left, to the right, below or above each other circuit
@@ -158,7 +158,6 @@ def sat_vlsi(width, nofrectangles, dimensions, min_height, timeout=300000): #dim
 ##    s.add(PX[indexmaxdimension][(width-dimensions[indexmaxdimension][0])//2])
 ##    s.add(PY[indexmaxdimension][(min_height - dimensions[indexmaxdimension][1])//2])
     s.add(PX[indexmindimension][(width-dimensions[indexmindimension][0])//2])
-    s.add(PY[indexmindimension][(min_height - dimensions[indexmindimension][1])//2])
 
 ##    hsymm = []                  #Horizontal symmetry breaking
 ##    px=[]
@@ -178,11 +177,48 @@ def sat_vlsi(width, nofrectangles, dimensions, min_height, timeout=300000): #dim
 ##        py+=PY[k][0:min_height-dimensions[k][1]]
 ##    s.add(lex_order(vsymm,py,'vsymm'))
 
-    end_time=time.time()
+    return PX, PY
+
+
+def bound_height(s, PY, nofrectangles, dimensions, height, literal=None):
+    """Constrain all circuits to lie under the given height.
+
+    If an activation literal is given, constraints are enforced only
+    when it is true (incremental solving through assumptions).
+    """
+    guard = [] if literal is None else [Not(literal)]
+
+    for k in range(nofrectangles):  #The max here is necessary because the index might be negative when not using the bounds of linear_optimization and
+                                    #binary_optimization
+        s.add(Or(guard + [PY[k][max(0, height - dimensions[k][1])]]))
+
+    #Symmetry breaking on the smallest circuit (see encode), vertical part
+    mindimension=min(min(dimensions[k] for k in range(nofrectangles)))
+    indexmindimension=[k for k in range(nofrectangles) if mindimension in dimensions[k]][0]
+    s.add(Or(guard + [PY[indexmindimension][(height - dimensions[indexmindimension][1])//2]]))
+
+
+def sat_vlsi(width, nofrectangles, dimensions, min_height, timeout=300000,
+             warm_start=None): #dimensions è una lista di coppie di coordinate [x,y]
+
+    s = Solver()
+
+    starting_time=time.perf_counter()
+    print('generating solver:')
+
+    PX, PY = encode(s, width, nofrectangles, dimensions, min_height)
+
+    # Phase hints from a heuristic placement (requires z3 >= 4.13)
+    if warm_start is not None and hasattr(s, 'set_initial_value'):
+        for var, val in util.order_hints(PX, PY, dimensions, warm_start):
+            s.set_initial_value(var, val)
+    bound_height(s, PY, nofrectangles, dimensions, min_height)
+
+    end_time=time.perf_counter()
     print('Model generated in', end_time - starting_time, 'seconds')
 
     #TIMEOUT:
-    s.set('timeout', timeout)
+    s.set('timeout', int(timeout))
 
     check_result = s.check()
 
@@ -201,6 +237,46 @@ def sat_vlsi(width, nofrectangles, dimensions, min_height, timeout=300000): #dim
     return None, None, s.statistics(), end_time - starting_time
 
 
+def sat_vlsi_cnf(width, nofrectangles, dimensions, min_height, timeout=300000,
+                 backend=None, warm_start=None):
+    """Same model as sat_vlsi, clauses are built as integer arrays.
+
+    The formula is solved by the given backend (z3 by default, see
+    backends module), skipping the construction of z3 expressions.
+    warm_start placement values are given as phases to the backend.
+    """
+    if backend is None:
+        backend = backends.Z3Backend()
+
+    starting_time=time.perf_counter()
+    print('generating solver:')
+
+    cnf, PX, PY = dimacs.order_encoding(width, nofrectangles, dimensions,
+                                        min_height)
+
+    end_time=time.perf_counter()
+    print('Model generated in', end_time - starting_time, 'seconds')
+
+    phases = None
+    if warm_start is not None:
+        phases = [int(var) if val else -int(var) for var, val
+                  in util.order_hints(PX, PY, dimensions, warm_start)]
+
+    result, values, statistics = backend.solve(cnf, timeout,
+                                               np.concatenate(PX + PY),
+                                               phases)
+
+    # If satisfiable
+    if result == backends.SAT:
+        return (min_height,
+                adapt_solution(dimacs.first_true(cnf, values, PX),
+                               dimacs.first_true(cnf, values, PY)),
+                statistics, end_time - starting_time)
+
+    # If unsatisfiable (or unknown)
+    return None, None, statistics, end_time - starting_time
+
+
 def adapt_solution(solutions_x, solutions_y) -> list[str]:
     """Map solutions in a format viable for the exec all script."""
     new_solutions = []
@@ -217,7 +293,50 @@ def adapt_solution(solutions_x, solutions_y) -> list[str]:
     return new_solutions
 
 
+def sat_vlsi_incremental(width, nofrectangles, dimensions, max_height,
+                         warm_start=None):
+    """Build the model once, for the largest height (incremental solving).
+
+    Return the solver, a function constraining the height (returning
+    the activation literal to be assumed), a function decoding a model
+    for a given height and the build time.
+    """
+    s = Solver()
+
+    starting_time=time.perf_counter()
+    print('generating solver:')
+
+    PX, PY = encode(s, width, nofrectangles, dimensions, max_height)
+
+    # Phase hints from a heuristic placement (requires z3 >= 4.13)
+    if warm_start is not None and hasattr(s, 'set_initial_value'):
+        for var, val in util.order_hints(PX, PY, dimensions, warm_start):
+            s.set_initial_value(var, val)
+
+    end_time=time.perf_counter()
+    print('Model generated in', end_time - starting_time, 'seconds')
+
+    def height_literal(height):
+        literal = Bool(f'height_{height}')
+        bound_height(s, PY, nofrectangles, dimensions, height, literal)
+        return literal
+
+    def decode(m, height):
+        solutions_x=[[PX[k][i] for i in range(width-dimensions[k][0] + 1) if m.evaluate(PX[k][i]) == True][0] for k in range(nofrectangles)]
+        solutions_y=[[PY[k][i] for i in range(height - dimensions[k][1] + 1) if m.evaluate(PY[k][i]) == True][0] for k in range(nofrectangles)]
+        return adapt_solution(solutions_x, solutions_y)
+
+    return s, height_literal, decode, end_time - starting_time
+
+
 linear_optimization = partial(util.linear_optimization, sat_vlsi)
 
 
+incremental_optimization = partial(util.incremental_optimization,
+                                   sat_vlsi_incremental)
+
+
 binary_optimization = partial(util.binary_optimization, sat_vlsi)
+
+
+linear_optimization_cnf = partial(util.linear_optimization, sat_vlsi_cnf)
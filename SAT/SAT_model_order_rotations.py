@@ -7,6 +7,9 @@ from math import ceil
 import re
 
 import util
+import dimacs
+import backends
+import numpy as np
 
 VARIABLE_RE = re.compile(r'p[xy]_(\d+)_(\d+)')
 
@@ -63,18 +66,22 @@ def flatten(l):
 ####################################################################################################
 
 
-def sat_vlsi(width, nofrectangles, dimensions, min_height, timeout=300000): #dimensions è una lista di coppie di coordinate [x,y]
-    
-    s = Solver()
+def _upto(P, k, j):
+    """Get [P[k][j]], or no literal if j is negative (coordinate can't be <= j)."""
+    return [P[k][j]] if j >= 0 else []
+
+
+def encode(s, width, nofrectangles, dimensions, min_height):
+    """Add the order encoding model for a plate of height min_height to s.
 
+    Circuits are not forced to lie under min_height, see bound_height.
+    Return PX, PY and R variables.
+    """
     PX=[[Bool(f'px_{k}_{i}') for i in range(width-min(dimensions[k])+1)] for k in range(nofrectangles)]      #The x coordinate of circuit k is <= i
     PY=[[Bool(f'py_{k}_{j}') for j in range(min_height-min(dimensions[k])+1)] for k in range(nofrectangles)]  #The y coordinate of circuit k is <= i 
     LR=[[Bool(f'lr_{k}_{k1}') for k1 in range(nofrectangles)] for k in range(nofrectangles)]                #LR[k][k1] if k is at the left of k1
     UD=[[Bool(f'ud_{k}_{k1}') for k1 in range(nofrectangles)] for k in range(nofrectangles)]                #UD[k][k1] if k is under k1
     R=[Bool(f'r_{k}') for k in range(nofrectangles)]                                                        #R[k] iff k is rotated
-      
-    starting_time=time.time()
-    print('generating solver:')
 
     for k in range(nofrectangles):  #Order encoding on the PX, PY variables
         for i in range(width-min(dimensions[k])): 
@@ -83,10 +90,8 @@ def sat_vlsi(width, nofrectangles, dimensions, min_height, timeout=300000): #dim
             s.add(Or(Not(PY[k][j]),PY[k][j+1]))
 
     for k in range(nofrectangles):  #each circuit must have an origin that makes it remain inside the outer rectangle
-        s.add(Or(R[k],PX[k][width - dimensions[k][0]]))           #if k is not rotated, its origin has x coordinate <= W-w(k)
-        s.add(Or(Not(R[k]), PX[k][width-dimensions[k][1]]))         #if k is rotated, its origin has  coordinate <= W-h(k)
-        s.add(Or(R[k],PY[k][max(0, min_height - dimensions[k][1])]))        #Same for the y coordinate. The max is needed to avoid acessing PY[k] with negative indices (this may happen if
-        s.add(Or(Not(R[k]),PY[k][max(0,min_height - dimensions[k][0])]))    #the height 
+        s.add(Or([R[k]] + _upto(PX, k, width - dimensions[k][0])))           #if k is not rotated, its origin has x coordinate <= W-w(k)
+        s.add(Or([Not(R[k])] + _upto(PX, k, width - dimensions[k][1])))      #if k is rotated, its origin has  coordinate <= W-h(k). If the index is negative that orientation is not allowed at all
 
     for k in range(nofrectangles):  #no overlap: each circuit must be either to the left, to the right, below or above each other circuit
         for k1 in range(k+1, nofrectangles):
@@ -219,8 +224,6 @@ def sat_vlsi(width, nofrectangles, dimensions, min_height, timeout=300000): #dim
     
     s.add(Or(R[indexmindimension], PX[indexmindimension][(width-dimensions[indexmindimension][0])//2]))
     s.add(Or(Not(R[indexmindimension]), PX[indexmindimension][(width-dimensions[indexmindimension][1])//2]))
-    s.add(Or(R[indexmindimension], PY[indexmindimension][(min_height-dimensions[indexmindimension][1])//2]))
-    s.add(Or(Not(R[indexmindimension]), PY[indexmindimension][(min_height-dimensions[indexmindimension][0])//2]))
     
 ##    maxdimension=max(max(dimensions[k] for k in range(nofrectangles)))
 ##    indexmaxdimension=[k for k in range(nofrectangles) if maxdimension in dimensions[k]][0]
@@ -262,12 +265,51 @@ def sat_vlsi(width, nofrectangles, dimensions, min_height, timeout=300000): #dim
 ##    PYVR=[vsymmconsr[k]+PY[k][min_height-dimensions[k][0]:] for k in range(nofrectangles)]
 ##    s.add(Or(Not(R[k]), lex_order(flatten(PY),flatten(PYVR),'vsymmr')))
                 
-                    
-    end_time=time.time()
+
+    return PX, PY, R
+
+
+def bound_height(s, PY, R, nofrectangles, dimensions, height, literal=None):
+    """Constrain all circuits to lie under the given height.
+
+    If an activation literal is given, constraints are enforced only
+    when it is true (incremental solving through assumptions).
+    """
+    guard = [] if literal is None else [Not(literal)]
+
+    for k in range(nofrectangles):  #if k is not rotated its origin has y coordinate <= H-h(k), if it is rotated <= H-w(k).
+                                    #If the index is negative that orientation is not allowed at all
+        s.add(Or(guard + [R[k]] + _upto(PY, k, height - dimensions[k][1])))
+        s.add(Or(guard + [Not(R[k])] + _upto(PY, k, height - dimensions[k][0])))
+
+    #Symmetry breaking on the smallest circuit (see encode), vertical part
+    mindimension=min(min(dimensions[k] for k in range(nofrectangles)))
+    indexmindimension=[k for k in range(nofrectangles) if mindimension in dimensions[k]][0]
+    s.add(Or(guard + [R[indexmindimension]] + _upto(PY, indexmindimension, (height-dimensions[indexmindimension][1])//2)))
+    s.add(Or(guard + [Not(R[indexmindimension])] + _upto(PY, indexmindimension, (height-dimensions[indexmindimension][0])//2)))
+
+
+def sat_vlsi(width, nofrectangles, dimensions, min_height, timeout=300000,
+             warm_start=None): #dimensions è una lista di coppie di coordinate [x,y]
+
+    s = Solver()
+
+    starting_time=time.perf_counter()
+    print('generating solver:')
+
+    PX, PY, R = encode(s, width, nofrectangles, dimensions, min_height)
+
+    # Phase hints from a heuristic placement (requires z3 >= 4.13)
+    if warm_start is not None and hasattr(s, 'set_initial_value'):
+        for var, val in util.order_hints(PX, PY, dimensions, warm_start, R):
+            s.set_initial_value(var, val)
+    bound_height(s, PY, R, nofrectangles, dimensions, min_height)
+
+    end_time=time.perf_counter()
     print('Model generated in', end_time - starting_time, 'seconds')
 
     #TIMEOUT:
-    s.set('timeout', timeout)
+    s.set('timeout', int(timeout))
 
     check_result = s.check()
 
@@ -288,6 +330,47 @@ def sat_vlsi(width, nofrectangles, dimensions, min_height, timeout=300000): #dim
     return None, None, s.statistics(), end_time - starting_time
 
 
+def sat_vlsi_cnf(width, nofrectangles, dimensions, min_height, timeout=300000,
+                 backend=None, warm_start=None):
+    """Same model as sat_vlsi, clauses are built as integer arrays.
+
+    The formula is solved by the given backend (z3 by default, see
+    backends module), skipping the construction of z3 expressions.
+    warm_start placement values are given as phases to the backend.
+    """
+    if backend is None:
+        backend = backends.Z3Backend()
+
+    starting_time=time.perf_counter()
+    print('generating solver:')
+
+    cnf, PX, PY, R = dimacs.order_encoding_rotations(
+        width, nofrectangles, dimensions, min_height)
+
+    end_time=time.perf_counter()
+    print('Model generated in', end_time - starting_time, 'seconds')
+
+    phases = None
+    if warm_start is not None:
+        phases = [int(var) if val else -int(var) for var, val
+                  in util.order_hints(PX, PY, dimensions, warm_start, R)]
+
+    result, values, statistics = backend.solve(cnf, timeout,
+                                               np.concatenate(PX + PY + [R]),
+                                               phases)
+
+    # If satisfiable
+    if result == backends.SAT:
+        return (min_height,
+                adapt_solution(dimacs.first_true(cnf, values, PX),
+                               dimacs.first_true(cnf, values, PY),
+                               values[R]),
+                statistics, end_time - starting_time)
+
+    # If unsatisfiable (or unknown)
+    return None, None, statistics, end_time - starting_time
+
+
 def adapt_solution(solutions_x, solutions_y, R) -> list[str]:
     """Map solutions in a format viable for the exec all script."""
     new_solutions = []
@@ -308,7 +391,51 @@ def adapt_solution(solutions_x, solutions_y, R) -> list[str]:
     return new_solutions
 
 
+def sat_vlsi_incremental(width, nofrectangles, dimensions, max_height,
+                         warm_start=None):
+    """Build the model once, for the largest height (incremental solving).
+
+    Return the solver, a function constraining the height (returning
+    the activation literal to be assumed), a function decoding a model
+    for a given height and the build time.
+    """
+    s = Solver()
+
+    starting_time=time.perf_counter()
+    print('generating solver:')
+
+    PX, PY, R = encode(s, width, nofrectangles, dimensions, max_height)
+
+    # Phase hints from a heuristic placement (requires z3 >= 4.13)
+    if warm_start is not None and hasattr(s, 'set_initial_value'):
+        for var, val in util.order_hints(PX, PY, dimensions, warm_start, R):
+            s.set_initial_value(var, val)
+
+    end_time=time.perf_counter()
+    print('Model generated in', end_time - starting_time, 'seconds')
+
+    def height_literal(height):
+        literal = Bool(f'height_{height}')
+        bound_height(s, PY, R, nofrectangles, dimensions, height, literal)
+        return literal
+
+    def decode(m, height):
+        solutions_x=[[px for px in PX[k] if m.evaluate(px, model_completion=True) == True][0] for k in range(nofrectangles)]
+        solutions_y=[[py for py in PY[k] if m.evaluate(py, model_completion=True) == True][0] for k in range(nofrectangles)]
+        rotations = [is_true(m.evaluate(r, model_completion=True)) for r in R]
+        return adapt_solution(solutions_x, solutions_y, rotations)
+
+    return s, height_literal, decode, end_time - starting_time
+
+
 linear_optimization = partial(util.linear_optimization, sat_vlsi)
 
 
+incremental_optimization = partial(util.incremental_optimization,
+                                   sat_vlsi_incremental)
+
+
 binary_optimization = partial(util.binary_optimization, sat_vlsi)
+
+
+linear_optimization_cnf = partial(util.linear_optimization, sat_vlsi_cnf)
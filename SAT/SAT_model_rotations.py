@@ -67,18 +67,10 @@ def vperm(A,min_height,dimensions):
 ####################################################################################################
                 
         
-def sat_vlsi(width, nofrectangles, dimensions, max_height, timeout=300000): #dimensions è una lista di coppie di coordinate [x,y]
+def sat_vlsi(width, nofrectangles, dimensions, min_height, timeout=300000): #dimensions è una lista di coppie di coordinate [x,y]
 
     s = Solver()
 
-    total_area = 0
-    for i in range(nofrectangles):
-        total_area += dimensions[i][0] * dimensions[i][1]
-    if total_area % width == 0:         #If total area is not divisible by width we round up
-        min_height = max(total_area // width, max(min(dimensions[i][0], dimensions[i][1]) for i in range(nofrectangles)))
-    else:
-        min_height = max(total_area // width + 1, max(min(dimensions[i][0], dimensions[i][1]) for i in range(nofrectangles)))
-    
     X = [[[Bool(f'x_{i}_{j}_{k}') for i in range(width - dimensions[k][0] + 1)] for j in range(min_height - dimensions[k][1] + 1)] for k in range(nofrectangles)]  #max_height--->min_height
     Xr = [[[Bool(f'x_{i}_{j}_{k+nofrectangles}') for i in range(width - dimensions[k][1] + 1)] for j in range(min_height - dimensions[k][0] + 1)] for k in range(nofrectangles)]
     #R=[Bool(f'Rotated_{k}') for k in range(nofrectangles)] #Per ogni rettangolo k, R[k] è True se e solo se k è ruotato
@@ -96,7 +88,7 @@ def sat_vlsi(width, nofrectangles, dimensions, max_height, timeout=300000): #dim
             for v in flatten(Xr[k]):
                 s.add(Not(v))
 
-    starting_time=time.time()
+    starting_time=time.perf_counter()
     print('generating solver:')
     
     for k in range(nofrectangles):  #ogni rettangolo ha esattamente un'origine
@@ -135,10 +127,10 @@ def sat_vlsi(width, nofrectangles, dimensions, max_height, timeout=300000): #dim
            #2) per ogni rettangolo k, Se X[k][j][i], allora i + dimensions[k][0] <= width
            #3) analogo per l'altezza
                                 
-    end_time=time.time()
+    end_time=time.perf_counter()
     print('Model generated in', end_time - starting_time, 'seconds')
 
-    s.set('timeout', timeout)
+    s.set('timeout', int(timeout))
 
     check_result = s.check()
 
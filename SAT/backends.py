@@ -0,0 +1,222 @@
+"""SAT solving backends for CNF formulas (see the dimacs module).
+
+A backend solves a dimacs.CNF formula and returns statistics with the
+same interface as z3 ones (keys and get_key_value, see
+util.dict_from_stats), always including the solving time as 'time'
+and the time spent loading the formula into the solver (writing the
+DIMACS file) as 'load_time'.
+
+Available backends (see get_backend):
+* z3: z3 SAT core, formula loaded in bulk.
+* pysat[:NAME]: any solver from the PySAT library (Glucose 4 by
+  default). Solvers which can't be interrupted (e.g. CaDiCaL) ignore
+  the timeout.
+* dimacs:COMMAND: any executable reading a DIMACS file and answering
+  in the SAT competition output format (e.g. dimacs:kissat).
+
+Python >= 3.8.
+"""
+import os
+import shlex
+import tempfile
+import threading
+import subprocess
+import time
+
+import numpy as np
+
+
+SAT = 'sat'
+UNSAT = 'unsat'
+UNKNOWN = 'unknown'
+
+DEFAULT_PYSAT_SOLVER = 'glucose4'
+
+# Exit codes of SAT competition solvers
+SAT_EXIT_CODE = 10
+UNSAT_EXIT_CODE = 20
+
+
+class Statistics:
+    """Solver statistics, with the same interface as z3 ones."""
+
+    def __init__(self, values: dict):
+        self._values = dict(values)
+
+    def keys(self):
+        return list(self._values.keys())
+
+    def get_key_value(self, key):
+        return self._values[key]
+
+    def __repr__(self):
+        return f'Statistics({self._values})'
+
+
+class Z3Backend:
+    """Solve with the z3 SAT core."""
+    name = 'z3'
+
+    def solve(self, cnf, timeout, variables=None, phases=None):
+        """Solve the formula, timeout is given in milliseconds.
+
+        Return (result, values, statistics): values is a boolean array
+        indexed by variable (None if not satisfiable). If variables is
+        given, only those are guaranteed to be decoded. phases is an
+        optional list of literals, preferred by the solver (hints).
+        """
+        import z3
+
+        starting_time = time.perf_counter()
+        s = z3.Solver()
+        cnf.load_z3(s)
+        # Phase hints (requires z3 >= 4.13)
+        if phases and hasattr(s, 'set_initial_value'):
+            for literal in phases:
+                s.set_initial_value(z3.Bool(abs(literal)), literal > 0)
+        load_time = time.perf_counter() - starting_time
+
+        s.set('timeout', int(max(0, timeout - load_time * 1000)))
+        starting_time = time.perf_counter()
+        check_result = s.check()
+        solve_time = time.perf_counter() - starting_time
+
+        statistics = s.statistics()
+        statistics = {key: statistics.get_key_value(key)
+                      for key in statistics.keys()}
+        statistics['time'] = solve_time
+        statistics['load_time'] = load_time
+
+        if check_result == z3.sat:
+            return (SAT, cnf.z3_values(s.model(), variables),
+                    Statistics(statistics))
+        if check_result == z3.unsat:
+            return UNSAT, None, Statistics(statistics)
+        return UNKNOWN, None, Statistics(statistics)
+
+
+def _interrupt(solver):
+    try:
+        solver.interrupt()
+    except NotImplementedError:
+        pass
+
+
+class PySATBackend:
+    """Solve with a CDCL solver from the PySAT library."""
+
+    def __init__(self, solver_name=DEFAULT_PYSAT_SOLVER):
+        self.solver_name = solver_name
+
+    @property
+    def name(self):
+        return f'pysat:{self.solver_name}'
+
+    def solve(self, cnf, timeout, variables=None, phases=None):
+        from pysat.solvers import Solver
+
+        starting_time = time.perf_counter()
+        with Solver(name=self.solver_name) as solver:
+            for chunk in cnf.iter_clauses():
+                solver.append_formula(chunk.tolist())
+            if phases:
+                solver.set_phases(phases)
+            load_time = time.perf_counter() - starting_time
+
+            # Interrupt the solver when the time is over
+            timer = threading.Timer(max(0, timeout / 1000 - load_time),
+                                    _interrupt, (solver,))
+            starting_time = time.perf_counter()
+            timer.start()
+            try:
+                result = solver.solve_limited(expect_interrupt=True)
+            finally:
+                timer.cancel()
+
+            statistics = dict(solver.accum_stats())
+            statistics['time'] = time.perf_counter() - starting_time
+            statistics['load_time'] = load_time
+
+            if result:
+                values = np.zeros(cnf.num_vars + 1, dtype=bool)
+                model = np.array(solver.get_model(), dtype=np.int64)
+                values[np.abs(model)] = model > 0
+                return SAT, values, Statistics(statistics)
+        if result is None:
+            return UNKNOWN, None, Statistics(statistics)
+        return UNSAT, None, Statistics(statistics)
+
+
+class DimacsBackend:
+    """Solve with an external executable reading a DIMACS file.
+
+    The solver output shall follow the SAT competition format
+    ('s SATISFIABLE' and 'v' lines).
+    """
+
+    def __init__(self, command):
+        self.command = shlex.split(command)
+
+    @property
+    def name(self):
+        return f'dimacs:{shlex.join(self.command)}'
+
+    def solve(self, cnf, timeout, variables=None, phases=None):
+        # Phases cannot be given through a DIMACS file, they are ignored
+        fd, cnf_filename = tempfile.mkstemp(suffix='.cnf')
+        try:
+            starting_time = time.perf_counter()
+            with os.fdopen(fd, 'w') as fout:
+                cnf.write(fout)
+            write_time = time.perf_counter() - starting_time
+
+            starting_time = time.perf_counter()
+            try:
+                process = subprocess.run(
+                    [*self.command, cnf_filename], capture_output=True,
+                    text=True,
+                    timeout=max(0, timeout / 1000 - write_time))
+            except subprocess.TimeoutExpired:
+                return UNKNOWN, None, Statistics(
+                    {'time': time.perf_counter() - starting_time,
+                     'load_time': write_time})
+        finally:
+            os.unlink(cnf_filename)
+
+        statistics = Statistics({'time': time.perf_counter() - starting_time,
+                                 'load_time': write_time,
+                                 'exit_code': process.returncode})
+
+        status_lines = [line for line in process.stdout.splitlines()
+                        if line.startswith('s ')]
+        status = status_lines[-1][2:].strip() if status_lines else ''
+        if status == 'SATISFIABLE' or (not status and process.returncode
+                                       == SAT_EXIT_CODE):
+            values = np.zeros(cnf.num_vars + 1, dtype=bool)
+            literals = np.array(
+                [int(lit) for line in process.stdout.splitlines()
+                 if line.startswith('v ') for lit in line[2:].split()],
+                dtype=np.int64)
+            literals = literals[literals != 0]
+            values[np.abs(literals)] = literals > 0
+            return SAT, values, statistics
+        if status == 'UNSATISFIABLE' or (not status and process.returncode
+                                         == UNSAT_EXIT_CODE):
+            return UNSAT, None, statistics
+        if not status and process.returncode != 0:
+            raise RuntimeError(f'{self.name} failed (exit code '
+                               f'{process.returncode}): '
+                               f'{process.stderr.strip()}')
+        return UNKNOWN, None, statistics
+
+
+def get_backend(spec='z3'):
+    """Get a backend from its specification (see module doc)."""
+    name, _, argument = spec.partition(':')
+    if name == 'z3':
+        return Z3Backend()
+    if name == 'pysat':
+        return PySATBackend(argument or DEFAULT_PYSAT_SOLVER)
+    if name == 'dimacs' and argument:
+        return DimacsBackend(argument)
+    raise ValueError(f'unknown SAT backend: {spec}')
@@ -0,0 +1,357 @@
+"""Integer clause emitter (DIMACS CNF) for the order encoding models.
+
+Clauses are built as integer literal arrays (vectorised through numpy
+where possible) instead of z3 expressions, then either streamed to a
+DIMACS file or loaded in bulk into a solver. Variables keep the names
+used by the z3 models (px_k_i, py_k_j, lr_k_k1, ud_k_k1, r_k), so that
+solutions can be decoded by the usual adapt_solution functions.
+
+Can also be used as a script to export an instance, see -h.
+
+Python >= 3.8.
+"""
+import io
+import sys
+import json
+import argparse
+
+import numpy as np
+
+
+# Number of literals written at once when dumping (about, chunks hold
+# whole clauses)
+WRITE_CHUNK_SIZE = 1 << 20
+
+
+class CNF:
+    """Propositional formula in conjunctive normal form.
+
+    Variables are positive integers (starting from 1), literals are
+    signed variables. Clauses are stored in batches: 2D arrays where
+    each row is a clause. Shorter clauses can share a batch by repeating
+    one of their literals (see pad).
+    """
+
+    def __init__(self):
+        self.names = [None]
+        self._batches = []
+
+    @property
+    def num_vars(self) -> int:
+        return len(self.names) - 1
+
+    @property
+    def num_clauses(self) -> int:
+        return sum(len(batch) for batch in self._batches)
+
+    def new_vars(self, names) -> np.ndarray:
+        """Allocate a new variable for each given name, return them."""
+        start = len(self.names)
+        self.names.extend(names)
+        return np.arange(start, len(self.names))
+
+    def add_clauses(self, clauses):
+        """Add a batch of clauses (2D array-like of literals)."""
+        clauses = np.asarray(clauses, dtype=np.int64)
+        if clauses.size:
+            self._batches.append(clauses.reshape(len(clauses), -1))
+
+    def add_clause(self, *literals):
+        self.add_clauses([literals])
+
+    def iter_clauses(self):
+        """Iterate over batches of clauses (2D arrays of literals)."""
+        yield from self._batches
+
+    def iter_literals(self):
+        """Iterate over flat DIMACS chunks (clauses terminated by 0).
+
+        Chunks hold whole clauses, each one ends with a 0.
+        """
+        for batch in self._batches:
+            terminated = np.hstack(
+                (batch, np.zeros((len(batch), 1), dtype=batch.dtype)))
+            rows = max(1, WRITE_CHUNK_SIZE // terminated.shape[1])
+            for start in range(0, len(terminated), rows):
+                yield terminated[start:start + rows].ravel()
+
+    def write(self, fp=sys.stdout):
+        """Dump the formula in DIMACS format."""
+        fp.write(f'p cnf {self.num_vars} {self.num_clauses}\n')
+        # One clause per line, as expected by stricter parsers
+        for chunk in self.iter_literals():
+            fp.write(' '.join(map(str, chunk.tolist()))
+                     .replace(' 0 ', ' 0\n'))
+            fp.write('\n')
+
+    def to_string(self) -> str:
+        buffer = io.StringIO()
+        self.write(buffer)
+        return buffer.getvalue()
+
+    def load_z3(self, solver):
+        """Load all clauses in a z3 solver (bulk DIMACS parsing).
+
+        z3 names DIMACS variable v as Bool(v), see z3_values.
+        """
+        solver.from_string(self.to_string())
+
+    def z3_values(self, model, variables=None) -> np.ndarray:
+        """Get the truth value of variables from a z3 model.
+
+        The returned array is indexed by variable. If variables is
+        given, only those are evaluated (the others are left false).
+        """
+        from z3 import Bool, is_true
+
+        if variables is None:
+            variables = range(1, len(self.names))
+        values = np.zeros(len(self.names), dtype=bool)
+        for var in map(int, variables):
+            values[var] = is_true(model.evaluate(Bool(var),
+                                                 model_completion=True))
+        return values
+
+
+def pad(clauses) -> np.ndarray:
+    """Build a fixed width batch from clauses of different lengths.
+
+    Clauses are padded by repeating their first literal, which does not
+    change their meaning.
+    """
+    width = max(map(len, clauses))
+    return np.array([[*c, *(c[0],) * (width - len(c))] for c in clauses],
+                    dtype=np.int64)
+
+
+def _order_vars(cnf, prefix, lengths):
+    """Allocate order encoding variables prefix_k_i, i < lengths[k]."""
+    return [cnf.new_vars(f'{prefix}_{k}_{i}' for i in range(length))
+            for k, length in enumerate(lengths)]
+
+
+def _order_chains(cnf, P):
+    """Order encoding: P[k][i] -> P[k][i + 1]."""
+    for p in P:
+        cnf.add_clauses(np.column_stack((-p[:-1], p[1:])))
+
+
+def _pair_clauses(cnf, heads, p, q, shift, start, stop):
+    """Non overlapping clauses between two circuits along one axis.
+
+    For each i in start..stop - 1, add the clause:
+    heads \\/ p[i] \\/ -q[i + shift]
+    where literals with an index out of range are omitted. Clauses only
+    made of heads are skipped (see the z3 models).
+    """
+    i = np.arange(start, stop)
+    has_p = (i >= 0) & (i < len(p))
+    has_q = (i + shift >= 0) & (i + shift < len(q))
+
+    heads = [np.full(len(i), head, dtype=np.int64) for head in heads]
+    p_lits = p[np.clip(i, 0, len(p) - 1)]
+    q_lits = -q[np.clip(i + shift, 0, len(q) - 1)]
+
+    for mask, literals in ((has_p & has_q, (p_lits, q_lits)),
+                           (has_p & ~has_q, (p_lits,)),
+                           (~has_p & has_q, (q_lits,))):
+        if mask.any():
+            cnf.add_clauses(np.column_stack(
+                [column[mask] for column in (*heads, *literals)]))
+
+
+def _relative_vars(cnf, prefix, n):
+    """Allocate an n x n matrix of relative position variables."""
+    return cnf.new_vars(f'{prefix}_{k}_{k1}' for k in range(n)
+                        for k1 in range(n)).reshape(n, n)
+
+
+def _smallest_circuit(dimensions) -> int:
+    mindimension = min(min(d) for d in dimensions)
+    return [k for k, d in enumerate(dimensions) if mindimension in d][0]
+
+
+def order_encoding(width, nofrectangles, dimensions, height):
+    """Build the order encoding model without rotations.
+
+    Same clauses as SAT_model_order (encode and bound_height). Return
+    the formula and PX, PY variables (one array for each circuit).
+    """
+    n = nofrectangles
+    w = np.array([d[0] for d in dimensions])
+    h = np.array([d[1] for d in dimensions])
+
+    cnf = CNF()
+    PX = _order_vars(cnf, 'px', width - w + 1)
+    PY = _order_vars(cnf, 'py', height - h + 1)
+    LR = _relative_vars(cnf, 'lr', n)
+    UD = _relative_vars(cnf, 'ud', n)
+
+    _order_chains(cnf, PX)
+    _order_chains(cnf, PY)
+
+    # Each circuit must have an origin (inside the plate)
+    cnf.add_clauses([[PX[k][width - w[k]]] for k in range(n)])
+    cnf.add_clauses([[PY[k][max(0, height - h[k])]] for k in range(n)])
+
+    # No overlap: left, right, below or above
+    ks, k1s = np.triu_indices(n, 1)
+    cnf.add_clauses(np.column_stack((LR[ks, k1s], LR[k1s, ks],
+                                     UD[ks, k1s], UD[k1s, ks])))
+
+    for k, k1 in zip(ks.tolist(), k1s.tolist()):
+        # If k is on the left of k1 and x(k) <= i, then x(k1) > i + w(k)
+        start, stop = -max(w[k], w[k1]), width - min(w[k], w[k1])
+        _pair_clauses(cnf, [-LR[k, k1]], PX[k], PX[k1], w[k], start, stop)
+        _pair_clauses(cnf, [-LR[k1, k]], PX[k1], PX[k], w[k1], start, stop)
+
+        start, stop = -max(h[k], h[k1]), height - min(h[k], h[k1])
+        _pair_clauses(cnf, [-UD[k, k1]], PY[k], PY[k1], h[k], start, stop)
+        _pair_clauses(cnf, [-UD[k1, k]], PY[k1], PY[k], h[k1], start, stop)
+
+    # Circuits too large to be side by side
+    mask = w[ks] + w[k1s] > width
+    cnf.add_clauses(-np.concatenate((LR[ks, k1s][mask],
+                                     LR[k1s, ks][mask]))[:, None])
+    mask = h[ks] + h[k1s] > height
+    cnf.add_clauses(-np.concatenate((UD[ks, k1s][mask],
+                                     UD[k1s, ks][mask]))[:, None])
+
+    # Smallest circuit in the bottom left part of its domain
+    k = _smallest_circuit(dimensions)
+    cnf.add_clause(PX[k][(width - w[k]) // 2])
+    cnf.add_clause(PY[k][(height - h[k]) // 2])
+
+    return cnf, PX, PY
+
+
+def _rotated_pair_clauses(cnf, head, r, p, q, sides, start, stop):
+    """Non overlapping clauses for both orientations of a circuit."""
+    _pair_clauses(cnf, [head, r], p, q, sides[0], start, stop)
+    _pair_clauses(cnf, [head, -r], p, q, sides[1], start, stop)
+
+
+def _rotated_exclusions(cnf, R, REL, ks, k1s, a, b, bound):
+    """Circuits too large to be side by side, for each orientation.
+
+    a and b are the sizes of the circuits along the axis when not
+    rotated, and when rotated respectively.
+    """
+    for rk, rk1, sk, sk1 in ((1, 1, a, a), (1, -1, a, b),
+                             (-1, 1, b, a), (-1, -1, b, b)):
+        mask = sk[ks] + sk1[k1s] > bound
+        # Clause literal is R[k] if k is not rotated in this combination
+        guards = np.column_stack((rk * R[ks][mask], rk1 * R[k1s][mask]))
+        cnf.add_clauses(np.column_stack((guards, -REL[ks, k1s][mask])))
+        cnf.add_clauses(np.column_stack((guards, -REL[k1s, ks][mask])))
+
+
+def order_encoding_rotations(width, nofrectangles, dimensions, height):
+    """Build the order encoding model with rotations.
+
+    Same clauses as SAT_model_order_rotations (encode and bound_height).
+    Return the formula and PX, PY, R variables.
+    """
+    n = nofrectangles
+    w = np.array([d[0] for d in dimensions])
+    h = np.array([d[1] for d in dimensions])
+    m = np.minimum(w, h)
+
+    cnf = CNF()
+    PX = _order_vars(cnf, 'px', width - m + 1)
+    PY = _order_vars(cnf, 'py', height - m + 1)
+    LR = _relative_vars(cnf, 'lr', n)
+    UD = _relative_vars(cnf, 'ud', n)
+    R = cnf.new_vars(f'r_{k}' for k in range(n))
+
+    _order_chains(cnf, PX)
+    _order_chains(cnf, PY)
+
+    # Each circuit must have an origin (inside the plate) for its
+    # orientation, orientations which can't fit are not allowed
+    origins = []
+    for k in range(n):
+        for P, bound, unrotated, rotated in ((PX, width, w[k], h[k]),
+                                             (PY, height, h[k], w[k])):
+            origins.append([R[k]] + ([P[k][bound - unrotated]]
+                                     if bound >= unrotated else []))
+            origins.append([-R[k]] + ([P[k][bound - rotated]]
+                                      if bound >= rotated else []))
+    cnf.add_clauses(pad(origins))
+
+    # No overlap: left, right, below or above
+    ks, k1s = np.triu_indices(n, 1)
+    cnf.add_clauses(np.column_stack((LR[ks, k1s], LR[k1s, ks],
+                                     UD[ks, k1s], UD[k1s, ks])))
+
+    # Square circuits shall not be rotated
+    cnf.add_clauses(-R[w == h][:, None])
+
+    for k, k1 in zip(ks.tolist(), k1s.tolist()):
+        sizes = (w[k], h[k], w[k1], h[k1])
+        start, stop = -max(sizes), width - min(sizes)
+        _rotated_pair_clauses(cnf, -LR[k, k1], R[k], PX[k], PX[k1],
+                              (w[k], h[k]), start, stop)
+        _rotated_pair_clauses(cnf, -LR[k1, k], R[k1], PX[k1], PX[k],
+                              (w[k1], h[k1]), start, stop)
+
+        start, stop = -max(sizes), height - min(sizes)
+        _rotated_pair_clauses(cnf, -UD[k, k1], R[k], PY[k], PY[k1],
+                              (h[k], w[k]), start, stop)
+        _rotated_pair_clauses(cnf, -UD[k1, k], R[k1], PY[k1], PY[k],
+                              (h[k1], w[k1]), start, stop)
+
+    _rotated_exclusions(cnf, R, LR, ks, k1s, w, h, width)
+    _rotated_exclusions(cnf, R, UD, ks, k1s, h, w, height)
+
+    # Smallest circuit in the bottom left part of its domain
+    k = _smallest_circuit(dimensions)
+    symmetry = []
+    for P, bound, unrotated, rotated in ((PX, width, w[k], h[k]),
+                                         (PY, height, h[k], w[k])):
+        symmetry.append([R[k]] + ([P[k][(bound - unrotated) // 2]]
+                                  if bound >= unrotated else []))
+        symmetry.append([-R[k]] + ([P[k][(bound - rotated) // 2]]
+                                   if bound >= rotated else []))
+    cnf.add_clauses(pad(symmetry))
+
+    return cnf, PX, PY, R
+
+
+def first_true(cnf, values, P) -> list:
+    """Decode order encoding variables into their (z3 style) names.
+
+    For each circuit, the first true variable gives its coordinate.
+    """
+    return [cnf.names[p[np.argmax(values[p])]] for p in P]
+
+
+def main(instance_file, height, rotations=False, fp=sys.stdout):
+    with open(instance_file) as fin:
+        instance_data = json.load(fin)
+
+    encoding = order_encoding_rotations if rotations else order_encoding
+    cnf = encoding(instance_data['width'], instance_data['n'],
+                   instance_data['circuits'], height)[0]
+    cnf.write(fp)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Export the order encoding model of an instance, for '
+                    'a given height, in DIMACS format.')
+    parser.add_argument('instance', help='json instance file')
+    parser.add_argument('height', type=int, help='height of the plate')
+    parser.add_argument('-r', '--rotation', dest='rotation',
+                        action='store_true', default=False,
+                        help='if specified, the rotation aware model will be '
+                             'used')
+    parser.add_argument('-o', '--output', dest='output', default=None,
+                        help='output file (default: stdout)')
+    args = parser.parse_args()
+
+    if args.output is None:
+        main(args.instance, args.height, args.rotation)
+    else:
+        with open(args.output, 'w') as fout:
+            main(args.instance, args.height, args.rotation, fout)
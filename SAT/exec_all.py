@@ -1,5 +1,10 @@
 """Launch the sat model on all given instances.
 
+Instances can be solved in parallel (see --jobs). In that case each
+instance is solved in its own worker process (hence with its own z3
+context and timeout budget) and the output of each worker is printed
+in instance order.
+
 Python >= 3.8.
 """
 import re
@@ -7,20 +12,49 @@ import sys
 import glob
 import json
 import datetime
+import io
 import os
 import os.path as pt
 import argparse
+import tempfile
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, redirect_stdout
+from functools import partial
+
+import z3
 
+import _paths  # noqa: F401 (shared modules of the parent directory)
 
+import solve_cache
+import manifest
+import memory
+import profiling
+import results_db
+import timing
 from SAT_model import linear_optimization as sat_vlsi
 from SAT_model_rotations import linear_optimization as sat_vlsi_rot
 from SAT_model_order import linear_optimization as sat_vlsi_ord
 from SAT_model_order_rotations import linear_optimization as sat_vlsi_ord_rot
+from SAT_model_order import incremental_optimization as sat_vlsi_ord_inc
+from SAT_model_order_rotations import (
+    incremental_optimization as sat_vlsi_ord_rot_inc)
+from SAT_model_order import linear_optimization_cnf as sat_vlsi_ord_cnf
+from SAT_model_order_rotations import (
+    linear_optimization_cnf as sat_vlsi_ord_rot_cnf)
+import SAT_model_order
+import SAT_model_order_rotations
+import backends
+import util
 
 
 # Path to json input instances, converted using convert_instances.py
 DEFAULT_INSTANCES_DIR = pt.join(pt.dirname(__file__), '..', 'instances_json')
 DEFAULT_OUTPUT_DIR = pt.join(pt.dirname(__file__), 'out')
+DEFAULT_TIMEOUT = 300
+# Both models write in the same output directory
+ROTATION_MANIFEST_BASENAME = 'manifest_rot.jsonl'
 
 SAT_INSTANCE_DECODER_RE = re.compile(r'x_([0-9]+)_([0-9]+)_([0-9]+)')
 
@@ -36,29 +70,117 @@ def dump_statistics(statistics, build_time, fp=sys.stdout):
     statistics['build_time'] = build_time
 
     json.dump(statistics, fp, indent=4)
-    
 
-def main(solve_func, rot):
-    # Solve SAT problem for each instance
-    for instance_file in sorted(
-            glob.glob(pt.join(DEFAULT_INSTANCES_DIR, '*'))):
-        with open(instance_file) as fin:
-            instance_data = json.load(fin)
 
-        print(f'solving instance: {pt.basename(instance_file)}')
-        model_results = solve_func(instance_data['width'], instance_data['n'],
-                                   instance_data['circuits'],
-                                   instance_data['max_height'],
-                                   rotations=rot)
+@contextmanager
+def atomic_open(filename):
+    """Open a temporary file which replaces filename once closed.
+
+    Readers of filename never see a partially written file: either the
+    old content or the new one.
+    """
+    fd, tmp_filename = tempfile.mkstemp(dir=pt.dirname(filename),
+                                        prefix='.tmp-')
+    try:
+        # mkstemp creates private files, use the usual permissions
+        os.chmod(tmp_filename, solve_cache.FILE_MODE)
+        with os.fdopen(fd, 'w') as fout:
+            yield fout
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        os.unlink(tmp_filename)
+        raise
+
+
+def solve_instance(instance_file, solve_func, rot, timeout=DEFAULT_TIMEOUT,
+                   warm_start=False, cache=None, parameters=None,
+                   sweep=None, db=None, memory_limit=None,
+                   trace_memory=False, profile=False):
+    """Solve a single instance file and dump results on file.
+
+    timeout is given in seconds and is the budget of the instance. If
+    warm_start is True, the heuristic placement of the instance (if
+    available) is passed to solve_func.
+
+    If a cache is given (see solve_cache), results of a solve with the
+    same instance, sources and parameters (describing solve_func) are
+    replayed instead. If a sweep manifest (or a results database) is
+    given, the state (the result) of the instance is recorded in it.
+    The peak memory of the solve is measured (see memory.py),
+    MemoryLimitExceeded is raised if it exceeds memory_limit (bytes).
+    With profile, model construction (and solving) and decoding are
+    profiled (see profiling.py).
+    """
+    name = pt.basename(instance_file)
+    with open(instance_file) as fin:
+        instance_data = json.load(fin)
 
-        # If unsolvable (it should never happen with our instances)
-        if model_results is None:
-            print('Unsatisfiable instance')
-            continue
+    output_basename = (f'out-{pt.splitext(pt.basename(instance_file))[0]}'
+                       '.txt')
+    stats_basename = (f'stats-{pt.splitext(pt.basename(instance_file))[0]}'
+                      '.json')
+    key = None
+    if cache is not None:
+        key = solve_cache.make_key(
+            instance_data, solve_cache.source_files(pt.dirname(__file__)),
+            rotation=rot, timeout=timeout, warm_start=warm_start,
+            z3_version=z3.get_version_string(), **(parameters or {}))
+        if cache.restore(key, DEFAULT_OUTPUT_DIR):
+            print(f'cached instance: {name}')
+            if sweep is not None:
+                sweep.mark(name, manifest.DONE, cached=True)
+            if db is not None:
+                db.replay(name, key)
+            return
 
-        # Unpack and decode
-        height, variables, statistics, build_time = model_results
+    # Rotation aware bounds, if available
+    max_height = instance_data['max_height']
+    if rot:
+        max_height = instance_data.get('max_height_rot', max_height)
 
+    kwargs = {}
+    min_height = instance_data.get('min_height_rot' if rot else 'min_height')
+    if min_height is not None:
+        kwargs['min_height'] = min_height
+    placement = instance_data.get('placement_rot' if rot else 'placement')
+    if warm_start and placement is not None:
+        kwargs['warm_start'] = placement
+
+    if sweep is not None:
+        sweep.mark(name, manifest.RUNNING)
+        if placement is not None:
+            sweep.incumbent(name, max(y + h for _, h, _, y in placement),
+                            placement, 'heuristic')
+
+    print(f'solving instance: {name}')
+    timer = timing.PhaseTimer()
+    monitor = memory.MemoryMonitor(memory_limit, trace_python=trace_memory)
+    profiler = profiling.Profiler(profile)
+    with monitor, profiler:
+        model_results = solve_func(instance_data['width'],
+                                   instance_data['n'],
+                                   instance_data['circuits'], max_height,
+                                   timeout=timeout * 1000, rotations=rot,
+                                   **kwargs)
+
+    # If unsolvable within the time budget (no instance is unsatisfiable)
+    if model_results is None:
+        print('Unsatisfiable instance')
+        if sweep is not None:
+            sweep.mark(name, manifest.TIMEOUT)
+        if db is not None:
+            db.record(name, results_db.UNKNOWN,
+                      statistics=monitor.statistics())
+        return
+
+    # Unpack and decode
+    height, variables, statistics, build_time = model_results
+    timer.add(timing.BUILD, build_time)
+    timer.add(timing.PREPROCESS, statistics.get('load_time'))
+    timer.add(timing.SOLVE, statistics.get('time'))
+    timer.add(timing.DECODE, statistics.get('decode_time'))
+
+    with timer.phase(timing.DECODE), profiler:
         for var in map(str, variables):
             match = SAT_INSTANCE_DECODER_RE.match(var)
             x, y, k = map(int, match.groups())
@@ -75,23 +197,126 @@ def main(solve_func, rot):
 
             # Update instance data with results
             instance_data['circuits'][k] = (w, h, x, y)
+    statistics.update(timer.statistics())
+    statistics.update(monitor.statistics())
+
+    # Output results and statistics (stdout may be redirected by
+    # parallel workers, hence it is passed explicitly)
+    dump_result(instance_data, height, sys.stdout)
+    dump_statistics(statistics, build_time, sys.stdout)
+    print()
+
+    # Dump results and statistics on file
+    os.makedirs(DEFAULT_OUTPUT_DIR, exist_ok=True)
+    with atomic_open(pt.join(DEFAULT_OUTPUT_DIR, output_basename)) as fout:
+        dump_result(instance_data, height, fout)
+
+    with atomic_open(pt.join(DEFAULT_OUTPUT_DIR, stats_basename)) as fout:
+        dump_statistics(statistics, build_time, fout)
+    profiler.dump(DEFAULT_OUTPUT_DIR,
+                  pt.splitext(pt.basename(instance_file))[0])
 
-        # Output results and statistics
-        dump_result(instance_data, height)
-        dump_statistics(statistics, build_time)
-        print()
+    if cache is not None:
+        cache.store(key, [pt.join(DEFAULT_OUTPUT_DIR, output_basename),
+                          pt.join(DEFAULT_OUTPUT_DIR, stats_basename)])
 
-        # Dump results and statistics on file
-        os.makedirs(DEFAULT_OUTPUT_DIR, exist_ok=True)
-        output_basename = (f'out-{pt.splitext(pt.basename(instance_file))[0]}'
-                           '.txt')
-        stats_basename = (f'stats-{pt.splitext(pt.basename(instance_file))[0]}'
-                          '.json')
-        with open(pt.join(DEFAULT_OUTPUT_DIR, output_basename), 'w') as fout:
-            dump_result(instance_data, height, fout)
+    if sweep is not None:
+        sweep.mark(name, manifest.DONE, height=height)
+    if db is not None:
+        db.record(name, results_db.OPTIMAL, height=height,
+                  statistics=statistics, cache_key=key)
 
-        with open(pt.join(DEFAULT_OUTPUT_DIR, stats_basename), 'w') as fout:
-            dump_statistics(statistics, build_time, fout)
+
+def _solve_instance_safe(instance_file, solve_func, rot, timeout, warm_start,
+                         cache, parameters, sweep, db, memory_limit=None,
+                         trace_memory=False, profile=False):
+    """Solve an instance, an error marks it as failed in the sweep."""
+    try:
+        solve_instance(instance_file, solve_func, rot, timeout, warm_start,
+                       cache, parameters, sweep, db, memory_limit,
+                       trace_memory, profile)
+    except memory.MemoryLimitExceeded as e:
+        print(e)
+        sweep.mark(pt.basename(instance_file), manifest.MEMOUT,
+                   peak_memory=e.peak_memory)
+        if db is not None:
+            db.record(pt.basename(instance_file), results_db.MEMOUT,
+                      peak_memory=e.peak_memory)
+    except Exception as e:
+        traceback.print_exc()
+        sweep.mark(pt.basename(instance_file), manifest.FAILED,
+                   error=repr(e))
+        if db is not None:
+            db.record(pt.basename(instance_file), results_db.FAILED,
+                      statistics={'error': repr(e)})
+
+
+def _solve_instance_captured(instance_file, solve_func, rot, timeout,
+                             warm_start, cache, parameters, sweep, db,
+                             memory_limit=None, trace_memory=False,
+                             profile=False):
+    """Solve an instance in a worker, return everything it printed."""
+    output = io.StringIO()
+    with redirect_stdout(output):
+        _solve_instance_safe(instance_file, solve_func, rot, timeout,
+                             warm_start, cache, parameters, sweep, db,
+                             memory_limit, trace_memory, profile)
+    return output.getvalue()
+
+
+def main(solve_func, rot, jobs=1, timeout=DEFAULT_TIMEOUT, warm_start=False,
+         cache=None, parameters=None, resume=False, db=None,
+         memory_limit=None, trace_memory=False, profile=False):
+    """Solve all instances.
+
+    With resume, the instances finished by an interrupted sweep are
+    skipped (see manifest.py). If a results database is given, results
+    are recorded in it (see results_db.py). memory_limit (bytes) is the
+    memory limit of each solve (see memory.py). With profile, each
+    solve is profiled (see profiling.py).
+    """
+    if db is not None:
+        parameters = parameters or {}
+        model = ('order' if parameters.get('order') else 'direct') \
+            + ('-incremental' if parameters.get('incremental') else '') \
+            + ('-cnf' if parameters.get('cnf') else '')
+        db.start_run('sat', model, rot, parameters.get('sat_backend', 'z3'),
+                     z3_version=z3.get_version_string(), timeout=timeout,
+                     warm_start=warm_start, profile=profile)
+    instance_files = sorted(glob.glob(pt.join(DEFAULT_INSTANCES_DIR, '*')))
+    sweep = manifest.Manifest(
+        pt.join(DEFAULT_OUTPUT_DIR, ROTATION_MANIFEST_BASENAME if rot
+                else manifest.MANIFEST_BASENAME),
+        map(pt.basename, instance_files), resume)
+    todo = []
+    for instance_file in instance_files:
+        name = pt.basename(instance_file)
+        if sweep.todo(name):
+            todo.append(instance_file)
+        else:
+            print(f'skipping instance: {name} ({sweep.states[name]})')
+
+    # Solve SAT problem for each instance
+    if jobs <= 1:
+        for instance_file in todo:
+            _solve_instance_safe(instance_file, solve_func, rot, timeout,
+                                 warm_start, cache, parameters, sweep, db,
+                                 memory_limit, trace_memory, profile)
+        return
+
+    # Spawn fresh workers, so that no z3 context is shared with the
+    # parent process. Outputs are printed in instance order.
+    worker = partial(_solve_instance_captured, solve_func=solve_func,
+                     rot=rot, timeout=timeout, warm_start=warm_start,
+                     cache=cache, parameters=parameters, sweep=sweep,
+                     db=db, memory_limit=memory_limit,
+                     trace_memory=trace_memory, profile=profile)
+    with ProcessPoolExecutor(
+            max_workers=jobs,
+            mp_context=multiprocessing.get_context('spawn')) as executor:
+        for output in executor.map(worker, todo):
+            sys.stdout.write(output)
+            sys.stdout.flush()
 
 
 if __name__ == '__main__':
@@ -106,13 +331,101 @@ if __name__ == '__main__':
                         default=False,
                         help='if specified, use the order encodings model '
                              '(huge performance boost)')
+    parser.add_argument('-i', '--incremental', dest='incremental',
+                        action='store_true', default=False,
+                        help='if specified together with -o, build the '
+                             'model once and search the height '
+                             'incrementally (learned clauses are kept '
+                             'between heights)')
+    parser.add_argument('-c', '--cnf', dest='cnf', action='store_true',
+                        default=False,
+                        help='if specified together with -o, clauses are '
+                             'built as integer arrays and loaded in bulk '
+                             '(DIMACS) instead of as z3 expressions')
+    parser.add_argument('-s', '--sat-backend', dest='sat_backend',
+                        default='z3',
+                        help='solver used for integer clauses (-oc): z3, '
+                             'pysat[:NAME] or dimacs:COMMAND (e.g. '
+                             'dimacs:kissat), see backends.py (default z3)')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1,
+                        help='number of instances solved in parallel, each '
+                             'one in its own process (default 1)')
+    parser.add_argument('-t', '--timeout', dest='timeout', type=int,
+                        default=DEFAULT_TIMEOUT,
+                        help='time budget in seconds for each instance '
+                             f'(default {DEFAULT_TIMEOUT})')
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        default=True,
+                        help='solve all instances again, even if cached '
+                             'results are available (see solve_cache.py)')
+    parser.add_argument('--resume', dest='resume', action='store_true',
+                        default=False,
+                        help='resume an interrupted sweep, skipping the '
+                             'instances already finished (see manifest.py)')
+    parser.add_argument('--no-db', dest='db', action='store_false',
+                        default=True,
+                        help='do not record results in the results database '
+                             '(see results_db.py)')
+    parser.add_argument('--memory-limit', dest='memory_limit', type=float,
+                        default=None,
+                        help='memory limit in MB of each solve, exceeding '
+                             'it stops the solve (memout, see memory.py)')
+    parser.add_argument('--trace-memory', dest='trace_memory',
+                        action='store_true', default=False,
+                        help='also measure the peak of the Python '
+                             'allocations (slower)')
+    parser.add_argument('--profile', dest='profile', action='store_true',
+                        default=False,
+                        help='profile model construction and decoding, '
+                             'profile-ins-XX.prof/.txt are written next to '
+                             'the statistics (see profiling.py), implies '
+                             '--no-cache')
     args = parser.parse_args()
 
+    if args.incremental and not args.order:
+        parser.error('incremental solving is available only for the order '
+                     'encodings model (-o)')
+    if args.cnf and (not args.order or args.incremental):
+        parser.error('integer clauses are available only for the order '
+                     'encodings model (-o), without -i')
+    try:
+        backend = backends.get_backend(args.sat_backend)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if args.sat_backend != 'z3' and not args.cnf:
+        parser.error('SAT backends other than z3 require integer clauses '
+                     '(-oc)')
+
     solve_func = sat_vlsi
-    if args.rotation and args.order:
+    if args.sat_backend != 'z3' and args.rotation:
+        solve_func = partial(util.linear_optimization, partial(
+            SAT_model_order_rotations.sat_vlsi_cnf, backend=backend))
+    elif args.sat_backend != 'z3':
+        solve_func = partial(util.linear_optimization, partial(
+            SAT_model_order.sat_vlsi_cnf, backend=backend))
+    elif args.rotation and args.order and args.cnf:
+        solve_func = sat_vlsi_ord_rot_cnf
+    elif args.order and args.cnf:
+        solve_func = sat_vlsi_ord_cnf
+    elif args.rotation and args.order and args.incremental:
+        solve_func = sat_vlsi_ord_rot_inc
+    elif args.order and args.incremental:
+        solve_func = sat_vlsi_ord_inc
+    elif args.rotation and args.order:
         solve_func = sat_vlsi_ord_rot
     elif args.order:
         solve_func = sat_vlsi_ord
     elif args.rotation:
         solve_func = sat_vlsi_rot
-    main(solve_func, args.rotation)
+    # Only the order encodings accept a warm start placement
+    parameters = {'order': args.order, 'incremental': args.incremental,
+                  'cnf': args.cnf, 'sat_backend': backend.name}
+    # Profiled solves are slower, their results are not cached
+    main(solve_func, args.rotation, jobs=args.jobs, timeout=args.timeout,
+         warm_start=args.order,
+         cache=solve_cache.SolveCache(enabled=args.cache and not args.profile),
+         parameters=parameters, resume=args.resume,
+         db=results_db.ResultsDB(enabled=args.db),
+         memory_limit=args.memory_limit and args.memory_limit
+         * memory.MEGABYTE,
+         trace_memory=args.trace_memory, profile=args.profile)
@@ -1,17 +1,34 @@
 """optimization and other utilities for SAT models."""
+import time
 from math import ceil
 
+from z3 import sat
+
 
 def dict_from_stats(statistics) -> dict:
     """Return a dictionary from z3 statistics."""
     return {key: statistics.get_key_value(key) for key in statistics.keys()}
 
 
-def linear_optimization(solve_fun, width, nofrectangles, dimensions,
-                        max_height, timeout=300000, rotations=False):
-    """Apply linear optimization to solve_fun, passing other parameters."""
-    total_solve_time = 0
-    total_build_time = 0
+def get_time(statistics, key='time') -> float:
+    """Get a time from z3 statistics (solving time by default).
+
+    z3 omits the key when the time is negligible.
+    """
+    if key in statistics.keys():
+        return statistics.get_key_value(key)
+    return 0.
+
+
+def get_min_height(width, nofrectangles, dimensions, rotations=False,
+                   min_height=None) -> int:
+    """Get the lower bound of the height.
+
+    min_height is the bound stored in the instance (see bounds.py), if
+    not given the trivial bound is computed.
+    """
+    if min_height is not None:
+        return min_height
 
     total_area = 0
 
@@ -21,29 +38,72 @@ def linear_optimization(solve_fun, width, nofrectangles, dimensions,
     area_min_height = ceil(total_area / width)
 
     if rotations:
-        min_height = max(area_min_height, max(map(min, dimensions)))
-    else:
-        min_height = max(area_min_height,
-                         max([dimensions[i][1] for i in range(nofrectangles)]))
+        return max(area_min_height, max(map(min, dimensions)))
+    return max(area_min_height,
+               max([dimensions[i][1] for i in range(nofrectangles)]))
+
+
+def order_hints(PX, PY, dimensions, warm_start, R=None):
+    """Get the values taken by order encoding variables in a placement.
+
+    warm_start is a list of [w, h, x, y] rects (see
+    convert_instances.py), PX[k][i] stands for x_k <= i (same for PY).
+    Return a list of (variable, value) pairs, to be used as phase hints.
+    """
+    hints = []
+    for k, (w, h, x, y) in enumerate(warm_start):
+        hints.extend((px, x <= i) for i, px in enumerate(PX[k]))
+        hints.extend((py, y <= j) for j, py in enumerate(PY[k]))
+        if R is not None:
+            hints.append((R[k], w != dimensions[k][0]))
+    return hints
+
+
+def linear_optimization(solve_fun, width, nofrectangles, dimensions,
+                        max_height, timeout=300000, rotations=False,
+                        warm_start=None, min_height=None):
+    """Apply linear optimization to solve_fun, passing other parameters.
+
+    If given, warm_start (a placement) is passed to solve_fun. Times are
+    cumulated over the heights tried: 'time' (search), 'load_time'
+    (loading clauses into the solver) and 'decode_time' (whatever
+    solve_fun does after the search, i.e. reading the model).
+    """
+    kwargs = {} if warm_start is None else {'warm_start': warm_start}
+    total_solve_time = 0
+    total_build_time = 0
+    total_load_time = 0
+    total_decode_time = 0
+
+    min_height = get_min_height(width, nofrectangles, dimensions, rotations,
+                                min_height)
 
     while True:
         # print('Trying height =', min_height)
+        starting_time = time.perf_counter()
         testsol = solve_fun(width, nofrectangles, dimensions, min_height,
-                            timeout=timeout)
+                            timeout=timeout, **kwargs)
+        elapsed_time = time.perf_counter() - starting_time
 
         # Update timeout based on passed time
         sol_height, solutions, stats, build_time = testsol
-        solve_time = stats.get_key_value('time')
+        solve_time = get_time(stats)
+        load_time = get_time(stats, 'load_time')
         total_build_time += build_time
         total_solve_time += solve_time
-        timeout -= (solve_time + build_time) * 1000
+        total_load_time += load_time
+        total_decode_time += max(0., elapsed_time - build_time - solve_time
+                                 - load_time)
+        timeout -= elapsed_time * 1000
 
         if testsol[0] is not None:
             # Return cumulative times
-            # Last solution statistics are returned, but time value is
-            # replaced by its cumulative
+            # Last solution statistics are returned, but time values
+            # are replaced by their cumulative
             stats_dict = dict_from_stats(stats)
             stats_dict['time'] = total_solve_time
+            stats_dict['load_time'] = total_load_time
+            stats_dict['decode_time'] = total_decode_time
             return sol_height, solutions, stats_dict, total_build_time
 
         if timeout < 0:
@@ -52,23 +112,64 @@ def linear_optimization(solve_fun, width, nofrectangles, dimensions,
         min_height += 1
 
 
-def binary_optimization(solve_fun, width, nofrectangles, dimensions,
-                        max_height, timeout=300000, rotations=False):
-    """Apply binary optimization to solve_fun, passing other parameters."""
+def incremental_optimization(build_fun, width, nofrectangles, dimensions,
+                             max_height, timeout=300000, rotations=False,
+                             warm_start=None, min_height=None):
+    """Apply linear optimization on a single, incrementally solved model.
 
-    total_area = 0
+    build_fun builds the model once for max_height (see
+    sat_vlsi_incremental). Each candidate height is then tried by
+    assuming its activation literal, so that learned clauses are kept
+    from one probe to the next. If given, warm_start (a placement) is
+    passed to build_fun.
+    """
+    kwargs = {} if warm_start is None else {'warm_start': warm_start}
+    min_height = get_min_height(width, nofrectangles, dimensions, rotations,
+                                min_height)
 
-    for i in range(nofrectangles):
-        total_area += dimensions[i][0] * dimensions[i][1]
-    # If total area is not divisible by width we round up
-    area_min_height = ceil(total_area / width)
+    s, height_literal, decode, total_build_time = build_fun(
+        width, nofrectangles, dimensions, max_height, **kwargs)
+    total_solve_time = 0
+    timeout -= total_build_time * 1000
 
-    # If total area is not divisible by width we round up
-    if rotations:
-        min_height = max(area_min_height, max(map(min, dimensions)))
-    else:
-        min_height = max(area_min_height,
-                         max([dimensions[i][1] for i in range(nofrectangles)]))
+    # First fit guarantees a solution for max_height
+    for height in range(min_height, max_height + 1):
+        if timeout < 0:
+            return None
+
+        # print('Trying height =', height)
+        starting_time = time.perf_counter()
+        literal = height_literal(height)
+        build_time = time.perf_counter() - starting_time
+
+        s.set('timeout', int(timeout))
+        starting_time = time.perf_counter()
+        check_result = s.check(literal)
+        solve_time = time.perf_counter() - starting_time
+
+        total_build_time += build_time
+        total_solve_time += solve_time
+        timeout -= (solve_time + build_time) * 1000
+
+        if check_result == sat:
+            # Return cumulative times
+            starting_time = time.perf_counter()
+            solutions = decode(s.model(), height)
+            stats_dict = dict_from_stats(s.statistics())
+            stats_dict['time'] = total_solve_time
+            stats_dict['decode_time'] = time.perf_counter() - starting_time
+            return height, solutions, stats_dict, total_build_time
+
+    return None
+
+
+def binary_optimization(solve_fun, width, nofrectangles, dimensions,
+                        max_height, timeout=300000, rotations=False,
+                        min_height=None):
+    """Apply binary optimization to solve_fun, passing other parameters."""
+
+    min_height = get_min_height(width, nofrectangles, dimensions, rotations,
+                                min_height)
     #max_height = sum([dimensions[k][1] for k in range(nofrectangles)])
 
     if min_height == max_height:
@@ -1,14 +1,16 @@
 from z3 import *
 import json
+import time
 from math import ceil
 
 from util import max as smt_max, lex_less
+import timing
 
 DEFAULT_TIME_LIMIT = 5*60
 
 
 def solve(width, n, circuits, name="no_rotation", time_limit=DEFAULT_TIME_LIMIT,
-          max_height=0):
+          max_height=0, warm_start=None, min_height=0, callback=None):
     f'''
     Solve VLSI problem using a MILP formulation and MILP solver. Is not possible to rotate the chips.
     width : width of the plate
@@ -16,21 +18,27 @@ def solve(width, n, circuits, name="no_rotation", time_limit=DEFAULT_TIME_LIMIT,
     circuits : list of tuple in the form [(x1,y1), ..., (xn, yn)].
     name : name of the model. Useful when exporting the model. Default "no_rotation".
     time_limit : time limit in which the calculation stops. Default {DEFAULT_TIME_LIMIT}.
+    min_height : lower bound of the height (see bounds.py). If 0, the trivial bound is used. Default 0.
+    warm_start : feasible placement whose values are given as initial values (phase hints) to the solver,
+        list of tuple in the form [(w[1], h[1], x[1], y[1]), ..., (w[n], h[n], x[n], y[n])]. Default None.
+    callback : function called as callback(height, rect) on each improving solution found while optimizing. Default None.
 
     return : dict containing: 
         - status : string with a commend on the solution(eg. Optimal)
-        - statistics : statistics of the solving process.
+        - statistics : statistics of the solving process, including the phase times (see timing.py).
         - result : dict containing:
             - width : width of the plate.
             - height : height of the highest chip.
             - rect : list of tuple in the form [(w[1], h[1], x[1], y[i]), ..., (w[n], h[n], x[n], y[n])]
     '''
 
+    timer = timing.PhaseTimer()
     opt = Optimize()
     opt.set("timeout", time_limit*1000)
 
-    # Min height is the lowest possible height of a rectangle that can contain the circuits or the highest chip.
-    min_height = max(ceil(sum([circuits[i][0]*circuits[i][1] for i in range(n)]) / width), max([circuits[i][1] for i in range(n)]))
+    # Unless given, min height is the lowest possible height of a rectangle that can contain the circuits or the highest chip.
+    if not min_height:
+        min_height = max(ceil(sum([circuits[i][0]*circuits[i][1] for i in range(n)]) / width), max([circuits[i][1] for i in range(n)]))
 
     # Max height is obtained by stacking all chips in one column
     max_height = max_height or sum([circuits[i][0] for i in range(n)])
@@ -77,13 +85,27 @@ def solve(width, n, circuits, name="no_rotation", time_limit=DEFAULT_TIME_LIMIT,
             if circuits[i][0] == circuits[j][0] and circuits[i][1] == circuits[j][1]:
                 opt.add(lex_less([x[i], y[i]], [x[j], y[j]]))
 
+    # Warm start (requires z3 >= 4.13)
+    if warm_start is not None and hasattr(opt, "set_initial_value"):
+        opt.set_initial_value(height, max(r[3] + r[1] for r in warm_start))
+        for i, (_, _, xi, yi) in enumerate(warm_start):
+            opt.set_initial_value(x[i], xi)
+            opt.set_initial_value(y[i], yi)
+
+    # Incumbents
+    if callback is not None:
+        opt.set_on_model(lambda m: callback(m.eval(height).as_long(), [(circuits[i][0], circuits[i][1], m.eval(x[i]).as_long(), m.eval(y[i]).as_long()) for i in range(n)]))
+
     opt.minimize(height)
-    
-    check_result = opt.check()
-    m = opt.model()
-    rect = [(circuits[i][0], circuits[i][1], m[x[i]].as_long(), m[y[i]].as_long()) for i in range(n) if m[x[i]] is not None and m[y[i]] is not None]
-    found_height = m[height].as_long() if m[height] is not None else -1
+    timer.add(timing.BUILD, time.perf_counter() - timer.starting_time)
+
+    with timer.phase(timing.SOLVE):
+        check_result = opt.check()
+    with timer.phase(timing.DECODE):
+        m = opt.model()
+        rect = [(circuits[i][0], circuits[i][1], m[x[i]].as_long(), m[y[i]].as_long()) for i in range(n) if m[x[i]] is not None and m[y[i]] is not None]
+        found_height = m[height].as_long() if m[height] is not None else -1
     stats = opt.statistics()
     return {"result": {"width": width, "height": found_height, "rect": rect},
-            "statistics": {**{k: stats.get_key_value(k) for k in stats.keys()}, "name": name},
+            "statistics": {**{k: stats.get_key_value(k) for k in stats.keys()}, **timer.statistics(), "name": name},
             "status": check_result}
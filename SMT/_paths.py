@@ -0,0 +1,11 @@
+"""Make the shared modules of the repository root importable.
+
+Imported by the SMT scripts only (first thing, before the shared
+modules), the models do not touch sys.path when imported as libraries.
+"""
+import sys
+import os.path as pt
+
+ROOT_DIR = pt.dirname(pt.dirname(pt.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
@@ -3,8 +3,19 @@ import glob
 import json
 import os
 import os.path as pt
+import argparse
+import traceback
 
-from SMT_no_rotation import solve
+import z3
+
+import _paths  # noqa: F401 (shared modules of the parent directory)
+
+import solve_cache
+import manifest
+import memory
+import profiling
+import results_db
+from SMT_no_rotation import solve, DEFAULT_TIME_LIMIT
 
 DEFAULT_INSTANCES_DIR = pt.join(pt.dirname(__file__), '..', 'instances_json')
 DEFAULT_OUTPUT_DIR = pt.join(pt.dirname(__file__), 'out_no_rotation')
@@ -20,33 +31,155 @@ def format_result(result):
         ret += " ".join([str(s) for s in r]) + "\n"
     return ret
 
-def main():
+def solve_instance(instance_file, cache, sweep, db=None, memory_limit=None,
+                   trace_memory=False, profile=False):
+    """Solve an instance file, recording its state in the sweep manifest.
 
-    # Define a new instance for each input file
-    for instance_file in sorted(
-            glob.glob(pt.join(DEFAULT_INSTANCES_DIR, '*'))):
-        with open(instance_file) as fin:
-            instance_data = json.load(fin)
+    If a results database is given, the result is recorded in it. The
+    peak memory of the solve is measured, MemoryLimitExceeded is raised
+    if it exceeds memory_limit (bytes, see memory.py). With profile, model
+    construction (and solving) and decoding are profiled (see
+    profiling.py).
+    """
+    name = pt.basename(instance_file)
+    with open(instance_file) as fin:
+        instance_data = json.load(fin)
+
+    output_basename = (f'out-{pt.splitext(pt.basename(instance_file))[0]}'
+                    '.txt')
+    stats_basename = (f'stats-{pt.splitext(pt.basename(instance_file))[0]}'
+                    '.txt')
+
+    # Replay results of a solve with the same instance, sources and solver
+    key = None
+    if cache is not None:
+        key = solve_cache.make_key(
+            instance_data, solve_cache.source_files(pt.dirname(__file__)),
+            z3_version=z3.get_version_string(),
+            time_limit=DEFAULT_TIME_LIMIT)
+        if cache.restore(key, DEFAULT_OUTPUT_DIR):
+            print(f'cached instance: {pt.basename(instance_file)}')
+            sweep.mark(name, manifest.DONE, cached=True)
+            if db is not None:
+                db.replay(name, key)
+            return
+
+    print(f'solving instance: {pt.basename(instance_file)}')
+    # Model parameters only (heuristic placement as warm start,
+    # lower bound if available)
+    model_data = {key: instance_data[key]
+                  for key in ('width', 'n', 'circuits', 'max_height')}
+    model_data['warm_start'] = instance_data.get('placement')
+    model_data['min_height'] = instance_data.get('min_height', 0)
 
-        print(f'solving instance: {pt.basename(instance_file)}')
-        result = solve(**instance_data)
+    sweep.mark(name, manifest.RUNNING)
+    if model_data['warm_start'] is not None:
+        sweep.incumbent(name, max(y + h for _, h, _, y in model_data['warm_start']),
+                        model_data['warm_start'], 'heuristic')
+    monitor = memory.MemoryMonitor(memory_limit, trace_python=trace_memory)
+    profiler = profiling.Profiler(profile)
+    with monitor, profiler:
+        result = solve(**model_data, callback=lambda height, rect: sweep.incumbent(name, height, rect, 'z3'))
+    result["statistics"].update(monitor.statistics())
 
-        dump_statistics(result["statistics"], result["status"])
+    dump_statistics(result["statistics"], result["status"])
 
-        # Dump results and statistics on file
-        os.makedirs(DEFAULT_OUTPUT_DIR, exist_ok=True)
-        output_basename = (f'out-{pt.splitext(pt.basename(instance_file))[0]}'
-                        '.txt')
-        stats_basename = (f'stats-{pt.splitext(pt.basename(instance_file))[0]}'
-                        '.txt')
-        with open(pt.join(DEFAULT_OUTPUT_DIR, output_basename), 'w') as fout:
-            fout.write(format_result(result["result"]))
+    # Dump results and statistics on file
+    os.makedirs(DEFAULT_OUTPUT_DIR, exist_ok=True)
+    with open(pt.join(DEFAULT_OUTPUT_DIR, output_basename), 'w') as fout:
+        fout.write(format_result(result["result"]))
 
-        with open(pt.join(DEFAULT_OUTPUT_DIR, stats_basename), 'w') as fout:
-            dump_statistics(result["statistics"], result["status"], fout)
+    with open(pt.join(DEFAULT_OUTPUT_DIR, stats_basename), 'w') as fout:
+        dump_statistics(result["statistics"], result["status"], fout)
+    profiler.dump(DEFAULT_OUTPUT_DIR,
+                  pt.splitext(pt.basename(instance_file))[0])
+
+    if cache is not None:
+        cache.store(key, [pt.join(DEFAULT_OUTPUT_DIR, output_basename),
+                          pt.join(DEFAULT_OUTPUT_DIR, stats_basename)])
+
+    sweep.mark(name, manifest.DONE if result["status"] == z3.sat else manifest.TIMEOUT,
+               status=str(result["status"]))
+    if db is not None:
+        if result["status"] == z3.sat:
+            status = results_db.OPTIMAL
+        elif result["result"]["height"] > 0:
+            status = results_db.FEASIBLE
+        else:
+            status = results_db.UNKNOWN
+        db.record(name, status, height=result["result"]["height"],
+                  statistics={**result["statistics"], "status": str(result["status"])},
+                  cache_key=key)
+
+def main(cache=None, resume=False, db=None, memory_limit=None,
+         trace_memory=False, profile=False):
+    if db is not None:
+        db.start_run('smt', 'SMT_no_rotation', False, 'z3',
+                     z3_version=z3.get_version_string(),
+                     time_limit=DEFAULT_TIME_LIMIT, profile=profile)
+    instance_files = sorted(glob.glob(pt.join(DEFAULT_INSTANCES_DIR, '*')))
+    sweep = manifest.Manifest(
+        pt.join(DEFAULT_OUTPUT_DIR, manifest.MANIFEST_BASENAME),
+        map(pt.basename, instance_files), resume)
+
+    # Define a new instance for each input file
+    for instance_file in instance_files:
+        name = pt.basename(instance_file)
+        if not sweep.todo(name):
+            print(f'skipping instance: {name} ({sweep.states[name]})')
+            continue
+        try:
+            solve_instance(instance_file, cache, sweep, db, memory_limit,
+                           trace_memory, profile)
+        except memory.MemoryLimitExceeded as e:
+            print(e)
+            sweep.mark(name, manifest.MEMOUT, peak_memory=e.peak_memory)
+            if db is not None:
+                db.record(name, results_db.MEMOUT,
+                          peak_memory=e.peak_memory)
+        except Exception as e:
+            traceback.print_exc()
+            sweep.mark(name, manifest.FAILED, error=repr(e))
+            if db is not None:
+                db.record(name, results_db.FAILED,
+                          statistics={'error': repr(e)})
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(
+        description='Execute the SMT model on all given instances.')
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        default=True,
+                        help='solve all instances again, even if cached '
+                             'results are available (see solve_cache.py)')
+    parser.add_argument('--resume', dest='resume', action='store_true',
+                        default=False,
+                        help='resume an interrupted sweep, skipping the '
+                             'instances already finished (see manifest.py)')
+    parser.add_argument('--no-db', dest='db', action='store_false',
+                        default=True,
+                        help='do not record results in the results database '
+                             '(see results_db.py)')
+    parser.add_argument('--memory-limit', dest='memory_limit', type=float,
+                        default=None,
+                        help='memory limit in MB of each solve, exceeding '
+                             'it stops the solve (memout, see memory.py)')
+    parser.add_argument('--trace-memory', dest='trace_memory',
+                        action='store_true', default=False,
+                        help='also measure the peak of the Python '
+                             'allocations (slower)')
+    parser.add_argument('--profile', dest='profile', action='store_true',
+                        default=False,
+                        help='profile model construction and decoding, '
+                             'profile-ins-XX.prof/.txt are written next to '
+                             'the statistics (see profiling.py), implies '
+                             '--no-cache')
+    args = parser.parse_args()
+
+    # Profiled solves are slower, their results are not cached
+    main(solve_cache.SolveCache(enabled=args.cache and not args.profile),
+         args.resume, results_db.ResultsDB(enabled=args.db),
+         args.memory_limit and args.memory_limit * memory.MEGABYTE,
+         args.trace_memory, args.profile)
 
 
@@ -1,7 +1,8 @@
 """Show barplot from given results.
 
 Directories containing the result to compare shall be specified via
-command line parameters.
+command line parameters. Alternatively, runs stored in a results
+database can be compared (see results_db.py).
 
 Python >= 3.8.
 """
@@ -11,11 +12,14 @@ import glob
 import os.path as pt
 import json
 from itertools import cycle
+from contextlib import closing
 
 import matplotlib.pyplot as plt
 from matplotlib.patches import Patch
 import numpy as np
 
+import results_db
+
 
 MAIN_HELP = '''
 Show (vertical) barplot given a list of directories containing
@@ -24,10 +28,15 @@ Show (vertical) barplot given a list of directories containing
 Stat files shall be in json format, and shall be named as:
  stats-ins-XX.ext, where X is a digit and .ext is one between: .json,
  .txt.
+
+With --db, runs of a results database are compared instead: each
+ argument is a run id or BACKEND[/MODEL] (latest matching run), keys are
+ result columns (build_time, solve_time).
 '''
 
 
 STAT_FILE_RE = re.compile(r'stats-ins-([0-9]+)\.(txt|json)')
+INSTANCE_RE = re.compile(r'ins-([0-9]+)\.json')
 THRESHOLD = 300.
 NUM_INSTANCES = 40
 
@@ -79,6 +88,44 @@ def gather(directories: list[str], keynames: list[str]) -> DATA_TYPE:
     return bars
 
 
+def gather_db(db_file: str, runs: list[str],
+              keynames: list[str]) -> DATA_TYPE:
+    """Gather data of the given runs from a results database.
+
+    Same structure as gather, indexed by run specification. Only
+    optimal results are considered (others exceed the threshold).
+    """
+    bars: DATA_TYPE = {}
+
+    with closing(results_db.ResultsDB(db_file).connect()) as conn:
+        for spec in runs:
+            run_id = results_db.find_run(conn, spec)
+
+            bars[spec] = {}
+            for key in keynames:
+                bars[spec][key] = [THRESHOLD + 1 for _ in range(NUM_INSTANCES)]
+
+            # Column names are checked by the caller
+            rows = conn.execute(
+                f'SELECT instance, {", ".join(keynames)} FROM results '
+                'WHERE run_id = ? AND status = ?',
+                (run_id, results_db.OPTIMAL))
+            for instance, *values in rows:
+                re_result = INSTANCE_RE.match(instance)
+                if re_result is None:
+                    continue
+
+                index = int(re_result.groups()[0]) - 1
+                if index >= NUM_INSTANCES:
+                    print(f'Instance index is greater than {NUM_INSTANCES}, '
+                          'skipping')
+                    continue
+
+                for key, value in zip(keynames, values):
+                    bars[spec][key][index] = value or 0.
+    return bars
+
+
 def plot(data: DATA_TYPE, title="", directory_legend: dict[str, str] = {},
          key_legend: dict[str, str] = {}):
     """Show given data in a barplot."""
@@ -150,16 +197,22 @@ def plot(data: DATA_TYPE, title="", directory_legend: dict[str, str] = {},
 
 
 def main(directories: list[str], keynames: list[str], title="",
-         directory_legend: dict[str, str]={}, key_legend: dict[str, str] = {}):
-    plot(gather(directories, keynames), title=title,
-         directory_legend=directory_legend, key_legend=key_legend)
+         directory_legend: dict[str, str]={}, key_legend: dict[str, str] = {},
+         db_file=None):
+    if db_file is None:
+        data = gather(directories, keynames)
+    else:
+        data = gather_db(db_file, directories, keynames)
+    plot(data, title=title, directory_legend=directory_legend,
+         key_legend=key_legend)
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description=MAIN_HELP)
 
     parser.add_argument('directories', metavar='STATS_DIR', nargs='+',
-                        help='Directory containing stat files')
+                        help='Directory containing stat files (with --db, '
+                             'run id or BACKEND[/MODEL])')
     parser.add_argument('-k', '--keyname', action='append',
                         dest='keynames', metavar='KEYNAME',
                         help='Key name in the stat files used as y '
@@ -178,18 +231,33 @@ if __name__ == '__main__':
                         dest='key_legend',
                         help='Specify the legend name to be used for a '
                              'given key. Names are assigned in order')
+    parser.add_argument('--db', dest='db', default=None, metavar='DB_FILE',
+                        help='compare runs stored in the given results '
+                             'database instead of directories (see '
+                             'results_db.py)')
     args = parser.parse_args()
 
+    if args.db is not None:
+        for key in args.keynames:
+            if key not in results_db.TIME_COLUMNS:
+                parser.error(f'unknown result column {key}, choose among '
+                             f'{", ".join(results_db.TIME_COLUMNS)}')
+
     # Populating the legend
     args.directory_legend += args.directories[len(args.directory_legend):]
     args.key_legend += args.keynames[len(args.key_legend):]
 
-    directory_legend_dict = dict(zip(map(pt.basename, args.directories),
-                                     args.directory_legend))
+    categories = (args.directories if args.db is not None
+                  else map(pt.basename, args.directories))
+    directory_legend_dict = dict(zip(categories, args.directory_legend))
     key_legend_dict = dict(zip(map(pt.basename, args.keynames),
                                args.key_legend))
 
     # print(args)
 
-    main(args.directories, args.keynames, title=args.title,
-         directory_legend=directory_legend_dict, key_legend=key_legend_dict)
+    try:
+        main(args.directories, args.keynames, title=args.title,
+             directory_legend=directory_legend_dict,
+             key_legend=key_legend_dict, db_file=args.db)
+    except ValueError as exc:
+        parser.error(str(exc))
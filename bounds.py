@@ -0,0 +1,148 @@
+"""Lower bounds for the height of 2D strip packing (VLSI instances).
+
+All models used to start from max(ceil(area / width), tallest circuit).
+Stronger bounds are obtained by:
+* continuous bound: total area divided by the width.
+* tallest circuit (laid down when possible, in rotation mode).
+* clique bound: circuits that cannot sit side by side
+  (width_i + width_j > width) must be stacked. Such a conflict graph is a
+  threshold graph, its heaviest clique is found exactly by sorting.
+* Martello-Monaci-Vigo bound: wide circuits are stacked, narrow ones fit
+  only in the room left beside them (width relaxation of the L1 bound).
+* dual feasible function (DFF) bounds: any f with
+  sum(f(w_i)) <= f(width) whenever sum(w_i) <= width gives the bound
+  ceil(sum(h_i * f(w_i)) / f(width)). The families of Fekete and
+  Schepers (u_k and f_0 with parameter epsilon) are tried.
+
+In rotation mode, bounds hold whichever orientation is chosen: the
+continuous, tallest, clique and DFF bounds are computed on the most
+favourable orientation of each circuit.
+
+Python >= 3.8.
+"""
+from math import ceil
+
+
+# Number of u_k dual feasible functions tried (k = 1..DFF_MAX_K)
+DFF_MAX_K = 100
+
+
+def _orientations(circuit, width, rotation):
+    """Get the feasible (w, h) orientations of a circuit."""
+    w, h = circuit
+    if not rotation or w == h:
+        return [(w, h)]
+    return [size for size in ((w, h), (h, w)) if size[0] <= width]
+
+
+def continuous_bound(width, circuits, rotation=False) -> int:
+    """Get the height of the circuits area spread on the strip."""
+    return ceil(sum(w * h for w, h in circuits) / width)
+
+
+def tallest_bound(width, circuits, rotation=False) -> int:
+    """Get the height of the tallest circuit (laid down if allowed)."""
+    return max(min(h for _, h in _orientations(c, width, rotation))
+               for c in circuits)
+
+
+def clique_bound(width, circuits, rotation=False) -> int:
+    """Get the total height of circuits which must be stacked.
+
+    Circuits wider than width / 2 are pairwise conflicting, at most one
+    narrower circuit can be added to the clique, provided it conflicts
+    with all of them. In rotation mode only circuits conflicting in
+    every orientation (both sides wider than width / 2) are considered.
+    """
+    if rotation:
+        return sum(min(h for _, h in _orientations(c, width, True))
+                   for c in circuits if min(c) * 2 > width)
+
+    wide = sorted(((w, h) for w, h in circuits if w * 2 > width),
+                  reverse=True)
+    narrow = [(w, h) for w, h in circuits if w * 2 <= width]
+
+    # Heights of the wide circuits, cumulated by decreasing width
+    cumulated = [0]
+    for _, h in wide:
+        cumulated.append(cumulated[-1] + h)
+
+    best = cumulated[-1]
+    for w, h in narrow:
+        # Wide circuits conflicting with the narrow one (a prefix)
+        count = sum(1 for wide_w, _ in wide if wide_w + w > width)
+        best = max(best, cumulated[count] + h)
+    return best
+
+
+def martello_bound(width, circuits, rotation=False) -> int:
+    """Get the L1 bound of Martello, Monaci and Vigo (no rotations).
+
+    For each alpha <= width / 2, circuits wider than width / 2 are
+    stacked (J1: wider than width - alpha, J2: the others); circuits of
+    width in [alpha, width / 2] (J3) cannot sit beside J1 and fill at
+    most the room beside J2, the rest of their area lies above.
+    """
+    if rotation:
+        return 0
+
+    stacked = sum(h for w, h in circuits if w * 2 > width)
+    best = stacked
+    for alpha in {w for w, _ in circuits if w * 2 <= width}:
+        beside = sum((width - w) * h for w, h in circuits
+                     if width - alpha >= w and w * 2 > width)
+        narrow = sum(w * h for w, h in circuits if alpha <= w
+                     and w * 2 <= width)
+        best = max(best, stacked + max(0, ceil((narrow - beside) / width)))
+    return best
+
+
+def _u(k, width, w):
+    """Fekete-Schepers u_k, scaled by k * width (integer valued).
+
+    u_k(x) = x if (k + 1) * x is integer, floor((k + 1) * x) / k
+    otherwise (x = w / width).
+    """
+    if (k + 1) * w % width == 0:
+        return k * w
+    return (k + 1) * w // width * width
+
+
+def _f0(epsilon, width, w):
+    """Fekete-Schepers f_0 with parameter epsilon."""
+    if w > width - epsilon:
+        return width
+    if w < epsilon:
+        return 0
+    return w
+
+
+def dff_bound(width, circuits, rotation=False) -> int:
+    """Get the best bound among the dual feasible functions tried."""
+    functions = [(lambda w, k=k: _u(k, width, w), k * width)
+                 for k in range(1, DFF_MAX_K + 1)]
+    functions += [(lambda w, e=e: _f0(e, width, w), width)
+                  for e in range(1, width // 2 + 1)]
+
+    best = 0
+    for f, f_width in functions:
+        total = sum(min(h * f(w) for w, h in _orientations(c, width,
+                                                           rotation))
+                    for c in circuits)
+        best = max(best, -(-total // f_width))
+    return best
+
+
+BOUNDS = {
+    'continuous': continuous_bound,
+    'tallest': tallest_bound,
+    'clique': clique_bound,
+    'martello': martello_bound,
+    'dff': dff_bound,
+}
+
+
+def lower_bound(width, circuits, rotation=False) -> int:
+    """Get the tightest lower bound for the height of an instance."""
+    return max(bound(width, circuits, rotation) for bound in BOUNDS.values())
+
@@ -1,22 +1,64 @@
 """Convert a directory of instances into json format.
 
-A naive upper bound for the height is computed using a stripe based
-first fit method. Such results are also encoded into the json instance.
-This could be seen as a form of preprocessing, but still, it is a
-way to improve the results.
+An upper bound for the height is computed using a portfolio of packing
+heuristics (see first_fit.py), both without rotations (max_height) and
+with rotations (max_height_rot). Such results are also encoded into the
+json instance, together with the corresponding placements (placement
+and placement_rot), used as warm starts. This could be seen as a form
+of preprocessing, but still, it is a way to improve the results.
+
+Lower bounds for the height (see bounds.py) are stored as well
+(min_height and min_height_rot), so that models need not recompute
+them.
+
+Already converted instances can be preprocessed again (--refresh),
+e.g. after improving the heuristics.
 
 Python >= 3.8.
 """
 import os
 import os.path as pt
-import sys
 import glob
 import json
+import argparse
+
+from first_fit import best_placement
+from bounds import lower_bound
+
+
+def preprocess(width, circuits, jobs=1) -> dict:
+    """Get the preprocessed fields of an instance.
+
+    Placements are the (w, h, x, y) rects of the heuristic solutions,
+    used by the models as warm starts.
+    """
+    max_height, placement = best_placement(width, circuits, jobs=jobs)
+    max_height_rot, placement_rot = best_placement(width, circuits,
+                                                   rotation=True, jobs=jobs)
+    return {
+        'min_height': lower_bound(width, circuits),
+        'min_height_rot': lower_bound(width, circuits, rotation=True),
+        'max_height': max_height,
+        'max_height_rot': max_height_rot,
+        'placement': placement,
+        'placement_rot': placement_rot,
+    }
 
-from first_fit import get_max_height
+
+def refresh(dirname: str, jobs=1):
+    """Preprocess again a directory of json instances, in place."""
+    for instance in sorted(glob.glob(pt.join(dirname, '*.json'))):
+        with open(instance) as fin:
+            instance_dict = json.load(fin)
+
+        instance_dict.update(preprocess(instance_dict['width'],
+                                        instance_dict['circuits'], jobs))
+
+        with open(instance, 'w') as fout:
+            json.dump(instance_dict, fout)
 
 
-def main(dirname: str):
+def main(dirname: str, jobs=1):
     # Build new directory
     newdirname = f'{dirname}_json'
     os.makedirs(newdirname, exist_ok=True)
@@ -36,7 +78,7 @@ def main(dirname: str):
             'width': width,
             'n': n,
             'circuits': circuits,
-            'max_height': get_max_height(width, circuits)
+            **preprocess(width, circuits, jobs)
         }
 
         # Write new file
@@ -46,9 +88,21 @@ def main(dirname: str):
 
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print('Please provide a directory', file=sys.stderr)
-        sys.exit()
+    parser = argparse.ArgumentParser(
+        description='Convert a directory of instances into json format '
+                    '(written to DIRNAME_json).')
+    parser.add_argument('dirname', help='directory of txt instances (of '
+                                        'json instances with --refresh)')
+    parser.add_argument('--refresh', dest='refresh', action='store_true',
+                        default=False,
+                        help='preprocess again the json instances in '
+                             'DIRNAME, in place')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1,
+                        help='number of processes running the packing '
+                             'heuristics (default 1)')
+    args = parser.parse_args()
 
-    filename = sys.argv[1]
-    main(filename)
+    if args.refresh:
+        refresh(args.dirname, jobs=args.jobs)
+    else:
+        main(args.dirname, jobs=args.jobs)
@@ -1,120 +1,371 @@
-"""Naive strip based first fit for 2D packing.
+"""Heuristic 2D strip packing (first fit and friends).
 
 Used to obtain a more tractable height upper bound for the VLSI
 instances.
 
-Executes in O(n^2), with n number of circuits.
+Several packers are run on several orderings of the circuits (a
+portfolio), the tightest height is kept:
+* skyline packers: the placed circuits are summarized by their skyline,
+  the staircase of horizontal segments made by their top sides. Each
+  circuit is placed in the lowest (then leftmost) position (bottom-left),
+  or the lowest gap is filled with the widest circuit fitting it (best
+  fit). Placing all circuits is O(n * s), with s <= min(n, width) number
+  of skyline segments.
+* MaxRects packers: all maximal free rectangles are kept, each circuit
+  is placed bottom-left or in the free rectangle best fitting its short
+  side (BSSF). Much slower, only used up to MAXRECTS_MAX_CIRCUITS.
+
+In rotation mode, packers may place each circuit in either orientation
+(the upper bound then holds only for rotation aware models).
 
 Python >= 3.8.
 """
-from dataclasses import dataclass, field
-from typing import Optional
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
 
+# MaxRects packers are quadratic in the number of free rectangles
+MAXRECTS_MAX_CIRCUITS = 200
 
-@dataclass
-class Node:
-    """Node of a binary tree.
 
-    Only leaves of the tree can be free nodes. To each node a circuit
-    can be assigned. When it happens, up to two children nodes
-    shall be created (the empty space left by the given).
+class Skyline:
+    """Skyline of a strip of given width.
+
+    Segment i starts at xs[i], has height ys[i] and ends where the next
+    one starts (or at width). Adjacent segments always have different
+    heights.
     """
-    x: int
-    y: int
-    w: int
-    h: int
-    circuit: Optional[list[int, int]] = None
-    children: list['Node'] = field(default_factory=lambda: [])
-
-    def place(self, circuit: list[int, int]) -> bool:
-        """Place a circuit in the node and create new children.
-
-        Return a boolean representing whether the circuit could be
-        placed. A circuit can't be placed if: the node is not big enough
-        for it or it has already been assigned.
+
+    def __init__(self, width: int):
+        self.width = width
+        self.xs = [0]
+        self.ys = [0]
+
+    @property
+    def height(self) -> int:
+        return max(self.ys)
+
+    def find(self, w: int) -> tuple[int, int]:
+        """Get the bottom-left position for a circuit of width w.
+
+        Only segment starts are candidate positions. Return (x, y), or
+        None if the circuit is wider than the strip.
         """
-        # Check if the circuit can be assigned
-        if (self.circuit is not None or circuit[0] > self.w
-                or circuit[1] > self.h):
-            return False
+        xs, ys = self.xs, self.ys
+        best = None
+        for i, x in enumerate(xs):
+            end = x + w
+            if end > self.width:
+                break
 
-        self.circuit = circuit
+            # The circuit lies on the highest segment it spans
+            y = ys[i]
+            j = i + 1
+            while j < len(xs) and xs[j] < end:
+                if ys[j] > y:
+                    y = ys[j]
+                j += 1
 
-        # Compute and eventually add two new children
-        # Don't add if they are zero length
-        right_child = Node(self.x + circuit[0], self.y, self.w - circuit[0],
-                           circuit[1])
-        if right_child.is_valid:
-            self.children.append(right_child)
+            if best is None or y < best[1]:
+                best = x, y
+        return best
 
-        up_child = Node(self.x, self.y + circuit[1], self.w,
-                        self.h - circuit[1])
-        if up_child.is_valid:
-            self.children.append(up_child)
+    def lowest(self) -> int:
+        """Get the index of the lowest (then leftmost) segment."""
+        return min(range(len(self.ys)), key=self.ys.__getitem__)
 
-        return True
+    def end(self, i: int) -> int:
+        """Get where segment i ends."""
+        return self.xs[i + 1] if i + 1 < len(self.xs) else self.width
 
-    @property
-    def is_valid(self):
-        """Get whether a node is valid (not zero in size)."""
-        return self.w > 0 and self.h > 0
+    def place(self, x: int, y: int, w: int, h: int):
+        """Update the skyline with a circuit placed in (x, y)."""
+        xs, ys = self.xs, self.ys
+        end = x + w
+        top = y + h
 
+        # Segments from i (included) to j (excluded) are covered
+        i = bisect_left(xs, x)
+        j = bisect_left(xs, end)
+        new_xs = [x]
+        new_ys = [top]
+        # Keep what is left of the last covered segment
+        if end < self.width and (j == len(xs) or xs[j] != end):
+            new_xs.append(end)
+            new_ys.append(ys[j - 1])
+        xs[i:j] = new_xs
+        ys[i:j] = new_ys
 
-def first_fit(node, circuit):
-    """Recursively compute the first fit displacement for a circuit."""
-    result = False
+        # Merge with neighbours of the same height
+        if i + 1 < len(xs) and ys[i + 1] == top:
+            del xs[i + 1], ys[i + 1]
+        if i > 0 and ys[i - 1] == top:
+            del xs[i], ys[i]
 
-    # If there are children, propagate
-    for child in node.children:
-        result = first_fit(child, circuit)
-        if result:
-            break
-    # Otherwise, try placing
-    else:
-        result = node.place(circuit)
 
-    return result
+class MaxRects:
+    """Maximal free rectangles of a bin of given width and height."""
+
+    def __init__(self, width: int, height: int):
+        self.free = [(0, 0, width, height)]
+
+    def find(self, sizes, bssf=False) -> tuple[int, int, int, int]:
+        """Get the position for a circuit, given its allowed sizes.
+
+        The position is the bottom-left one, or the one in the free
+        rectangle with the shortest leftover side if bssf is True.
+        Return (w, h, x, y), or None if the circuit doesn't fit.
+        """
+        best = None
+        best_score = None
+        for w, h in sizes:
+            for fx, fy, fw, fh in self.free:
+                if w > fw or h > fh:
+                    continue
+                if bssf:
+                    score = min(fw - w, fh - h), max(fw - w, fh - h), fy, fx
+                else:
+                    score = fy + h, fx
+                if best is None or score < best_score:
+                    best = w, h, fx, fy
+                    best_score = score
+        return best
+
+    def place(self, x: int, y: int, w: int, h: int):
+        """Split the free rectangles overlapped by a circuit."""
+        new_free = []
+        for fx, fy, fw, fh in self.free:
+            # Not overlapping
+            if (x >= fx + fw or x + w <= fx or y >= fy + fh
+                    or y + h <= fy):
+                new_free.append((fx, fy, fw, fh))
+                continue
+
+            # Maximal rectangles on each side of the circuit
+            if x > fx:
+                new_free.append((fx, fy, x - fx, fh))
+            if x + w < fx + fw:
+                new_free.append((x + w, fy, fx + fw - x - w, fh))
+            if y > fy:
+                new_free.append((fx, fy, fw, y - fy))
+            if y + h < fy + fh:
+                new_free.append((fx, y + h, fw, fy + fh - y - h))
+
+        # Remove rectangles contained in other ones (and duplicates)
+        new_free = sorted(set(new_free), key=lambda r: -r[2] * r[3])
+        self.free = []
+        for r in new_free:
+            if not any(r[0] >= o[0] and r[1] >= o[1]
+                       and r[0] + r[2] <= o[0] + o[2]
+                       and r[1] + r[3] <= o[1] + o[3] for o in self.free):
+                self.free.append(r)
+
+
+def _sizes(circuit, width, rotation) -> list[tuple[int, int]]:
+    """Get the allowed (w, h) sizes of a circuit in the strip."""
+    w, h = circuit
+    sizes = [(w, h)]
+    if rotation and w != h:
+        sizes.append((h, w))
+    sizes = [size for size in sizes if size[0] <= width]
+    if not sizes:
+        raise ValueError(f'circuit {circuit} does not fit in a strip of '
+                         f'width {width}')
+    return sizes
+
+
+def skyline_bottom_left(width, circuits,
+                        rotation=False) -> list[tuple[int, int, int, int]]:
+    """Displace all circuits in order, bottom-left on the skyline.
+
+    If rotation is True, the orientation with the lowest top is chosen.
+    Return the (w, h, x, y) rect of each circuit.
+    """
+    skyline = Skyline(width)
+    rects = []
+
+    for circuit in circuits:
+        best = None
+        for w, h in _sizes(circuit, width, rotation):
+            x, y = skyline.find(w)
+            if best is None or (y + h, x) < (best[3] + best[1], best[2]):
+                best = w, h, x, y
+        skyline.place(best[2], best[3], best[0], best[1])
+        rects.append(best)
+
+    return rects
+
 
+def skyline_best_fit(width, circuits,
+                     rotation=False) -> list[tuple[int, int, int, int]]:
+    """Displace all circuits filling the skyline with best fit.
 
-def first_fit_all(width, circuits) -> Node:
-    """Displace all circuits using first fit."""
-    # Height of the first node, upper bound
-    height = sum(c[1] for c in circuits)
-    # print('tree height', height)
-    tree = Node(0, 0, width, height)
+    The lowest gap of the skyline is filled with the widest circuit
+    fitting it (in any orientation if rotation is True, ties are broken
+    by the given order), next to its highest neighbour. If no circuit
+    fits, the gap is raised to its lowest neighbour.
+    Return the (w, h, x, y) rect of each circuit.
+    """
+    skyline = Skyline(width)
+    rects = [None] * len(circuits)
+
+    # Sizes of the circuits left, sorted by width. A circuit may appear
+    # more than once (rotation), entries of placed circuits are dropped
+    # lazily
+    entries = sorted((w, index, h) for index, circuit in enumerate(circuits)
+                     for w, h in _sizes(circuit, width, rotation))
+    widths = [entry[0] for entry in entries]
+    left_circuits = len(circuits)
+
+    while left_circuits:
+        i = skyline.lowest()
+        x, y = skyline.xs[i], skyline.ys[i]
+        end = skyline.end(i)
+        # Strip borders are infinitely high neighbours
+        left = skyline.ys[i - 1] if i > 0 else float('inf')
+        right = skyline.ys[i + 1] if i + 1 < len(skyline.ys) else float('inf')
+
+        k = bisect_right(widths, end - x) - 1
+        if k < 0:
+            skyline.place(x, y, end - x, min(left, right) - y)
+            continue
+
+        # First circuit (in the given order) of that width
+        k = bisect_left(widths, widths[k])
+        w, index, h = entries.pop(k)
+        widths.pop(k)
+        if rects[index] is not None:
+            continue
+
+        if right > left:
+            x = end - w
+        skyline.place(x, y, w, h)
+        rects[index] = w, h, x, y
+        left_circuits -= 1
+
+    return rects
+
+
+def maxrects_bottom_left(width, circuits,
+                         rotation=False) -> list[tuple[int, int, int, int]]:
+    """Displace all circuits in order, bottom-left on free rectangles."""
+    return _maxrects(width, circuits, rotation, bssf=False)
+
+
+def maxrects_bssf(width, circuits,
+                  rotation=False) -> list[tuple[int, int, int, int]]:
+    """Displace all circuits in order, best short side fit."""
+    return _maxrects(width, circuits, rotation, bssf=True)
+
+
+def _maxrects(width, circuits, rotation,
+              bssf) -> list[tuple[int, int, int, int]]:
+    sizes = [_sizes(circuit, width, rotation) for circuit in circuits]
+    # Bin height is the one of the trivial (stacked) solution, any
+    # circuit always fits
+    bin_ = MaxRects(width, sum(max(h for _, h in s) for s in sizes))
+    rects = []
 
-    for c in circuits:
-        result = first_fit(tree, c)
-        if not result:
-            raise Exception('Unsolvable. This should not be possible. '
-                            'Almost certainly it\'s a bug in my program, '
-                            'contact me (mistri)')
+    for circuit_sizes in sizes:
+        rect = bin_.find(circuit_sizes, bssf)
+        bin_.place(rect[2], rect[3], rect[0], rect[1])
+        rects.append(rect)
 
-    return tree
+    return rects
 
 
-def _get_max_height(node) -> int:
-    """Recursively inspect node to obtain the maximum height reached."""
-    reached = 0
-    # Each node computes its maximal reached value
-    if node.circuit is not None:
-        reached = node.y + node.circuit[1]
+PACKERS = {
+    'skyline_bl': skyline_bottom_left,
+    'skyline_bf': skyline_best_fit,
+    'maxrects_bl': maxrects_bottom_left,
+    'maxrects_bssf': maxrects_bssf,
+}
 
-    # Recursively obtain the maximal reached height
-    return max((reached, *(_get_max_height(child) for child in node.children)))
+# Each ordering maps circuits to the order of their indices
+ORDERINGS = {
+    'input': lambda circuits: list(range(len(circuits))),
+    'reversed': lambda circuits: list(reversed(range(len(circuits)))),
+    'height': lambda circuits: sorted(range(len(circuits)),
+                                      key=lambda i: (-circuits[i][1],
+                                                     -circuits[i][0])),
+    'area': lambda circuits: sorted(range(len(circuits)),
+                                    key=lambda i: (-circuits[i][0]
+                                                   * circuits[i][1],
+                                                   -circuits[i][1])),
+    'width': lambda circuits: sorted(range(len(circuits)),
+                                     key=lambda i: (-circuits[i][0],
+                                                    -circuits[i][1])),
+    'max_side': lambda circuits: sorted(range(len(circuits)),
+                                        key=lambda i: (-max(circuits[i]),
+                                                       -min(circuits[i]))),
+}
 
 
-def get_max_height(width, circuits) -> int:
-    """Get the upper bound for an instance using the first fit method.
+def _get_max_height(rects) -> int:
+    """Get the maximum height reached by the displaced circuits."""
+    return max((y + h for _, h, _, y in rects), default=0)
 
-    The maximal is computed for both circuits and reversed(circuits),
-    this is simply because this method is very sensible to monotonically
-    increasing heights. By comparing both results, we fool such
-    situations.
+
+def _run(width, circuits, rotation, packer, ordering):
+    """Run a packer on an ordering of the circuits.
+
+    Return (height, rects), rects are in input order.
     """
-    tree = first_fit_all(width, circuits)
+    order = ORDERINGS[ordering](circuits)
+    ordered_rects = PACKERS[packer](width, [circuits[i] for i in order],
+                                    rotation)
+
+    rects = [None] * len(circuits)
+    for i, rect in zip(order, ordered_rects):
+        rects[i] = rect
+    return _get_max_height(rects), rects
+
 
-    r_circuits = list(reversed(circuits))
-    r_tree = first_fit_all(width, r_circuits)
+def best_placement(width, circuits, rotation=False, packers=None,
+                   orderings=None,
+                   jobs=1) -> tuple[int, list[tuple[int, int, int, int]]]:
+    """Run the heuristic portfolio, get the tightest placement.
+
+    All given packers (default: all the ones in PACKERS, MaxRects ones
+    only up to MAXRECTS_MAX_CIRCUITS) are run on all given orderings
+    (default: all the ones in ORDERINGS). If rotation is True, circuits
+    may be rotated: the runs without rotation are made too, so that the
+    result is never worse than the one without rotation. With jobs > 1,
+    the runs are distributed over a pool of processes.
+
+    Return (height, rects), the (w, h, x, y) rect of each circuit in
+    input order.
+    """
+    circuits = [tuple(c) for c in circuits]
+    if packers is None:
+        packers = [p for p in PACKERS
+                   if not (p.startswith('maxrects')
+                           and len(circuits) > MAXRECTS_MAX_CIRCUITS)]
+    if orderings is None:
+        orderings = list(ORDERINGS)
+    # Greedy rotations may pack worse than none
+    rotations = (True, False) if rotation else (False,)
+    runs = list(product(rotations, packers, orderings))
 
-    return min(_get_max_height(tree), _get_max_height(r_tree))
+    if jobs > 1:
+        with ProcessPoolExecutor(jobs) as executor:
+            results = list(executor.map(
+                _run, *zip(*((width, circuits, *run) for run in runs))))
+    else:
+        results = [_run(width, circuits, *run) for run in runs]
+
+    # Ties are broken in favour of the first run
+    return min(results, key=lambda result: result[0])
+
+
+def get_max_height(width, circuits, rotation=False, jobs=1) -> int:
+    """Get the upper bound for an instance using the heuristic portfolio.
+
+    Originally the maximal was computed only for circuits and
+    reversed(circuits), as the method is very sensible to monotonically
+    increasing heights. A whole portfolio of packers and orderings is now
+    used instead, keeping the tightest height (see best_placement). If
+    rotation is True, the bound holds for rotation aware models.
+    """
+    return best_placement(width, circuits, rotation, jobs=jobs)[0]
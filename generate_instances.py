@@ -0,0 +1,232 @@
+"""Generate synthetic instances with known optimal height.
+
+A plate of size width x height is cut into n circuits, so that the
+circuits tile the plate: the optimal height is height by construction
+(it equals the area bound, with or without rotations). Each cut
+splits a piece (chosen at random, proportionally to its area) either:
+* in two parts (guillotine cut);
+* in five parts arranged as a pinwheel (non guillotine cut): four
+  pieces turning around a central one, no straight cut separates them;
+* in two or three equal parts (duplicated circuits).
+
+The aspect ratio of the circuits is driven by the cut distribution:
+square (cut the longest side, near the middle), uniform (random side
+and position) or slender (mostly cut the shortest side).
+
+Instances are written in the txt format (ins-X.txt in the output
+directory) and in the json format of convert_instances.py (ins-X.json
+in OUTPUT_DIR_json), including optimal_height.
+
+Python >= 3.8.
+"""
+import os
+import os.path as pt
+import json
+import random
+import argparse
+
+from convert_instances import preprocess
+
+
+DEFAULT_WIDTH = 20
+DEFAULT_NON_GUILLOTINE = 0.1
+DEFAULT_DUPLICATES = 0.1
+# Average area of the circuits, for the default plate height
+DEFAULT_MEAN_AREA = 16
+
+
+def _square_cut(w, h, rng):
+    vertical = w > h or w == h and rng.random() < 0.5
+    return vertical, rng.uniform(0.3, 0.7)
+
+
+def _uniform_cut(w, h, rng):
+    return rng.random() < w / (w + h), rng.random()
+
+
+def _slender_cut(w, h, rng):
+    shortest_vertical = w < h
+    vertical = shortest_vertical if rng.random() < 0.8 \
+        else not shortest_vertical
+    return vertical, rng.random()
+
+
+# Cut direction (True if the cut is vertical, i.e. splitting the width)
+# and relative position, given the size of the piece
+ASPECT_DISTRIBUTIONS = {
+    'square': _square_cut,
+    'uniform': _uniform_cut,
+    'slender': _slender_cut,
+}
+
+
+def _guillotine(piece, rng, aspect):
+    """Split a piece in two, return None if it can't be split."""
+    x, y, w, h = piece
+    vertical, fraction = aspect(w, h, rng)
+    if (w if vertical else h) < 2:
+        vertical = not vertical
+    side = w if vertical else h
+    if side < 2:
+        return None
+
+    cut = min(max(round(side * fraction), 1), side - 1)
+    if vertical:
+        return [(x, y, cut, h), (x + cut, y, w - cut, h)]
+    return [(x, y, w, cut), (x, y + cut, w, h - cut)]
+
+
+def _pinwheel(piece, rng):
+    """Split a piece in five (pinwheel), return None if too small."""
+    x, y, w, h = piece
+    if w < 3 or h < 3:
+        return None
+
+    a1, a2 = sorted(rng.sample(range(1, w), 2))
+    b1, b2 = sorted(rng.sample(range(1, h), 2))
+    return [(x, y, a2, b1),                    # bottom
+            (x + a2, y, w - a2, b2),           # right
+            (x + a1, y + b2, w - a1, h - b2),  # top
+            (x, y + b1, a1, h - b1),           # left
+            (x + a1, y + b1, a2 - a1, b2 - b1)]
+
+
+def _equal(piece, rng, parts):
+    """Split a piece in equal parts, return None if not divisible."""
+    x, y, w, h = piece
+    sides = [vertical for vertical, side in ((True, w), (False, h))
+             if side % parts == 0]
+    if not sides:
+        return None
+
+    if rng.choice(sides):
+        w //= parts
+        return [(x + i * w, y, w, h) for i in range(parts)]
+    h //= parts
+    return [(x, y + i * h, w, h) for i in range(parts)]
+
+
+def cut_plate(width, height, n, aspect='square',
+              non_guillotine=DEFAULT_NON_GUILLOTINE,
+              duplicates=DEFAULT_DUPLICATES, seed=None):
+    """Cut a width x height plate in n pieces.
+
+    non_guillotine and duplicates are the probabilities of a pinwheel
+    and of an equal cut (when there is room for them). Return the
+    (w, h, x, y) pieces, in random order.
+    """
+    if n > width * height:
+        raise ValueError(f'a {width}x{height} plate can\'t be cut in {n} '
+                         'pieces')
+    rng = random.Random(seed)
+    aspect = ASPECT_DISTRIBUTIONS[aspect]
+
+    # Pieces are (x, y, w, h) while cutting
+    pieces = [(0, 0, width, height)]
+    while len(pieces) < n:
+        index = rng.choices(range(len(pieces)),
+                            [w * h - 1 for _, _, w, h in pieces])[0]
+        piece = pieces[index]
+
+        kind = rng.random()
+        parts = None
+        if kind < non_guillotine and len(pieces) + 4 <= n:
+            parts = _pinwheel(piece, rng)
+        elif kind < non_guillotine + duplicates:
+            parts = _equal(piece, rng, min(rng.choice((2, 3)),
+                                           n - len(pieces) + 1))
+        if parts is None:
+            parts = _guillotine(piece, rng, aspect)
+
+        pieces[index:index + 1] = parts
+
+    rng.shuffle(pieces)
+    return [(w, h, x, y) for x, y, w, h in pieces]
+
+
+def dump_instance(width, circuits, fp):
+    """Dump an instance in the txt format."""
+    fp.write(f'{width}\n{len(circuits)}\n')
+    fp.writelines(f'{w} {h}\n' for w, h in circuits)
+
+
+def main(output_dir, n, width=DEFAULT_WIDTH, height=None, count=1,
+         aspect='square', non_guillotine=DEFAULT_NON_GUILLOTINE,
+         duplicates=DEFAULT_DUPLICATES, seed=None, jobs=1):
+    rng = random.Random(seed)
+    json_dir = f'{output_dir.rstrip(os.sep)}_json'
+    os.makedirs(output_dir, exist_ok=True)
+    os.makedirs(json_dir, exist_ok=True)
+
+    for index in range(1, count + 1):
+        # Unless given, room for n circuits of the average area
+        instance_height = height or max(width,
+                                        -(-n * DEFAULT_MEAN_AREA // width))
+        rects = cut_plate(width, instance_height, n, aspect, non_guillotine,
+                          duplicates, rng.randrange(2 ** 32))
+        circuits = [[w, h] for w, h, _, _ in rects]
+
+        with open(pt.join(output_dir, f'ins-{index}.txt'), 'w') as fout:
+            dump_instance(width, circuits, fout)
+
+        instance_dict = {
+            'width': width,
+            'n': n,
+            'circuits': circuits,
+            'optimal_height': instance_height,
+            **preprocess(width, circuits, jobs)
+        }
+        with open(pt.join(json_dir, f'ins-{index}.json'), 'w') as fout:
+            json.dump(instance_dict, fout)
+        print(f'ins-{index}: {n} circuits, width {width}, optimal height '
+              f'{instance_height}, heuristic height '
+              f'{instance_dict["max_height"]}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Generate instances by cutting a plate, the optimal '
+                    'height is known by construction. Instances are '
+                    'written to OUTPUT_DIR (txt) and OUTPUT_DIR_json.')
+    parser.add_argument('output_dir', help='directory of txt instances')
+    parser.add_argument('-n', dest='n', type=int, required=True,
+                        help='number of circuits')
+    parser.add_argument('-W', '--width', dest='width', type=int,
+                        default=DEFAULT_WIDTH,
+                        help=f'width of the plate (default {DEFAULT_WIDTH})')
+    parser.add_argument('-H', '--height', dest='height', type=int,
+                        default=None,
+                        help='height of the plate, i.e. optimal height '
+                             '(default: n circuits of area '
+                             f'{DEFAULT_MEAN_AREA} on average)')
+    parser.add_argument('-c', '--count', dest='count', type=int, default=1,
+                        help='number of instances (default 1)')
+    parser.add_argument('-a', '--aspect', dest='aspect', default='square',
+                        choices=tuple(ASPECT_DISTRIBUTIONS),
+                        help='aspect ratio distribution of the circuits '
+                             '(default square)')
+    parser.add_argument('--non-guillotine', dest='non_guillotine',
+                        type=float, default=DEFAULT_NON_GUILLOTINE,
+                        help='probability of a non guillotine (pinwheel) '
+                             f'cut (default {DEFAULT_NON_GUILLOTINE})')
+    parser.add_argument('-d', '--duplicates', dest='duplicates', type=float,
+                        default=DEFAULT_DUPLICATES,
+                        help='probability of cutting a piece in equal '
+                             'circuits (default '
+                             f'{DEFAULT_DUPLICATES})')
+    parser.add_argument('--seed', dest='seed', type=int, default=None,
+                        help='random seed, for reproducible instances')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1,
+                        help='number of processes running the packing '
+                             'heuristics (default 1)')
+    args = parser.parse_args()
+
+    if args.non_guillotine + args.duplicates > 1:
+        parser.error('--non-guillotine and --duplicates probabilities '
+                     'exceed 1')
+    try:
+        main(args.output_dir, args.n, args.width, args.height, args.count,
+             args.aspect, args.non_guillotine, args.duplicates, args.seed,
+             args.jobs)
+    except ValueError as exc:
+        parser.error(str(exc))
@@ -0,0 +1,126 @@
+"""Resumable sweep manifests.
+
+A sweep (an exec_all run over all instances) records the state of each
+instance in a JSONL manifest, one record per line, appended and synced
+to disk as soon as something happens:
+* pending: not started yet.
+* running: the solver was started. A crashed or killed sweep leaves
+  the instance running.
+* done: results were written (solved, or replayed from the cache).
+* timeout: the time limit was hit before proving optimality.
+* failed: the solver raised an error (or crashed too many times).
+* memout: the memory limit was exceeded (see memory.py).
+
+Incumbents (best solutions found so far, e.g. the heuristic placement
+or the improvements of the local search) are flushed in the manifest
+as well, so that long sweeps can be preempted without losing them.
+
+The last record of an instance wins. Resuming a sweep skips finished
+instances (done, timeout, failed, memout); running ones are tried again, at
+most MAX_ATTEMPTS times (the solver may be the one crashing, e.g. out
+of memory). A truncated last line (crash while writing) is ignored.
+
+Python >= 3.8.
+"""
+import os
+import os.path as pt
+import json
+import datetime
+
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+TIMEOUT = 'timeout'
+FAILED = 'failed'
+MEMOUT = 'memout'
+FINISHED_STATES = DONE, TIMEOUT, FAILED, MEMOUT
+
+MANIFEST_BASENAME = 'manifest.jsonl'
+MAX_ATTEMPTS = 2
+
+
+class Manifest:
+    """State of the instances of a sweep, backed by a JSONL file."""
+
+    def __init__(self, filename, instances, resume=False):
+        self.filename = filename
+        self.states = {}
+        self.attempts = {}
+        self.incumbents = {}
+
+        os.makedirs(pt.dirname(pt.abspath(filename)), exist_ok=True)
+        if resume and pt.exists(filename):
+            self._load()
+        else:
+            open(filename, 'w').close()
+
+        for instance in instances:
+            if instance not in self.states:
+                self.mark(instance, PENDING)
+
+    def _load(self):
+        with open(self.filename) as fin:
+            lines = fin.read().split('\n')
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            self._update(record)
+
+        # Terminate a truncated last line, not to corrupt the next record
+        if lines[-1]:
+            with open(self.filename, 'a') as fout:
+                fout.write('\n')
+
+    def _update(self, record):
+        instance = record['instance']
+        if 'state' in record:
+            self.states[instance] = record['state']
+        if 'attempt' in record:
+            self.attempts[instance] = record['attempt']
+        if 'incumbent' in record:
+            self.incumbents[instance] = record['incumbent']
+
+    def _append(self, record):
+        record = {'instance': record.pop('instance'),
+                  'time': datetime.datetime.now().isoformat(), **record}
+        self._update(record)
+        with open(self.filename, 'a') as fout:
+            fout.write(json.dumps(record) + '\n')
+            fout.flush()
+            os.fsync(fout.fileno())
+
+    def mark(self, instance, state, **info):
+        """Record a new state of an instance (info is json data)."""
+        if state == RUNNING:
+            info['attempt'] = self.attempts.get(instance, 0) + 1
+        self._append({'instance': instance, 'state': state, **info})
+
+    def incumbent(self, instance, height, rects, source=None):
+        """Record a solution of an instance, if better than the last one.
+
+        rects is a list of (w, h, x, y).
+        """
+        last = self.incumbents.get(instance)
+        if last is not None and last['height'] <= height:
+            return
+        incumbent = {'height': height, 'rects': [list(r) for r in rects]}
+        if source is not None:
+            incumbent['source'] = source
+        self._append({'instance': instance, 'incumbent': incumbent})
+
+    def todo(self, instance) -> bool:
+        """Tell if an instance shall be solved.
+
+        Instances which crashed too many times are marked as failed.
+        """
+        state = self.states.get(instance, PENDING)
+        if state in FINISHED_STATES:
+            return False
+        if state == RUNNING and self.attempts[instance] >= MAX_ATTEMPTS:
+            self.mark(instance, FAILED,
+                      error=f'crashed {self.attempts[instance]} times')
+            return False
+        return True
@@ -0,0 +1,197 @@
+"""Peak memory of the solves, with an optional memory limit.
+
+Two peaks are measured during a solve:
+* peak_memory: resident set size (bytes) of the process and of its
+  children (external solvers, e.g. CBC or MiniZinc), sampled by a
+  thread. Sampling may miss short spikes; the peak of the process
+  itself is completed by getrusage. Read from /proc (Linux), on other
+  systems only getrusage is available (process itself).
+* python_peak_memory: peak of the Python allocations (bytes, module
+  tracemalloc), i.e. of model building and decoding. Allocations of
+  native solvers (z3, pysat) are not traced. Optional, tracing slows
+  model building down.
+
+If a limit is given, the solve is stopped as soon as the sampled
+memory exceeds it: children are killed and MemoryLimitExceeded is
+raised in the main thread. Native code running in the process (e.g. a
+z3 search) is only interrupted when it returns to Python. Solves run
+by an event loop (asyncio) are stopped by a callback instead, e.g.
+cancelling their tasks: interrupting the main thread would stop the
+loop itself.
+
+Python >= 3.8.
+"""
+import os
+import sys
+import signal
+import _thread
+import threading
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Seconds between two samples of the resident set size
+SAMPLE_INTERVAL = 0.1
+MEGABYTE = 2 ** 20
+
+
+class MemoryLimitExceeded(MemoryError):
+    """The memory used by a solve exceeded its limit."""
+
+    def __init__(self, limit, peak_memory):
+        super().__init__(f'memory limit exceeded: '
+                         f'{peak_memory / MEGABYTE:.0f} MB used, limit '
+                         f'{limit / MEGABYTE:.0f} MB')
+        self.limit = limit
+        self.peak_memory = peak_memory
+
+
+def _rss(pid):
+    """Get the resident set size (bytes) of a process, None if gone."""
+    try:
+        with open(f'/proc/{pid}/status') as fin:
+            for line in fin:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _children(pid) -> list:
+    """Get the descendants of a process (Linux)."""
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as fin:
+                # The command name may contain spaces and parentheses
+                fields = fin.read().rpartition(')')[2].split()
+        except OSError:
+            continue
+        parents.setdefault(int(fields[1]), []).append(int(entry))
+
+    descendants = []
+    stack = [pid]
+    while stack:
+        children = parents.get(stack.pop(), [])
+        descendants.extend(children)
+        stack.extend(children)
+    return descendants
+
+
+def max_rss():
+    """Get the peak resident set size (bytes) of the process so far."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes, except on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class MemoryMonitor:
+    """Context manager measuring the peak memory of the enclosed solve.
+
+    limit is the maximum resident set size (bytes), None for no limit.
+    Python allocations are only traced if trace_python is True:
+    tracemalloc slows allocations (and so the build times) down
+    several times. If given, on_exceeded() is called (from the sampling
+    thread) when the limit is exceeded, instead of killing the children
+    and interrupting the main thread. MemoryLimitExceeded is raised on
+    exit in both cases.
+    """
+
+    def __init__(self, limit=None, interval=SAMPLE_INTERVAL,
+                 trace_python=False, on_exceeded=None):
+        self.limit = limit
+        self.interval = interval
+        self.trace_python = trace_python
+        self.on_exceeded = on_exceeded
+        self.procfs = os.path.isdir('/proc/self')
+        self.peak_memory = None
+        self.python_peak_memory = None
+        self.exceeded = False
+        self._tracing = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        """Update the peak, return the memory used (None if unknown)."""
+        if self.procfs:
+            pid = os.getpid()
+            used = sum(rss for rss in map(_rss, [pid, *_children(pid)])
+                       if rss is not None)
+        else:
+            used = max_rss()
+        if used is not None:
+            self.peak_memory = max(self.peak_memory or 0, used)
+        return used
+
+    def _kill_children(self):
+        if not self.procfs:
+            return
+        for pid in _children(os.getpid()):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            used = self._sample()
+            if self.limit is not None and used is not None \
+                    and used > self.limit:
+                self.exceeded = True
+                if self.on_exceeded is not None:
+                    self.on_exceeded()
+                else:
+                    self._kill_children()
+                    _thread.interrupt_main()
+                return
+
+    def __enter__(self):
+        self._initial_max_rss = max_rss()
+        if self.trace_python and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        self._sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self._stop.set()
+            self._thread.join()
+            self._sample()
+        except KeyboardInterrupt:
+            # Interrupt of the monitor delivered after the solve
+            if not self.exceeded:
+                raise
+        finally:
+            if self.trace_python and tracemalloc.is_tracing():
+                self.python_peak_memory = tracemalloc.get_traced_memory()[1]
+            if self._tracing:
+                tracemalloc.stop()
+                self._tracing = False
+
+        # The peak of the process itself, if reached during the solve
+        final_max_rss = max_rss()
+        if final_max_rss is not None and final_max_rss != \
+                self._initial_max_rss:
+            self.peak_memory = max(self.peak_memory or 0, final_max_rss)
+
+        if self.exceeded:
+            raise MemoryLimitExceeded(self.limit, self.peak_memory) \
+                from exc_value
+        return False
+
+    def statistics(self) -> dict:
+        """Get the peaks under the common statistics keys."""
+        return {'peak_memory': self.peak_memory,
+                'python_peak_memory': self.python_peak_memory}
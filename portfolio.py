@@ -0,0 +1,391 @@
+"""Race different technologies (CP, SAT, MIP, SMT, LS) on the same instance.
+
+Each backend runs in its own process. The best height found so far
+(incumbent) is kept, and as soon as a backend proves optimality (or
+reaches the height lower bound) all the other ones are stopped.
+
+Backend modules are imported inside the worker processes, as each
+technology directory has its own (clashing) util module.
+
+Python >= 3.8.
+"""
+import re
+import sys
+import json
+import time
+import queue
+import signal
+import datetime
+import os
+import os.path as pt
+import argparse
+import multiprocessing
+
+import results_db
+from bounds import lower_bound
+
+
+ROOT_DIR = pt.dirname(pt.abspath(__file__))
+DEFAULT_OUTPUT_DIR = pt.join(ROOT_DIR, 'portfolio_out')
+DEFAULT_TIME_LIMIT = 300
+# Extra time given to the backends before being forcefully stopped
+GRACE_TIME = 10
+
+SAT_INSTANCE_DECODER_RE = re.compile(r'x_([0-9]+)_([0-9]+)_([0-9]+)')
+
+
+def _import_backend(directory, module_name):
+    """Import a module from one of the technology directories."""
+    sys.path.insert(0, pt.join(ROOT_DIR, directory))
+    return __import__(module_name)
+
+
+def _max_height(instance_data, rotation):
+    """Get the upper bound of an instance (rotation aware if available)."""
+    if rotation:
+        return instance_data.get('max_height_rot',
+                                 instance_data['max_height'])
+    return instance_data['max_height']
+
+
+def _min_height(instance_data, rotation):
+    """Get the lower bound of an instance (computed if missing)."""
+    key = 'min_height_rot' if rotation else 'min_height'
+    if key in instance_data:
+        return instance_data[key]
+    return lower_bound(instance_data['width'], instance_data['circuits'],
+                       rotation)
+
+
+def _placement(instance_data, rotation):
+    """Get the heuristic placement of an instance (None if missing)."""
+    if rotation:
+        return instance_data.get('placement_rot')
+    return instance_data.get('placement')
+
+
+def _solve_cp(instance_data, time_limit, rotation):
+    from minizinc import Instance, Model, Solver, Status
+
+    model_file = 'final_rotation.mzn' if rotation else 'final.mzn'
+    exec_all = _import_backend('CP', 'exec_all')
+
+    instance = Instance(Solver.lookup('chuffed'),
+                        Model([pt.join(ROOT_DIR, 'CP', model_file)]))
+    exec_all.set_parameters(instance, instance_data, rotation)
+
+    result = instance.solve(timeout=datetime.timedelta(seconds=time_limit),
+                            optimisation_level=5, free_search=True)
+    if result.solution is None:
+        return None, None, False
+
+    if rotation:
+        sizes = result['var_circuits']
+    else:
+        sizes = instance_data['circuits']
+    rect = [(*sizes[i], result['positions_x'][i], result['positions_y'][i])
+            for i in range(instance_data['n'])]
+    return (result['height'], rect,
+            result.status == Status.OPTIMAL_SOLUTION)
+
+
+def _solve_sat(instance_data, time_limit, rotation):
+    if rotation:
+        model = _import_backend('SAT', 'SAT_model_order_rotations')
+    else:
+        model = _import_backend('SAT', 'SAT_model_order')
+
+    n = instance_data['n']
+    model_results = model.linear_optimization(
+        instance_data['width'], n, instance_data['circuits'],
+        _max_height(instance_data, rotation), timeout=time_limit * 1000,
+        rotations=rotation, warm_start=_placement(instance_data, rotation),
+        min_height=_min_height(instance_data, rotation))
+    if model_results is None:
+        return None, None, False
+
+    # Decode variables (from index n to 2n - 1 circuits are rotated)
+    height, variables, _, _ = model_results
+    rect = [None] * n
+    for var in map(str, variables):
+        x, y, k = map(int, SAT_INSTANCE_DECODER_RE.match(var).groups())
+        w, h = instance_data['circuits'][k % n]
+        if k >= n:
+            w, h = h, w
+        rect[k % n] = (w, h, x, y)
+
+    # Linear search starts from the lower bound, the first solution is
+    # optimal
+    return height, rect, True
+
+
+def _solve_mip(instance_data, time_limit, rotation):
+    import pulp
+
+    if rotation:
+        model = _import_backend('MIP', 'MIP_rotation')
+    else:
+        model = _import_backend('MIP', 'MIP_no_rotation')
+
+    result = model.solve(instance_data['width'], instance_data['n'],
+                         instance_data['circuits'],
+                         _max_height(instance_data, rotation),
+                         _min_height(instance_data, rotation),
+                         time_limit=time_limit,
+                         warm_start=_placement(instance_data, rotation))
+    if result['result']['rect'] is None:
+        return None, None, False
+    # CBC stopped by the time limit also reports the status Optimal
+    return (result['result']['height'], result['result']['rect'],
+            result['sol_status'] == pulp.LpSolutionOptimal)
+
+
+def _solve_smt(instance_data, time_limit, rotation):
+    if rotation:
+        raise NotImplementedError('no rotation aware SMT model available')
+    model = _import_backend('SMT', 'SMT_no_rotation')
+
+    result = model.solve(instance_data['width'], instance_data['n'],
+                         instance_data['circuits'], time_limit=time_limit,
+                         max_height=instance_data['max_height'],
+                         warm_start=instance_data.get('placement'),
+                         min_height=_min_height(instance_data, False))
+    if len(result['result']['rect']) != instance_data['n']:
+        return None, None, False
+    return (result['result']['height'], result['result']['rect'],
+            str(result['status']) == 'sat')
+
+
+def _solve_ls(instance_data, time_limit, rotation):
+    annealing = _import_backend('LS', 'annealing')
+
+    min_height = _min_height(instance_data, rotation)
+    height, rect, _ = annealing.solve(
+        instance_data['width'], instance_data['circuits'], rotation,
+        time_limit=time_limit,
+        initial=_placement(instance_data, rotation), min_height=min_height)
+    # Local search only proves optimality by reaching the lower bound
+    return height, rect, height <= min_height
+
+
+BACKENDS = {
+    'cp': _solve_cp,
+    'sat': _solve_sat,
+    'mip': _solve_mip,
+    'smt': _solve_smt,
+    'ls': _solve_ls,
+}
+# Backends without rotation aware model
+NO_ROTATION_BACKENDS = 'smt',
+
+
+def default_backends(rotation=False) -> list:
+    """Get the backends available for the problem (all by default)."""
+    return [backend for backend in BACKENDS
+            if not (rotation and backend in NO_ROTATION_BACKENDS)]
+
+
+def _worker(backend, instance_data, time_limit, rotation, results, verbose):
+    """Run a backend and put its outcome in the results queue.
+
+    The worker leads its own process group, so that external solvers
+    (CBC, minizinc, ...) can be stopped together with it.
+    """
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+
+    # Silence solvers, also the external ones (writing on fd 1)
+    if not verbose:
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+        sys.stdout = open(os.devnull, 'w')
+
+    start_time = time.perf_counter()
+    try:
+        height, rect, optimal = BACKENDS[backend](instance_data, time_limit,
+                                                  rotation)
+        results.put({'backend': backend, 'height': height, 'rect': rect,
+                     'optimal': optimal,
+                     'time': time.perf_counter() - start_time})
+    except Exception as exc:
+        results.put({'backend': backend, 'height': None, 'rect': None,
+                     'optimal': False, 'error': repr(exc),
+                     'time': time.perf_counter() - start_time})
+
+
+def _stop(process):
+    """Stop a worker process and its external solvers."""
+    if not process.is_alive():
+        return
+    # The process group may not exist yet if the worker just started
+    if hasattr(os, 'killpg'):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    process.kill()
+
+
+def solve(instance_data, backends=None,
+          time_limit=DEFAULT_TIME_LIMIT, rotation=False, verbose=False):
+    """Race the given backends on an instance.
+
+    backends defaults to the ones available for the problem (see
+    default_backends).
+
+    Return a tuple (best, reports), where best is the report of the
+    backend owning the best solution (None if no solution was found)
+    and reports contains the outcome of each backend.
+    """
+    if backends is None:
+        backends = default_backends(rotation)
+    min_height = _min_height(instance_data, rotation)
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = {
+        backend: context.Process(
+            target=_worker,
+            args=(backend, instance_data, time_limit, rotation, results,
+                  verbose),
+            daemon=True)
+        for backend in backends
+    }
+    for process in processes.values():
+        process.start()
+
+    best = None
+    reports = {}
+    deadline = time.perf_counter() + time_limit + GRACE_TIME
+    while len(reports) < len(processes):
+        try:
+            report = results.get(
+                timeout=max(0., deadline - time.perf_counter()))
+        except queue.Empty:
+            break
+        reports[report['backend']] = report
+        print(f'{report["backend"]}: height {report["height"]}, '
+              f'optimal {report["optimal"]}, '
+              f'{report["time"]:.2f}s' + (f', {report["error"]}'
+                                         if 'error' in report else ''))
+
+        # Update incumbent
+        if (report['height'] is not None
+                and (best is None or report['height'] < best['height']
+                     or report['height'] == best['height']
+                     and report['optimal'])):
+            best = report
+
+        # Stop everything if the incumbent can't be improved
+        if best is not None and (best['optimal']
+                                 or best['height'] <= min_height):
+            best['optimal'] = True
+            break
+
+    for backend, process in processes.items():
+        _stop(process)
+        reports.setdefault(backend, {'backend': backend, 'height': None,
+                                     'optimal': False, 'status': 'stopped'})
+    for process in processes.values():
+        process.join()
+
+    return best, reports
+
+
+def format_result(width, height, rect):
+    ret = f'{width} {height}\n{len(rect)}\n'
+    for r in rect:
+        ret += ' '.join(str(s) for s in r) + '\n'
+    return ret
+
+
+def main(instance_files, backends, time_limit, rotation,
+         output_dir=DEFAULT_OUTPUT_DIR, verbose=False, db=None):
+    backends = backends or default_backends(rotation)
+    os.makedirs(output_dir, exist_ok=True)
+    if db is not None:
+        db.start_run('portfolio', '+'.join(backends), rotation,
+                     time_limit=time_limit)
+
+    for instance_file in instance_files:
+        with open(instance_file) as fin:
+            instance_data = json.load(fin)
+        basename = pt.splitext(pt.basename(instance_file))[0]
+
+        print(f'solving instance: {pt.basename(instance_file)}')
+        start_time = time.perf_counter()
+        best, reports = solve(instance_data, backends, time_limit, rotation,
+                              verbose)
+        statistics = {
+            'time': time.perf_counter() - start_time,
+            'winner': None if best is None else best['backend'],
+            'height': None if best is None else best['height'],
+            'optimal': best is not None and best['optimal'],
+            'backends': {
+                backend: {key: value for key, value in report.items()
+                          if key not in ('backend', 'rect')}
+                for backend, report in reports.items()
+            },
+        }
+        print(json.dumps(statistics, indent=4))
+        print()
+
+        if best is not None:
+            with open(pt.join(output_dir, f'out-{basename}.txt'),
+                      'w') as fout:
+                fout.write(format_result(instance_data['width'],
+                                         best['height'], best['rect']))
+
+        with open(pt.join(output_dir, f'stats-{basename}.json'), 'w') as fout:
+            json.dump(statistics, fout, indent=4)
+
+        if db is not None:
+            if best is None:
+                status = results_db.UNKNOWN
+            elif best['optimal']:
+                status = results_db.OPTIMAL
+            else:
+                status = results_db.FEASIBLE
+            db.record(pt.basename(instance_file), status,
+                      height=statistics['height'],
+                      statistics=statistics, total_time=statistics['time'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Race CP, SAT, MIP, SMT and LS models on the given '
+                    'instances. The first backend proving optimality '
+                    'stops the others.')
+    parser.add_argument('instances', metavar='INSTANCE', nargs='+',
+                        help='json instance files (see convert_instances.py)')
+    parser.add_argument('-b', '--backend', dest='backends', action='append',
+                        choices=tuple(BACKENDS),
+                        help='backend taking part in the race, can be '
+                             'specified multiple times (default: all the '
+                             'available ones, SMT has no rotation aware '
+                             'model)')
+    parser.add_argument('-t', '--time-limit', dest='time_limit', type=int,
+                        default=DEFAULT_TIME_LIMIT,
+                        help='time limit in seconds for each instance '
+                             f'(default {DEFAULT_TIME_LIMIT})')
+    parser.add_argument('-r', '--rotation', dest='rotation',
+                        action='store_true', default=False,
+                        help='if specified, rotation aware models will be '
+                             'used (SMT is not available)')
+    parser.add_argument('-o', '--output-dir', dest='output_dir',
+                        default=DEFAULT_OUTPUT_DIR,
+                        help='directory for solutions and statistics')
+    parser.add_argument('-v', '--verbose', dest='verbose',
+                        action='store_true', default=False,
+                        help='show the output of the backends')
+    parser.add_argument('--no-db', dest='db', action='store_false',
+                        default=True,
+                        help='do not record results in the results database '
+                             '(see results_db.py)')
+    args = parser.parse_args()
+
+    backends = args.backends or default_backends(args.rotation)
+
+    main(args.instances, backends, args.time_limit, args.rotation,
+         output_dir=args.output_dir, verbose=args.verbose,
+         db=results_db.ResultsDB(enabled=args.db))
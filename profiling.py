@@ -0,0 +1,95 @@
+"""Profiling of the model construction and decoding (cProfile).
+
+The exec_all scripts profile the Python side of each solve with
+--profile: building the model, feeding the solver and decoding the
+solution. Time spent in native solvers (z3, pysat) appears as single
+entries, the search of external solvers (CBC, MiniZinc) as the time
+waiting for them.
+
+Each profiled instance gets, next to its statistics:
+* profile-ins-XX.prof: pstats dump, e.g. for snakeviz or flameprof
+  (flame graphs);
+* profile-ins-XX.txt: summary of the top functions, by cumulative and
+  by internal time.
+
+Usage (summary of a dump):
+python profiling.py PROFILE_FILE [-n TOP] [-s SORT_KEY]
+
+Python >= 3.8.
+"""
+import os
+import os.path as pt
+import io
+import pstats
+import cProfile
+import argparse
+
+
+# Number of functions in summaries
+DEFAULT_TOP = 30
+SUMMARY_SORT_KEYS = 'cumulative', 'tottime'
+
+
+def summary(stats, top=DEFAULT_TOP, sort_keys=SUMMARY_SORT_KEYS) -> str:
+    """Get the top functions of a profile (cProfile.Profile or file)."""
+    output = io.StringIO()
+    stats = pstats.Stats(stats, stream=output)
+    stats.strip_dirs()
+    for sort_key in sort_keys:
+        stats.sort_stats(sort_key).print_stats(top)
+    return output.getvalue()
+
+
+class Profiler:
+    """cProfile profiler of the enclosed blocks (cumulated).
+
+    A disabled profiler does nothing, so that callers can wrap their
+    hot paths unconditionally.
+    """
+
+    def __init__(self, enabled=True):
+        self.profile = cProfile.Profile() if enabled else None
+
+    def __enter__(self):
+        if self.profile is not None:
+            self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.profile is not None:
+            self.profile.disable()
+        return False
+
+    def dump(self, output_dir, basename, top=DEFAULT_TOP):
+        """Write profile-BASENAME.prof and its summary (.txt).
+
+        Return the written files (none if disabled).
+        """
+        if self.profile is None:
+            return []
+        os.makedirs(output_dir, exist_ok=True)
+        prof_file = pt.join(output_dir, f'profile-{basename}.prof')
+        summary_file = pt.join(output_dir, f'profile-{basename}.txt')
+        self.profile.dump_stats(prof_file)
+        with open(summary_file, 'w') as fout:
+            fout.write(summary(self.profile, top))
+        print(f'profile written to {prof_file}')
+        return [prof_file, summary_file]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Print the top functions of a profile written by an '
+                    'exec_all script (--profile).')
+    parser.add_argument('profile_file', help='profile-ins-XX.prof file')
+    parser.add_argument('-n', '--top', dest='top', type=int,
+                        default=DEFAULT_TOP,
+                        help=f'number of functions (default {DEFAULT_TOP})')
+    parser.add_argument('-s', '--sort', dest='sort_keys', action='append',
+                        default=None,
+                        help='pstats sort key, can be repeated (default '
+                             f'{" and ".join(SUMMARY_SORT_KEYS)})')
+    args = parser.parse_args()
+
+    print(summary(args.profile_file, args.top,
+                  args.sort_keys or SUMMARY_SORT_KEYS))
@@ -0,0 +1,181 @@
+"""Render solutions to image files, without a display.
+
+Placements parsed by visualize_solution.parse are drawn with matplotlib
+(Agg, no window) to PNG, SVG or any format matplotlib supports:
+* one image per solution, out-ins-XX.png next to out-ins-XX.txt (or
+  in the given output directory), rendered in parallel with -j;
+* a contact sheet (--sheet): all solutions tiled in a single image.
+
+Solutions are searched recursively in the given paths, as in
+validate_solution.py:
+python render_solution.py PATH [PATH ...] [-f svg] [-o DIR] [-j N]
+python render_solution.py SAT/order_out --sheet order.png
+
+Python >= 3.8.
+"""
+import os
+import os.path as pt
+import math
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from matplotlib.figure import Figure
+from matplotlib.collections import PatchCollection
+from matplotlib.patches import Rectangle
+from matplotlib import colormaps
+
+from visualize_solution import parse
+from validate_solution import find_solutions
+
+
+DEFAULT_FORMAT = 'png'
+DEFAULT_DPI = 100
+# Inches of the longest side of a single placement
+PLACEMENT_SIZE = 6
+SHEET_TILE_SIZE = 3
+COLORMAP = 'tab20'
+
+
+def draw(ax, width, height, circuits, title=None):
+    """Draw a placement on matplotlib axes."""
+    colormap = colormaps[COLORMAP]
+    ax.add_collection(PatchCollection(
+        [Rectangle((c['x'], c['y']), c['w'], c['h']) for c in circuits],
+        facecolors=[colormap(k % colormap.N) for k in range(len(circuits))],
+        edgecolors='black', linewidths=0.5))
+    ax.set_xlim(0, width)
+    ax.set_ylim(0, max([height] + [c['y'] + c['h'] for c in circuits]))
+    ax.axhline(height, color='red', linewidth=1)
+    ax.set_aspect('equal')
+    ax.tick_params(labelsize='small')
+    if title is not None:
+        ax.set_title(title, fontsize='small')
+
+
+def load(solution_file):
+    """Parse a solution file, return None if there is no solution."""
+    with open(solution_file) as fin:
+        data = fin.read()
+    if data.strip() == 'None':
+        return None
+    width, height, n, circuits = parse(data)
+    return width, height, circuits
+
+
+def _title(solution_file, width, height):
+    directory = pt.basename(pt.dirname(pt.abspath(solution_file)))
+    name = pt.splitext(pt.basename(solution_file))[0][len('out-'):]
+    return f'{directory}/{name} ({width}x{height})'
+
+
+def render(solution_file, output_file, dpi=DEFAULT_DPI) -> bool:
+    """Render a solution file, return False if there is no solution."""
+    solution = load(solution_file)
+    if solution is None:
+        return False
+    width, height, circuits = solution
+    top = max([height] + [c['y'] + c['h'] for c in circuits])
+    scale = PLACEMENT_SIZE / max(width, top)
+
+    fig = Figure(figsize=(max(width * scale, 2) + 1, max(top * scale, 2) + 1))
+    draw(fig.add_subplot(), width, height, circuits,
+         _title(solution_file, width, height))
+    fig.savefig(output_file, dpi=dpi, bbox_inches='tight')
+    return True
+
+
+def render_sheet(solution_files, output_file, columns=None,
+                 dpi=DEFAULT_DPI) -> int:
+    """Tile the solutions in a single image, return how many."""
+    solutions = [(solution_file, solution) for solution_file, solution
+                 in zip(solution_files, map(load, solution_files))
+                 if solution is not None]
+    if not solutions:
+        return 0
+    columns = columns or math.ceil(math.sqrt(len(solutions)))
+    rows = math.ceil(len(solutions) / columns)
+
+    fig = Figure(figsize=(columns * SHEET_TILE_SIZE, rows * SHEET_TILE_SIZE))
+    for index, (solution_file, (width, height, circuits)) \
+            in enumerate(solutions):
+        draw(fig.add_subplot(rows, columns, index + 1), width, height,
+             circuits, _title(solution_file, width, height))
+    fig.tight_layout()
+    fig.savefig(output_file, dpi=dpi)
+    return len(solutions)
+
+
+def output_filename(solution_file, output_dir=None, fmt=DEFAULT_FORMAT):
+    """Get the image file of a solution.
+
+    Next to the solution, or in output_dir prefixed by the name of the
+    solution directory (solutions of different models don't clash).
+    """
+    basename = f'{pt.splitext(pt.basename(solution_file))[0]}.{fmt}'
+    if output_dir is None:
+        return pt.join(pt.dirname(solution_file), basename)
+    directory = pt.basename(pt.dirname(pt.abspath(solution_file)))
+    return pt.join(output_dir, f'{directory}-{basename}')
+
+
+def _render_one(solution_file, output_dir, fmt, dpi):
+    output_file = output_filename(solution_file, output_dir, fmt)
+    try:
+        if not render(solution_file, output_file, dpi):
+            return f'{solution_file}: no solution'
+    except (OSError, ValueError) as exc:
+        return f'{solution_file}: {exc}'
+    return f'{solution_file} -> {output_file}'
+
+
+def main(paths, fmt=DEFAULT_FORMAT, output_dir=None, sheet=None,
+         columns=None, jobs=1, dpi=DEFAULT_DPI):
+    solution_files = find_solutions(paths)
+    if sheet is not None:
+        count = render_sheet(solution_files, sheet, columns, dpi)
+        print(f'{count} solutions tiled in {sheet}')
+        return
+
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    render_one = partial(_render_one, output_dir=output_dir, fmt=fmt,
+                         dpi=dpi)
+    if jobs <= 1:
+        for message in map(render_one, solution_files):
+            print(message)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for message in executor.map(render_one, solution_files):
+            print(message)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Render solutions (out-ins-XX.txt) to images, without '
+                    'a display.')
+    parser.add_argument('paths', nargs='+',
+                        help='solution files or directories searched '
+                             'recursively for out-ins-XX.txt')
+    parser.add_argument('-f', '--format', dest='fmt', default=DEFAULT_FORMAT,
+                        help='image format, e.g. png, svg, pdf (default '
+                             f'{DEFAULT_FORMAT})')
+    parser.add_argument('-o', '--output-dir', dest='output_dir', default=None,
+                        help='directory of the images (default: next to '
+                             'the solutions)')
+    parser.add_argument('--sheet', dest='sheet', default=None,
+                        help='tile all solutions in a single image file '
+                             '(contact sheet) instead')
+    parser.add_argument('-c', '--columns', dest='columns', type=int,
+                        default=None,
+                        help='columns of the contact sheet (default: '
+                             'square sheet)')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1,
+                        help='number of rendering processes (default 1)')
+    parser.add_argument('--dpi', dest='dpi', type=int, default=DEFAULT_DPI,
+                        help=f'resolution of the images (default '
+                             f'{DEFAULT_DPI})')
+    args = parser.parse_args()
+
+    main(args.paths, args.fmt, args.output_dir, args.sheet, args.columns,
+         args.jobs, args.dpi)
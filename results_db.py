@@ -0,0 +1,207 @@
+"""SQLite store of the results of all runners.
+
+Each execution of an exec_all script is a run (backend, model, solver,
+rotation and parameters), each solved instance a result with a
+normalised schema: status, height, phase times (seconds, see
+timing.py), peak memory (bytes) and the raw solver statistics (json).
+Results of a solve replayed from the cache (see solve_cache.py) are
+copied from the run which computed them.
+
+Usage (list runs, e.g. to select them in barplot.py):
+python results_db.py [--db FILE] [--backend BACKEND]
+
+Python >= 3.8.
+"""
+import os.path as pt
+import json
+import sqlite3
+import datetime
+import argparse
+from contextlib import closing
+
+import timing
+
+
+ROOT_DIR = pt.dirname(pt.abspath(__file__))
+DEFAULT_DB_FILE = pt.join(ROOT_DIR, 'results.db')
+# Seconds to wait for concurrent writers (parallel workers)
+LOCK_TIMEOUT = 60
+
+# Normalised statuses
+OPTIMAL = 'optimal'
+FEASIBLE = 'feasible'
+UNKNOWN = 'unknown'
+FAILED = 'failed'
+MEMOUT = 'memout'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    model TEXT NOT NULL,
+    solver TEXT,
+    rotation INTEGER NOT NULL,
+    parameters TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    instance TEXT NOT NULL,
+    status TEXT NOT NULL,
+    height INTEGER,
+    build_time REAL,
+    preprocess_time REAL,
+    solve_time REAL,
+    decode_time REAL,
+    total_time REAL,
+    peak_memory INTEGER,
+    statistics TEXT,
+    cache_key TEXT,
+    cached INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (run_id, instance)
+);
+CREATE INDEX IF NOT EXISTS runs_model ON runs (backend, model, rotation);
+CREATE INDEX IF NOT EXISTS results_instance ON results (instance, status);
+CREATE INDEX IF NOT EXISTS results_cache_key ON results (cache_key);
+'''
+
+# Result columns which can be plotted, the common keys of the statistics
+TIME_COLUMNS = (*timing.PHASE_KEYS, 'total_time')
+RESULT_COLUMNS = ('instance', 'status', 'height', *TIME_COLUMNS,
+                  'peak_memory', 'statistics', 'cache_key')
+
+
+class ResultsDB:
+    """Results of a run, stored in a SQLite database.
+
+    A connection is opened for each operation, so that the object can be
+    shared with worker processes. A disabled database stores nothing.
+    """
+
+    def __init__(self, filename=DEFAULT_DB_FILE, enabled=True):
+        self.filename = filename
+        self.enabled = enabled
+        self.run_id = None
+
+    def connect(self):
+        """Open a connection, creating the schema if needed."""
+        conn = sqlite3.connect(self.filename, timeout=LOCK_TIMEOUT)
+        conn.executescript(SCHEMA)
+
+        # Databases created before a time column was introduced
+        columns = {row[1] for row in conn.execute(
+            'PRAGMA table_info(results)')}
+        with conn:
+            for column in TIME_COLUMNS:
+                if column not in columns:
+                    conn.execute(f'ALTER TABLE results ADD COLUMN {column} '
+                                 'REAL')
+        return conn
+
+    def start_run(self, backend, model, rotation=False, solver=None,
+                  **parameters):
+        """Record a new run, following results belong to it.
+
+        parameters shall be json serializable.
+        """
+        if not self.enabled:
+            return
+        with closing(self.connect()) as conn, conn:
+            cursor = conn.execute(
+                'INSERT INTO runs (started, backend, model, solver, '
+                'rotation, parameters) VALUES (?, ?, ?, ?, ?, ?)',
+                (datetime.datetime.now().isoformat(), backend, model, solver,
+                 int(rotation), json.dumps(parameters, sort_keys=True)))
+            self.run_id = cursor.lastrowid
+
+    def record(self, instance, status, height=None, peak_memory=None,
+               statistics=None, cache_key=None, **times):
+        """Record the result of an instance.
+
+        Times (seconds) and peak memory (bytes) are read from the
+        statistics under the common keys (see timing.py and memory.py),
+        unless given as arguments.
+        """
+        if not self.enabled:
+            return
+        times = {key: times.get(key, (statistics or {}).get(key))
+                 for key in TIME_COLUMNS}
+        values = {
+            'instance': instance,
+            'status': status,
+            'height': height,
+            **times,
+            'peak_memory': peak_memory if peak_memory is not None
+            else (statistics or {}).get('peak_memory'),
+            'statistics': None if statistics is None
+            else json.dumps(statistics, default=str),
+            'cache_key': cache_key,
+        }
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                f'INSERT OR REPLACE INTO results (run_id, '
+                f'{", ".join(RESULT_COLUMNS)}) VALUES (?'
+                + ', ?' * len(RESULT_COLUMNS) + ')',
+                (self.run_id, *(values[key] for key in RESULT_COLUMNS)))
+
+    def replay(self, instance, cache_key) -> bool:
+        """Copy the last result computed with the given cache key.
+
+        Return False if there is no such result.
+        """
+        if not self.enabled:
+            return False
+        columns = ', '.join(RESULT_COLUMNS[1:])
+        with closing(self.connect()) as conn, conn:
+            cursor = conn.execute(
+                f'INSERT OR REPLACE INTO results (run_id, instance, '
+                f'{columns}, cached) SELECT ?, ?, {columns}, 1 FROM results '
+                'WHERE cache_key = ? AND NOT cached '
+                'ORDER BY run_id DESC LIMIT 1',
+                (self.run_id, instance, cache_key))
+            return cursor.rowcount > 0
+
+
+def find_run(conn, spec) -> int:
+    """Get the id of a run given a run id or BACKEND[/MODEL].
+
+    The latest matching run is selected, raise ValueError if none.
+    """
+    if spec.isdigit():
+        row = conn.execute('SELECT id FROM runs WHERE id = ?',
+                           (int(spec),)).fetchone()
+    else:
+        backend, _, model = spec.partition('/')
+        row = conn.execute(
+            'SELECT id FROM runs WHERE backend = ? AND (? = \'\' OR '
+            'model = ?) ORDER BY id DESC LIMIT 1',
+            (backend, model, model)).fetchone()
+    if row is None:
+        raise ValueError(f'no run matching {spec}')
+    return row[0]
+
+
+def main(filename=DEFAULT_DB_FILE, backend=None):
+    with closing(ResultsDB(filename).connect()) as conn:
+        rows = conn.execute(
+            'SELECT runs.id, started, backend, model, solver, rotation, '
+            'COUNT(instance), SUM(status = ?) FROM runs LEFT JOIN results '
+            'ON runs.id = run_id WHERE ? IS NULL OR backend = ? '
+            'GROUP BY runs.id ORDER BY runs.id', (OPTIMAL, backend, backend))
+        print('id\tstarted\tbackend\tmodel\tsolver\trotation\tinstances\t'
+              'optimal')
+        for row in rows:
+            print('\t'.join(map(str, row)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='List the runs stored in a results database.')
+    parser.add_argument('--db', dest='db', default=DEFAULT_DB_FILE,
+                        help=f'results database (default {DEFAULT_DB_FILE})')
+    parser.add_argument('--backend', dest='backend', default=None,
+                        help='only list the runs of a backend (cp, sat, mip, '
+                             'smt, ls)')
+    args = parser.parse_args()
+
+    main(args.db, args.backend)
@@ -0,0 +1,105 @@
+"""Content-addressed cache of solutions and statistics.
+
+Each solve is identified by a key, the hash of everything its outcome
+depends on: the json instance, the sources of the model (model files
+or python modules), the solver and the parameters (rotation, time
+limit, ...). The result files written by a solve (out-ins-XX.txt,
+stats-ins-XX.json, ...) are stored under its key, so that a rerun of
+an unchanged model on an unchanged instance replays them instead of
+solving again.
+
+Entries are written atomically (a fully written directory is renamed
+into place), parallel runners can share the same cache.
+
+Python >= 3.8.
+"""
+import os
+import os.path as pt
+import json
+import glob
+import shutil
+import hashlib
+import tempfile
+
+
+ROOT_DIR = pt.dirname(pt.abspath(__file__))
+DEFAULT_CACHE_DIR = pt.join(ROOT_DIR, '.solve_cache')
+# Usual permissions of directories (entries) and files, also used by the
+# other atomic writers. The umask can only be read by setting it (process
+# wide), read it once at import
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+ENTRY_MODE = 0o777 & ~_UMASK
+FILE_MODE = 0o666 & ~_UMASK
+
+
+def source_files(directory, patterns=('*.py', '*.mzn')) -> list[str]:
+    """Get the source files of a technology directory (sorted)."""
+    return sorted(filename for pattern in patterns
+                  for filename in glob.glob(pt.join(directory, pattern)))
+
+
+def make_key(instance_data, sources=(), **parameters) -> str:
+    """Get the cache key of a solve.
+
+    sources are the files the model is made of, parameters shall be
+    json serializable.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(instance_data, sort_keys=True).encode())
+    for filename in sources:
+        digest.update(pt.basename(filename).encode())
+        with open(filename, 'rb') as fin:
+            digest.update(hashlib.sha256(fin.read()).digest())
+    digest.update(json.dumps(parameters, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class SolveCache:
+    """Result files of past solves, stored by key.
+
+    A disabled cache never hits and stores nothing.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, enabled=True):
+        self.directory = directory
+        self.enabled = enabled
+
+    def _entry(self, key) -> str:
+        return pt.join(self.directory, key[:2], key)
+
+    def restore(self, key, output_dir) -> bool:
+        """Copy the result files of a cached solve in output_dir.
+
+        Return False if the key is not cached.
+        """
+        entry = self._entry(key)
+        if not self.enabled or not pt.isdir(entry):
+            return False
+
+        os.makedirs(output_dir, exist_ok=True)
+        for filename in os.listdir(entry):
+            shutil.copyfile(pt.join(entry, filename),
+                            pt.join(output_dir, filename))
+        return True
+
+    def store(self, key, filenames):
+        """Store the result files of a solve under its key."""
+        if not self.enabled:
+            return
+
+        entry = self._entry(key)
+        os.makedirs(pt.dirname(entry), exist_ok=True)
+        tmp_entry = tempfile.mkdtemp(dir=pt.dirname(entry), prefix='.tmp-')
+        try:
+            # mkdtemp creates private directories, use the usual
+            # permissions
+            os.chmod(tmp_entry, ENTRY_MODE)
+            for filename in filenames:
+                if pt.exists(filename):
+                    shutil.copyfile(filename,
+                                    pt.join(tmp_entry, pt.basename(filename)))
+            os.replace(tmp_entry, entry)
+        except OSError:
+            # Already stored by a concurrent run (or not writable)
+            shutil.rmtree(tmp_entry, ignore_errors=True)
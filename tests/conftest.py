@@ -0,0 +1,24 @@
+"""Shared fixtures of the tests (pytest), run from the repository root:
+python -m pytest tests
+
+Python >= 3.8.
+"""
+import sys
+import importlib
+import os.path as pt
+
+import pytest
+
+# Shared modules live in the parent directory
+ROOT_DIR = pt.join(pt.dirname(pt.abspath(__file__)), '..')
+sys.path.insert(0, ROOT_DIR)
+
+
+@pytest.fixture
+def import_backend(monkeypatch):
+    """Import a module of one of the technology directories (the directory
+    is on sys.path for the test only)."""
+    def import_module(directory, module_name):
+        monkeypatch.syspath_prepend(pt.join(ROOT_DIR, directory))
+        return importlib.import_module(module_name)
+    return import_module
@@ -0,0 +1,53 @@
+"""Tests of the lower bounds (bounds.py): no bound may exceed the optimal
+height of an instance."""
+import random
+from itertools import product
+
+import pytest
+
+import bounds
+from generate_instances import ASPECT_DISTRIBUTIONS, cut_plate
+
+
+@pytest.mark.parametrize('aspect', ASPECT_DISTRIBUTIONS)
+@pytest.mark.parametrize('rotation', [False, True])
+def test_bounds_below_generated_optimum(aspect, rotation):
+    # Generated instances tile the plate, their optimal height is known
+    for width, n, seed in product((7, 10, 20), (3, 8, 20), range(10)):
+        height = max(width, -(-n * 16 // width))
+        circuits = [(w, h) for w, h, _, _ in cut_plate(
+            width, height, n, aspect, non_guillotine=0.3, duplicates=0.3,
+            seed=seed)]
+        for name, bound in bounds.BOUNDS.items():
+            assert bound(width, circuits, rotation) <= height, \
+                (name, width, circuits)
+
+
+def test_dff_bound_beats_area():
+    # Five 4 x 1 circuits on a strip of width 10: only two per row
+    circuits = [(4, 1)] * 5
+    assert bounds.continuous_bound(10, circuits) == 2
+    assert bounds.dff_bound(10, circuits) == 3
+    assert bounds.lower_bound(10, circuits) == 3
+
+
+@pytest.mark.parametrize('module_name', ['MIP_no_rotation', 'MIP_rotation'])
+def test_bounds_below_mip_optimum(import_backend, module_name):
+    pulp = pytest.importorskip('pulp')
+    model = import_backend('MIP', module_name)
+    rotation = module_name == 'MIP_rotation'
+
+    # Small random instances, solved to optimality
+    rng = random.Random(0)
+    for _ in range(8):
+        width = rng.randint(4, 8)
+        circuits = [(rng.randint(1, width), rng.randint(1, 5))
+                    for _ in range(rng.randint(3, 6))]
+        max_height = sum(h for _, h in circuits)
+        result = model.solve(width, len(circuits), circuits, max_height,
+                             time_limit=30)
+        assert result['sol_status'] == pulp.LpSolutionOptimal
+        optimum = result['result']['height']
+        for name, bound in bounds.BOUNDS.items():
+            assert bound(width, circuits, rotation) <= optimum, \
+                (name, width, circuits)
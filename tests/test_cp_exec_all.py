@@ -0,0 +1,68 @@
+"""Tests of the concurrent CP runner (CP/exec_all.py), without MiniZinc:
+the solves are replaced by coroutines."""
+import json
+import asyncio
+
+import pytest
+
+import memory
+import manifest
+
+MEGABYTE = 2 ** 20
+
+
+@pytest.fixture
+def exec_all(import_backend, monkeypatch, tmp_path):
+    pytest.importorskip('minizinc')
+    exec_all = import_backend('CP', 'exec_all')
+    instances_dir = tmp_path / 'instances'
+    instances_dir.mkdir()
+    for i in range(1, 4):
+        (instances_dir / f'ins-{i:02}.json').write_text(json.dumps(
+            {'width': 2, 'n': 1, 'circuits': [[1, 1]]}))
+    monkeypatch.setattr(exec_all, 'DEFAULT_INSTANCES_DIR',
+                        str(instances_dir))
+    monkeypatch.setattr(exec_all, 'DEFAULT_OUTPUT_DIR',
+                        str(tmp_path / 'out'))
+    return exec_all
+
+
+class FakeSolver:
+    id = 'fake'
+    version = '0'
+    stdFlags = []
+
+
+def test_sweep_goes_on_after_memout(exec_all, monkeypatch, tmp_path):
+    if memory.max_rss() is None or not memory.MemoryMonitor().procfs:
+        pytest.skip('resident set size not available')
+    started, solved = [], []
+
+    async def solve_with(solver, model, model_file, instance_data, timeout,
+                         run, *args):
+        run.update(status=None, solution=None, height=None, statistics={})
+        started.append(instance_data)
+        if len(started) == 1:
+            # First instance: exceeds the limit, then waits to be stopped
+            ballast = bytearray(b'\x01') * (300 * MEGABYTE)
+            try:
+                await asyncio.sleep(60)
+            finally:
+                del ballast
+        solved.append(instance_data)
+        run['status'] = exec_all.Status.OPTIMAL_SOLUTION
+
+    monkeypatch.setattr(exec_all, 'solve_with', solve_with)
+    monkeypatch.setattr(exec_all, 'lookup_solvers',
+                        lambda tags, skip_missing=False: [FakeSolver()])
+    memory_limit = memory.MemoryMonitor()._sample() + 100 * MEGABYTE
+
+    exec_all.main(memory_limit=memory_limit)
+
+    states = manifest.Manifest(
+        str(tmp_path / 'out' / manifest.MANIFEST_BASENAME),
+        ['ins-01.json', 'ins-02.json', 'ins-03.json'], resume=True).states
+    assert states == {'ins-01.json': manifest.MEMOUT,
+                      'ins-02.json': manifest.DONE,
+                      'ins-03.json': manifest.DONE}
+    assert len(started) == 3 and len(solved) == 2
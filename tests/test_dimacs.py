@@ -0,0 +1,20 @@
+"""Tests of the DIMACS clause emitter (SAT/dimacs.py)."""
+import pytest
+
+
+@pytest.mark.parametrize('chunk_size', [1, 5, 8, None])
+def test_write_one_clause_per_line(import_backend, monkeypatch, chunk_size):
+    dimacs = import_backend('SAT', 'dimacs')
+    if chunk_size is not None:
+        monkeypatch.setattr(dimacs, 'WRITE_CHUNK_SIZE', chunk_size)
+    cnf = dimacs.CNF()
+    variables = cnf.new_vars(f'x_{i}' for i in range(6))
+    clauses = [[variables[i], -variables[(i + 1) % 6], variables[(i + 2) % 6]]
+               for i in range(6)]
+    cnf.add_clauses(clauses)
+    cnf.add_clause(-variables[0])
+
+    lines = cnf.to_string().splitlines()
+    assert lines[0] == f'p cnf 6 {len(clauses) + 1}'
+    expected = [' '.join(map(str, [*clause, 0])) for clause in clauses]
+    assert lines[1:] == expected + [f'{-variables[0]} 0']
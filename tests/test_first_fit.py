@@ -0,0 +1,61 @@
+"""Tests of the packing heuristics (first_fit.py) and of the warm start
+placements they store in the instances (convert_instances.py)."""
+import glob
+import json
+import os.path as pt
+from itertools import product
+
+import numpy as np
+import pytest
+
+import first_fit
+from validate_solution import validate
+
+ROOT_DIR = pt.join(pt.dirname(pt.abspath(__file__)), '..')
+INSTANCE_FILES = sorted(glob.glob(pt.join(ROOT_DIR, 'instances_json',
+                                          '*.json')))
+SMALL_INSTANCE_FILES = INSTANCE_FILES[:10]
+
+
+def _load_instance(instance_file):
+    with open(instance_file) as fin:
+        return json.load(fin)
+
+
+def _violations(instance_data, height, rects, rotation):
+    violations, _ = validate(instance_data, instance_data['width'], height,
+                             len(rects), np.array(rects, dtype=np.int64),
+                             rotation=rotation)
+    return violations
+
+
+@pytest.mark.parametrize('instance_file', SMALL_INSTANCE_FILES,
+                         ids=pt.basename)
+@pytest.mark.parametrize('rotation', [False, True])
+def test_packers_feasible(instance_file, rotation):
+    instance_data = _load_instance(instance_file)
+    for packer, ordering in product(first_fit.PACKERS, first_fit.ORDERINGS):
+        height, rects = first_fit._run(instance_data['width'],
+                                       instance_data['circuits'], rotation,
+                                       packer, ordering)
+        assert _violations(instance_data, height, rects, rotation) == [], \
+            (packer, ordering)
+
+
+@pytest.mark.parametrize('instance_file', INSTANCE_FILES, ids=pt.basename)
+def test_stored_placements_feasible(instance_file):
+    instance_data = _load_instance(instance_file)
+    assert _violations(instance_data, instance_data['max_height'],
+                       instance_data['placement'], False) == []
+    assert _violations(instance_data, instance_data['max_height_rot'],
+                       instance_data['placement_rot'], True) == []
+    assert instance_data['max_height_rot'] <= instance_data['max_height']
+
+
+@pytest.mark.parametrize('instance_file', SMALL_INSTANCE_FILES,
+                         ids=pt.basename)
+def test_rotation_never_worse(instance_file):
+    instance_data = _load_instance(instance_file)
+    width, circuits = instance_data['width'], instance_data['circuits']
+    assert (first_fit.get_max_height(width, circuits, rotation=True)
+            <= first_fit.get_max_height(width, circuits))
@@ -0,0 +1,30 @@
+"""Tests of the cross-technology portfolio (portfolio.py)."""
+import json
+import os.path as pt
+
+import pytest
+
+import portfolio
+
+ROOT_DIR = pt.join(pt.dirname(pt.abspath(__file__)), '..')
+
+
+def test_default_backends():
+    assert portfolio.default_backends() == list(portfolio.BACKENDS)
+    assert 'smt' not in portfolio.default_backends(rotation=True)
+    assert 'mip' in portfolio.default_backends(rotation=True)
+
+
+@pytest.mark.parametrize('module_name', ['MIP_no_rotation', 'MIP_rotation'])
+def test_mip_solution_status(import_backend, module_name):
+    pulp = pytest.importorskip('pulp')
+    model = import_backend('MIP', module_name)
+    with open(pt.join(ROOT_DIR, 'instances_json', 'ins-01.json')) as fin:
+        instance_data = json.load(fin)
+
+    result = model.solve(instance_data['width'], instance_data['n'],
+                         instance_data['circuits'],
+                         instance_data['max_height'], time_limit=30)
+    # A proof of optimality, not only the Optimal status
+    assert result['sol_status'] == pulp.LpSolutionOptimal
+    assert result['result']['height'] == instance_data['min_height']
@@ -0,0 +1,59 @@
+"""Tests of the cache of solutions and statistics (solve_cache.py)."""
+import os
+import json
+import stat
+import os.path as pt
+
+import pytest
+
+import solve_cache
+
+ROOT_DIR = pt.join(pt.dirname(pt.abspath(__file__)), '..')
+INSTANCE_FILE = pt.join(ROOT_DIR, 'instances_json', 'ins-01.json')
+
+
+def _load_instance():
+    with open(INSTANCE_FILE) as fin:
+        return json.load(fin)
+
+
+def test_make_key_depends_on_parameters():
+    instance_data = _load_instance()
+    key = solve_cache.make_key(instance_data, rotation=False)
+    assert key == solve_cache.make_key(instance_data, rotation=False)
+    assert key != solve_cache.make_key(instance_data, rotation=True)
+    assert key != solve_cache.make_key({**instance_data, 'width': 0},
+                                       rotation=False)
+
+
+def test_store_restore(tmp_path):
+    cache = solve_cache.SolveCache(tmp_path / 'cache')
+    result_file = tmp_path / 'out-ins-01.txt'
+    result_file.write_text('8 8\n')
+    cache.store('ab' * 32, [str(result_file)])
+
+    output_dir = tmp_path / 'out'
+    assert cache.restore('ab' * 32, str(output_dir))
+    assert (output_dir / 'out-ins-01.txt').read_text() == '8 8\n'
+    assert not cache.restore('cd' * 32, str(output_dir))
+
+    # Entries get the usual permissions, not the private mkdtemp ones
+    entry = pt.join(tmp_path, 'cache', 'ab', 'ab' * 32)
+    assert stat.S_IMODE(os.stat(entry).st_mode) == solve_cache.ENTRY_MODE
+
+
+def test_disabled_cache(tmp_path):
+    cache = solve_cache.SolveCache(tmp_path / 'cache', enabled=False)
+    result_file = tmp_path / 'out-ins-01.txt'
+    result_file.write_text('8 8\n')
+    cache.store('ab' * 32, [str(result_file)])
+    assert not cache.restore('ab' * 32, str(tmp_path / 'out'))
+
+
+def test_mip_rotation_keys_differ(import_backend):
+    pytest.importorskip('pulp')
+    exec_all_rotation = import_backend('MIP', 'exec_all_rotation')
+    exec_all_no_rotation = import_backend('MIP', 'exec_all_no_rotation')
+    instance_data = _load_instance()
+    assert exec_all_rotation.cache_key(instance_data, 'PULP_CBC_CMD', 30) \
+        != exec_all_no_rotation.cache_key(instance_data, 'PULP_CBC_CMD', 30)
@@ -0,0 +1,56 @@
+"""Phase timing of the solves, shared by all backends.
+
+Each solve is split into the same phases, timed with the wall clock
+(time.perf_counter):
+* build: model construction (constraints, clauses, flattening);
+* preprocess: solver side preprocessing (solver initialization,
+  presolve, writing DIMACS files);
+* solve: search;
+* decode: extraction of the solution from the solver.
+
+Statistics report them as build_time, preprocess_time, solve_time and
+decode_time (seconds, cumulative over the iterations of a search), a
+phase the backend can't tell apart is None. total_time is the wall
+clock time of the whole solve.
+
+Python >= 3.8.
+"""
+import time
+from contextlib import contextmanager
+
+
+BUILD = 'build'
+PREPROCESS = 'preprocess'
+SOLVE = 'solve'
+DECODE = 'decode'
+PHASES = BUILD, PREPROCESS, SOLVE, DECODE
+PHASE_KEYS = tuple(f'{phase}_time' for phase in PHASES)
+
+
+class PhaseTimer:
+    """Cumulative time of the phases of a solve, since its creation."""
+
+    def __init__(self):
+        self.starting_time = time.perf_counter()
+        self.times = dict.fromkeys(PHASES)
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block as (part of) the given phase."""
+        starting_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - starting_time)
+
+    def add(self, name, seconds):
+        """Add time measured elsewhere to a phase."""
+        if seconds is not None:
+            self.times[name] = (self.times[name] or 0.) + seconds
+
+    def statistics(self) -> dict:
+        """Get the phase times (and total time) under the common keys."""
+        statistics = {f'{phase}_time': seconds
+                      for phase, seconds in self.times.items()}
+        statistics['total_time'] = time.perf_counter() - self.starting_time
+        return statistics
@@ -0,0 +1,249 @@
+"""Validate solutions (out-ins-XX.txt files) against their instances.
+
+Each solution is checked for:
+* width and number of circuits of the instance;
+* circuits: the k-th placed circuit is the k-th circuit of the
+  instance, possibly rotated if rotations are allowed;
+* bounds: circuits lie within the plate (x, y >= 0, x + w <= width);
+* height: the declared height is the true one (top of the highest
+  circuit);
+* overlaps: no two circuits overlap (sweep line over x, pairwise checks
+  of the candidates vectorised by blocks).
+
+Solutions are searched recursively in the given paths (by default the
+output directories of all technologies). By default rotations are
+allowed for the directories of the rotation models (name containing
+rot, but not no_rot). Solutions of unsolved instances (None) are
+counted apart. The exit status is 1 if a solution is invalid, so that
+the script can gate benchmark runs:
+python validate_solution.py [PATH ...] [-i INSTANCES_DIR] [-q]
+
+Python >= 3.8.
+"""
+import re
+import sys
+import glob
+import json
+import time
+import os.path as pt
+import argparse
+
+import numpy as np
+
+
+ROOT_DIR = pt.dirname(pt.abspath(__file__))
+DEFAULT_INSTANCES_DIR = pt.join(ROOT_DIR, 'instances_json')
+DEFAULT_PATHS = [pt.join(ROOT_DIR, directory) for directory
+                 in ('CP', 'SAT', 'MIP', 'SMT', 'LS', 'portfolio_out')]
+SOLUTION_FILE_RE = re.compile(r'out-ins-([0-9]+)\.txt')
+INTEGER_RE = re.compile(r'-?[0-9]+')
+# Rects of the sweep compared at once
+OVERLAP_BLOCK = 1024
+# Violations listed per check
+MAX_REPORTED = 5
+
+ROTATION_CHOICES = 'auto', 'allowed', 'forbidden'
+
+
+def parse(data: str):
+    """Parse a solution, return width, height, n and (w, h, x, y) rects.
+
+    rects is an integer array of shape (m, 4), m may differ from n in
+    an invalid solution. Return None if there is no solution.
+    """
+    if data.strip() == 'None':
+        return None
+    values = np.array(INTEGER_RE.findall(data), dtype=np.int64)
+    if len(values) < 3 or (len(values) - 3) % 4:
+        raise ValueError('malformed solution')
+    width, height, n = map(int, values[:3])
+    return width, height, n, values[3:].reshape(-1, 4)
+
+
+def overlapping_pairs(rects) -> np.ndarray:
+    """Get the (i, j) pairs (i < j) of overlapping rects, sorted.
+
+    Sweep over the rects sorted by x: a block of rects is only compared
+    (vectorised) with the following rects starting before its rightmost
+    end.
+    """
+    order = np.argsort(rects[:, 2], kind='stable')
+    w, h, x, y = rects[order].T
+    right, top = x + w, y + h
+    pairs = []
+    for start in range(0, len(rects), OVERLAP_BLOCK):
+        stop = min(start + OVERLAP_BLOCK, len(rects))
+        end = max(stop, np.searchsorted(x, right[start:stop].max()))
+        rows, columns = slice(start, stop), slice(start, end)
+        overlap = ((x[rows, None] < right[columns])
+                   & (x[columns] < right[rows, None])
+                   & (y[rows, None] < top[columns])
+                   & (y[columns] < top[rows, None]))
+        # Each pair once, no rect with itself
+        overlap &= np.arange(start, end) > np.arange(start, stop)[:, None]
+        i, j = np.nonzero(overlap)
+        pairs.append(np.stack((order[i + start], order[j + start]), axis=1))
+
+    pairs = np.sort(np.concatenate(pairs), axis=1)
+    return pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+
+
+def _listed(indices) -> str:
+    listed = ', '.join(map(str, indices[:MAX_REPORTED]))
+    return listed + (', ...' if len(indices) > MAX_REPORTED else '')
+
+
+def validate(instance_data, width, height, n, rects, rotation=False):
+    """Check a parsed solution against its instance.
+
+    Return the violations (list of messages, empty if valid) and the
+    true height of the solution (None if there are no circuits).
+    """
+    violations = []
+    circuits = np.array(instance_data['circuits'], dtype=np.int64)
+    if width != instance_data['width']:
+        violations.append(f'width {width} instead of '
+                          f'{instance_data["width"]}')
+    if n != len(circuits) or len(rects) != len(circuits):
+        violations.append(f'{len(rects)} circuits (declared {n}) instead '
+                          f'of {len(circuits)}')
+    if not len(rects):
+        return violations, None
+
+    # Circuits, compared in order (as many as available)
+    count = min(len(rects), len(circuits))
+    w, h = rects[:count, 0], rects[:count, 1]
+    matching = (w == circuits[:count, 0]) & (h == circuits[:count, 1])
+    if rotation:
+        matching |= (w == circuits[:count, 1]) & (h == circuits[:count, 0])
+    wrong = np.flatnonzero(~matching)
+    if len(wrong):
+        violations.append(f'{len(wrong)} circuits do not match the instance'
+                          f'{" (rotations allowed)" if rotation else ""}: '
+                          f'{_listed(wrong)}')
+
+    w, h, x, y = rects.T
+    outside = np.flatnonzero((x < 0) | (y < 0) | (x + w > width)
+                             | (w <= 0) | (h <= 0))
+    if len(outside):
+        violations.append(f'{len(outside)} circuits out of the plate: '
+                          f'{_listed(outside)}')
+
+    true_height = int((y + h).max())
+    if true_height != height:
+        violations.append(f'declared height {height}, true height '
+                          f'{true_height}')
+
+    pairs = overlapping_pairs(rects)
+    if len(pairs):
+        violations.append(f'{len(pairs)} overlapping pairs: '
+                          + _listed([tuple(map(int, pair))
+                                     for pair in pairs[:MAX_REPORTED + 1]]))
+    return violations, true_height
+
+
+def rotation_allowed(solution_file) -> bool:
+    """Guess if rotations are allowed from the output directory name."""
+    directory = pt.basename(pt.dirname(pt.abspath(solution_file))).lower()
+    return 'rot' in directory and 'no_rot' not in directory
+
+
+def instance_file(instances_dir, number):
+    """Get the json instance of a solution, numbers may be zero padded."""
+    for name in {f'ins-{number}', f'ins-{int(number):02d}',
+                 f'ins-{int(number)}'}:
+        filename = pt.join(instances_dir, f'{name}.json')
+        if pt.exists(filename):
+            return filename
+    raise ValueError(f'no instance ins-{number} in {instances_dir}')
+
+
+def find_solutions(paths) -> list:
+    """List the solution files in the given files and directories."""
+    solution_files = []
+    for path in paths:
+        if pt.isdir(path):
+            solution_files.extend(sorted(
+                filename for filename
+                in glob.glob(pt.join(path, '**', 'out-ins-*.txt'),
+                             recursive=True)
+                if SOLUTION_FILE_RE.fullmatch(pt.basename(filename))))
+        else:
+            solution_files.append(path)
+    return solution_files
+
+
+def main(paths=None, instances_dir=DEFAULT_INSTANCES_DIR, rotation='auto',
+         quiet=False) -> int:
+    """Validate all solutions, return the number of invalid ones.
+
+    paths defaults to the existing output directories.
+    """
+    if paths is None:
+        paths = [path for path in DEFAULT_PATHS if pt.isdir(path)]
+    instances = {}
+    invalid = unsolved = 0
+    solution_files = find_solutions(paths)
+    starting_time = time.perf_counter()
+    for solution_file in solution_files:
+        match = SOLUTION_FILE_RE.fullmatch(pt.basename(solution_file))
+        try:
+            if match is None:
+                raise ValueError('not an out-ins-XX.txt file')
+            number = match.group(1)
+            if number not in instances:
+                with open(instance_file(instances_dir, number)) as fin:
+                    instances[number] = json.load(fin)
+            with open(solution_file) as fin:
+                solution = parse(fin.read())
+            if solution is None:
+                unsolved += 1
+                if not quiet:
+                    print(f'{solution_file}: no solution')
+                continue
+            violations, true_height = validate(
+                instances[number], *solution,
+                rotation_allowed(solution_file) if rotation == 'auto'
+                else rotation == 'allowed')
+        except (OSError, ValueError) as exc:
+            violations, true_height = [str(exc)], None
+
+        if violations:
+            invalid += 1
+            print(f'{solution_file}: INVALID')
+            for violation in violations:
+                print(f'    {violation}')
+        elif not quiet:
+            print(f'{solution_file}: ok, height {true_height}')
+
+    elapsed = time.perf_counter() - starting_time
+    print(f'{len(solution_files)} solutions validated in {elapsed:.2f} s, '
+          f'{invalid} invalid, {unsolved} without solution')
+    return invalid
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Validate solutions (bounds, circuits, height, '
+                    'overlaps). Exit status is 1 if a solution is '
+                    'invalid.')
+    parser.add_argument('paths', nargs='*', default=None,
+                        help='solution files or directories searched '
+                             'recursively for out-ins-XX.txt (default: '
+                             'output directories of all technologies)')
+    parser.add_argument('-i', '--instances', dest='instances_dir',
+                        default=DEFAULT_INSTANCES_DIR,
+                        help='directory of json instances (default '
+                             f'{DEFAULT_INSTANCES_DIR})')
+    parser.add_argument('-r', '--rotation', dest='rotation',
+                        default='auto', choices=ROTATION_CHOICES,
+                        help='whether circuits may be rotated; auto: '
+                             'allowed in the output directories of the '
+                             'rotation models (default auto)')
+    parser.add_argument('-q', '--quiet', dest='quiet', action='store_true',
+                        default=False,
+                        help='only report invalid solutions')
+    args = parser.parse_args()
+
+    sys.exit(1 if main(args.paths or None, args.instances_dir, args.rotation,
+                       args.quiet) else 0)
@@ -1,12 +1,13 @@
 """Visualize an output instance.
 
+pyglet is imported when showing a window only, so that parse can be
+used on headless machines (see render_solution.py).
+
 Python >= 3.8.
 """
 import sys
 import re
 
-import pyglet
-
 
 CIRCUIT_LINE_RE = re.compile(r'[0-9]* [0-9]*')
 
@@ -15,6 +16,8 @@ WINDOW_WIDTH = 500
 
 def show(width, height, n, circuits):
     """Show a window containing visual representation of an instance."""
+    import pyglet
+
     circuits_ratio = height / width
     window = pyglet.window.Window(
         WINDOW_WIDTH, int(circuits_ratio * WINDOW_WIDTH))